@@ -0,0 +1,248 @@
+"""Локальная замена Telegram Bot API для нагрузочных тестов.
+
+Поддерживает методы, которыми пользуется бот: getMe, deleteWebhook,
+getUpdates (long polling), sendMessage, sendPhoto, editMessageText и
+answerCallbackQuery. Обновления кладутся в очередь через push() или
+POST /_updates (JSON-список обновлений), бот забирает их через getUpdates;
+для бота в режиме вебхука push(enqueue=False) только регистрирует их.
+
+Сервер сам считает время ответа: ответом на обновление считается первый
+вызов answerCallbackQuery с его id или первый вызов в его чат после
+доставки. Бот подключается через TELEGRAM_BASE_URL=http://host:port/bot.
+
+С flood_rate сервер, как Telegram, отвечает 429 с retry_after на
+сообщения сверх flood_rate в секунду на всех или больше одного в секунду
+в чат (с запасом в три сообщения).
+
+Отдельный запуск (обновления подает внешний клиент):
+    python -m benchmarks.fake_bot_api --port 8081 --flood-rate 30
+"""
+import argparse
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "Futbochi", "username": "futbochi_bot"}
+REPLY_METHODS = ("sendMessage", "sendPhoto", "editMessageText")
+CHAT_FLOOD_BURST = 3  # Сообщений в чат за секунду до ответа 429
+
+class FloodError(Exception):
+    """Превышен лимит сообщений, бот получит 429"""
+
+class _Pending:
+    """Обновление, на которое бот еще не ответил"""
+    __slots__ = ("update_id", "pushed_at", "answered")
+
+    def __init__(self, update_id: int, pushed_at: float):
+        self.update_id = update_id
+        self.pushed_at = pushed_at
+        self.answered = False
+
+class FakeBotAPI:
+    """Состояние фейкового Bot API: очередь обновлений и статистика ответов"""
+
+    def __init__(self, flood_rate: float = 0):
+        self.flood_rate = flood_rate
+        self.updates: Deque[Dict[str, Any]] = deque()
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.latencies: List[float] = []
+        self.pushed = 0
+        self.polling = asyncio.Event()
+        self._next_update_id = 1
+        self._message_id = 0
+        self._new_updates = asyncio.Event()
+        self._by_chat: Dict[int, Deque[_Pending]] = {}
+        self._by_callback: Dict[str, _Pending] = {}
+        self._sent: Deque[float] = deque()
+        self._sent_by_chat: Dict[int, Deque[float]] = {}
+
+    @property
+    def answered(self) -> int:
+        return len(self.latencies)
+
+    def push(self, updates: Iterable[Dict[str, Any]], enqueue: bool = True) -> List[Dict[str, Any]]:
+        """Присвоить обновлениям новые update_id и начать ждать ответа на них.
+
+        При enqueue=True обновления отдаются боту через getUpdates, иначе
+        их доставляет вызывающий (например, POST на вебхук бота).
+        """
+        now = time.perf_counter()
+        pushed = []
+        for update in updates:
+            update = dict(update, update_id=self._next_update_id)
+            self._next_update_id += 1
+            pending = _Pending(update["update_id"], now)
+            if "callback_query" in update:
+                query = dict(update["callback_query"], id=str(update["update_id"]))
+                update["callback_query"] = query
+                self._by_callback[query["id"]] = pending
+                chat_id = query["from"]["id"]
+            else:
+                chat_id = update["message"]["chat"]["id"]
+            self._by_chat.setdefault(chat_id, deque()).append(pending)
+            pushed.append(update)
+            self.pushed += 1
+        if enqueue:
+            self.updates.extend(pushed)
+            self._new_updates.set()
+        return pushed
+
+    def _answer(self, pending: Optional[_Pending]) -> None:
+        if pending is None or pending.answered:
+            return
+        pending.answered = True
+        self.latencies.append(time.perf_counter() - pending.pushed_at)
+
+    def _answer_chat(self, chat_id: int) -> None:
+        # Ответ в чат закрывает самое старое неотвеченное обновление этого чата
+        queue = self._by_chat.get(chat_id)
+        while queue:
+            pending = queue.popleft()
+            if not pending.answered:
+                self._answer(pending)
+                break
+        if queue is not None and not queue:
+            del self._by_chat[chat_id]
+
+    def _flooded(self, chat_id: Optional[int]) -> bool:
+        """Учесть сообщение в окне последней секунды; True, если лимит превышен"""
+        now = time.perf_counter()
+        windows = [(self._sent, self.flood_rate)]
+        if chat_id is not None:
+            windows.append((self._sent_by_chat.setdefault(chat_id, deque()), CHAT_FLOOD_BURST))
+        for window, limit in windows:
+            while window and now - window[0] > 1:
+                window.popleft()
+        if any(len(window) >= limit for window, limit in windows):
+            return True
+        for window, _ in windows:
+            window.append(now)
+        return False
+
+    async def get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        self.polling.set()
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        # Подтвержденные ботом обновления (update_id < offset) удаляются из очереди
+        while self.updates and self.updates[0]["update_id"] < offset:
+            self.updates.popleft()
+        if not self.updates and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return [update for _, update in zip(range(limit), self.updates)]
+
+    def _message(self, params: Dict[str, Any], photo: bool = False) -> Dict[str, Any]:
+        self._message_id += 1
+        message = {
+            "message_id": int(params.get("message_id") or self._message_id),
+            "date": int(time.time()),
+            "chat": {"id": int(params.get("chat_id") or 0), "type": "private"},
+            "from": BOT_USER,
+        }
+        if photo:
+            message["photo"] = [{"file_id": "fake", "file_unique_id": "fake", "width": 1, "height": 1}]
+            message["caption"] = params.get("caption", "")
+        else:
+            message["text"] = params.get("text", "")
+        return message
+
+    async def call(self, method: str, params: Dict[str, Any]) -> Any:
+        """Выполнить метод Bot API и вернуть поле result ответа"""
+        self.calls[method] += 1
+        if method == "getUpdates":
+            return await self.get_updates(params)
+        if method == "getMe":
+            return BOT_USER
+        if method == "deleteWebhook":
+            return True
+        if method == "answerCallbackQuery":
+            self._answer(self._by_callback.pop(str(params.get("callback_query_id")), None))
+            return True
+        if method in REPLY_METHODS:
+            chat_id = int(params["chat_id"]) if params.get("chat_id") is not None else None
+            if self.flood_rate and self._flooded(chat_id):
+                raise FloodError(method)
+            if chat_id is not None:
+                self._answer_chat(chat_id)
+            return self._message(params, photo=method == "sendPhoto")
+        raise KeyError(method)
+
+    async def _read_params(self, request: web.Request) -> Dict[str, Any]:
+        if request.content_type == "application/json":
+            return await request.json()
+        # PTB шлет параметры формой; непростые значения закодированы в JSON
+        form = await request.post()
+        return {key: value for key, value in form.items() if isinstance(value, str)}
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        try:
+            result = await self.call(method, await self._read_params(request))
+        except KeyError:
+            self.errors[method] += 1
+            return web.json_response(
+                {"ok": False, "error_code": 404, "description": "Not Found: method not supported"}, status=404
+            )
+        except FloodError:
+            self.errors[f"{method} 429"] += 1
+            return web.json_response(
+                {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                 "parameters": {"retry_after": 1}}, status=429
+            )
+        return web.json_response({"ok": True, "result": result})
+
+    async def handle_push(self, request: web.Request) -> web.Response:
+        self.push(await request.json())
+        return web.json_response({"ok": True, "pending": len(self.updates)})
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pushed": self.pushed,
+            "answered": self.answered,
+            "calls": dict(self.calls),
+            "errors": dict(self.errors),
+        }
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    def make_app(self) -> web.Application:
+        app = web.Application(client_max_size=20 * 1024 * 1024)
+        app.router.add_post("/_updates", self.handle_push)
+        app.router.add_get("/_stats", self.handle_stats)
+        app.router.add_route("*", "/bot{token}/{method}", self.handle)
+        return app
+
+async def start_server(api: FakeBotAPI, host: str = "127.0.0.1", port: int = 0) -> web.AppRunner:
+    """Запустить сервер; фактический порт - в runner.addresses"""
+    runner = web.AppRunner(api.make_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный фейковый Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--flood-rate", type=float, default=0,
+                        help="отвечать 429 сверх стольких сообщений в секунду, 0 - без лимита")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    api = FakeBotAPI(args.flood_rate)
+    logger.info("Fake Bot API on http://%s:%d/bot", args.host, args.port)
+    web.run_app(api.make_app(), host=args.host, port=args.port, access_log=None, print=None)
+
+if __name__ == "__main__":
+    main()
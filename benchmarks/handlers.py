@@ -0,0 +1,339 @@
+"""Бенчмарк обработчиков бота на синтетических обновлениях Telegram.
+
+Для каждого размера базы (по умолчанию 10, 10 000 и 100 000 команд) в
+отдельном процессе создается временное хранилище, заполняется случайными
+командами и прогоняются обработчики: start, show_squad, buy_player,
+handle_toggle_player, handle_support_action, handle_match_difficulty и
+show_top. Обновления - настоящие объекты Update/CallbackQuery из PTB, а
+вызовы Bot API отвечает заглушка FakeRequest без сети.
+
+Отчет: p50/p99 времени обработчика и память по tracemalloc (пик и остаток
+после вызова). Подготовка состояния (деньги, лимиты) в замер не входит.
+
+Запуск из корня репозитория:
+    python -m benchmarks.handlers
+    python -m benchmarks.handlers --teams 10 10000 --backend sqlite --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from telegram.request import BaseRequest, RequestData
+
+DEFAULT_SIZES = (10, 10000, 100000)
+BENCH_TOKEN = "123456:BENCHMARK"
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "Futbochi", "username": "futbochi_bot"}
+CATALOG_SIZES = {"common": 240, "rare": 100, "epic": 40, "legendary": 20}
+SQUAD_SIZE = 8
+
+class FakeRequest(BaseRequest):
+    """Bot API без сети: на каждый метод отвечает правдоподобным результатом"""
+
+    def __init__(self):
+        self.calls: Counter = Counter()
+        self._message_id = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _message(self, endpoint: str, request_data: Optional[RequestData]) -> Dict[str, Any]:
+        params = request_data.parameters if request_data else {}
+        self._message_id += 1
+        message = {
+            "message_id": params.get("message_id", self._message_id),
+            "date": int(time.time()),
+            "chat": {"id": params.get("chat_id", 0), "type": "private"},
+            "from": BOT_USER,
+        }
+        # Загружаемый файл идет отдельной частью запроса, а не в parameters
+        if endpoint == "sendPhoto":
+            message["photo"] = [{"file_id": "bench", "file_unique_id": "bench", "width": 1, "height": 1}]
+            message["caption"] = params.get("caption", "")
+        else:
+            message["text"] = params.get("text", "")
+        return message
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None,
+                         pool_timeout=None) -> Tuple[int, bytes]:
+        endpoint = url.rsplit("/", 1)[-1]
+        self.calls[endpoint] += 1
+        if endpoint == "getMe":
+            result: Any = BOT_USER
+        elif endpoint in ("answerCallbackQuery", "deleteWebhook"):
+            result = True
+        else:
+            result = self._message(endpoint, request_data)
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+def _user(user_id: int) -> Dict[str, Any]:
+    return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+
+def message_update(update_id: int, user_id: int, text: str) -> Dict[str, Any]:
+    """Сырое обновление с текстовым сообщением пользователя"""
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": _user(user_id),
+        "text": text,
+    }
+    if text.startswith("/"):
+        # Без сущности bot_command CommandHandler не узнает команду
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+def callback_update(update_id: int, user_id: int, data: str) -> Dict[str, Any]:
+    """Сырое обновление с нажатием inline-кнопки под сообщением бота"""
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": _user(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": BOT_USER,
+                "text": "...",
+            },
+        },
+    }
+
+def write_catalog(path: str, seed: int) -> None:
+    """Синтетический каталог со всеми редкостями (генератор из scripts.generate_players)"""
+    from scripts.generate_players import generate_player
+
+    random.seed(seed)
+    players = []
+    for rarity, count in CATALOG_SIZES.items():
+        players.extend(generate_player(len(players) + 1, rarity) for _ in range(count))
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "players": players,
+            "rarity_chances": {"common": 0.6, "rare": 0.25, "epic": 0.1, "legendary": 0.05},
+        }, f, ensure_ascii=False)
+
+def populate(teams: int, seed: int) -> None:
+    """Заполнить хранилище случайными командами с пользователями 1..teams"""
+    from game_data import game_data
+    from models.team import Team
+    from storage import storage
+
+    rng = random.Random(seed)
+    catalog = game_data.current.catalog
+    # Пишем мимо кэша в хранилище процесса: журнал нельзя открыть второй раз
+    backend = getattr(storage, "backend", storage)
+    batch = []
+    for user_id in range(1, teams + 1):
+        team = Team(f"FC User{user_id}")
+        for player in catalog.draw(n=SQUAD_SIZE, rng=rng):
+            team.add_player(player)
+        team.set_active_players(list(team.squad_ids[:3]))
+        team.points = rng.randint(0, 300)
+        team.money = rng.randint(0, 5000)
+        batch.append((str(user_id), team))
+        if len(batch) == 1000:
+            backend.save_teams(batch)
+            batch = []
+    backend.save_teams(batch)
+
+def _timed_stats(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    return {
+        "p50_ms": statistics.median(samples) * 1000,
+        "p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+        "mean_ms": statistics.fmean(samples) * 1000,
+    }
+
+async def _bench_handlers(teams: int, iterations: int, alloc_iterations: int, seed: int) -> Dict[str, Dict]:
+    from telegram import Update
+    from telegram.ext import ApplicationBuilder, ContextTypes
+    import bot_main_futbotchi as bot
+    from handlers import button_handlers
+    from storage import limiter, storage
+
+    app = (ApplicationBuilder().token(BENCH_TOKEN)
+           .request(FakeRequest()).get_updates_request(FakeRequest()).build())
+    await app.initialize()
+    rng = random.Random(seed)
+    update_ids = iter(range(1, 10 ** 9))
+    new_users = iter(range(teams + 1, 10 ** 9))
+
+    def existing_user() -> int:
+        return rng.randint(1, teams)
+
+    def reset_team(user_id: int) -> Any:
+        # Лимиты и деньги сбрасываются, чтобы каждый вызов шел по основной ветке
+        team = storage.get_team(str(user_id))
+        team.money = 10 ** 6
+        while len(team.squad_ids) > SQUAD_SIZE:
+            team.remove_player(team.squad_ids[-1])
+        team.set_active_players(list(team.squad_ids[:3]))
+        storage.save_team(str(user_id), team)
+        limiter.reset(str(user_id))
+        return team
+
+    def new_player_start() -> Dict:
+        return message_update(next(update_ids), next(new_users), "/start")
+
+    def text(value: str, reset: bool = False) -> Callable[[], Dict]:
+        def prepare() -> Dict:
+            user_id = existing_user()
+            if reset:
+                reset_team(user_id)
+            return message_update(next(update_ids), user_id, value)
+        return prepare
+
+    def button(data: str) -> Callable[[], Dict]:
+        def prepare() -> Dict:
+            user_id = existing_user()
+            reset_team(user_id)
+            return callback_update(next(update_ids), user_id, data)
+        return prepare
+
+    def toggle_button() -> Dict:
+        user_id = existing_user()
+        team = reset_team(user_id)
+        # Снятие активного игрока всегда проходит и перерисовывает состав
+        player_id = team.active_ids[rng.randrange(len(team.active_ids))]
+        return callback_update(next(update_ids), user_id, f"toggle_player_{player_id}")
+
+    # Имя -> (обработчик, подготовка сырого обновления)
+    scenarios: Dict[str, Tuple[Callable[..., Awaitable], Callable[[], Dict]]] = {
+        "start": (bot.start, new_player_start),
+        "show_squad": (bot.show_squad, text("💼 Состав")),
+        "buy_player": (bot.buy_player, text("🎲 Купить игрока", reset=True)),
+        "handle_toggle_player": (button_handlers.handle_toggle_player, toggle_button),
+        "support_money": (button_handlers.handle_support_action, button("support_money")),
+        "support_player": (button_handlers.handle_support_action, button("support_player")),
+        "handle_match_difficulty": (bot.handle_match_difficulty, button("match_easy")),
+        "show_top": (bot.show_top, text("🏆 Топ")),
+    }
+
+    async def measure(handler, prepare) -> float:
+        update = Update.de_json(prepare(), app.bot)
+        context = ContextTypes.DEFAULT_TYPE.from_update(update, app)
+        started = time.perf_counter()
+        await handler(update, context)
+        return time.perf_counter() - started
+
+    results = {}
+    for name, (handler, prepare) in scenarios.items():
+        # Первый вызов прогревает кэши (лидерборд, сэмплеры каталога)
+        first = await measure(handler, prepare)
+        samples = [await measure(handler, prepare) for _ in range(iterations)]
+
+        peaks, retained = [], []
+        tracemalloc.start()
+        for _ in range(alloc_iterations):
+            update = Update.de_json(prepare(), app.bot)
+            context = ContextTypes.DEFAULT_TYPE.from_update(update, app)
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            await handler(update, context)
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+        tracemalloc.stop()
+
+        # Трансляции матчей не запускаются: задачи JobQueue только снимаются
+        for job in app.job_queue.jobs():
+            job.schedule_removal()
+
+        results[name] = {
+            "first_ms": first * 1000,
+            **_timed_stats(samples),
+            "peak_kib": statistics.median(peaks) / 1024,
+            "retained_b": statistics.fmean(retained),
+        }
+    await app.shutdown()
+    storage.close()
+    return results
+
+def run_size(teams: int, backend: str, iterations: int, alloc_iterations: int, seed: int) -> Dict[str, Dict]:
+    """Прогон для одного размера базы (вызывается в отдельном процессе)"""
+    # Базы и каталог живут во временном каталоге и удаляются после прогона
+    with tempfile.TemporaryDirectory(prefix="futbochi-bench-") as workdir:
+        os.environ.update({
+            "TELEGRAM_TOKEN": BENCH_TOKEN,
+            "STORAGE_BACKEND": backend,
+            "STORAGE_TEAMS_DIR": os.path.join(workdir, "teams"),
+            "STORAGE_SQLITE_PATH": os.path.join(workdir, "teams.db"),
+            "STORAGE_JOURNAL_DIR": os.path.join(workdir, "journal"),
+            "MEDIA_CACHE_PATH": os.path.join(workdir, "file_ids.json"),
+            "GAME_DATA_RELOAD_INTERVAL": "0",
+        })
+
+        from game_data import game_data
+
+        game_data.players_path = os.path.join(workdir, "players.json")
+        write_catalog(game_data.players_path, seed)
+        game_data.reload()
+
+        started = time.perf_counter()
+        populate(teams, seed)
+        populate_seconds = time.perf_counter() - started
+
+        # Логи обработчиков не должны попадать в замер и вывод
+        logging.disable(logging.INFO)
+        results = asyncio.run(_bench_handlers(teams, iterations, alloc_iterations, seed))
+        logging.disable(logging.NOTSET)
+        return {"populate_s": populate_seconds, "handlers": results}
+
+def format_report(reports: Dict[int, Dict]) -> str:
+    lines = []
+    header = f"{'handler':<26}{'first ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'peak KiB':>10}{'retained B':>12}"
+    for teams, report in reports.items():
+        lines.append(f"== {teams} teams (populated in {report['populate_s']:.1f} s) ==")
+        lines.append(header)
+        for name, r in report["handlers"].items():
+            lines.append(
+                f"{name:<26}{r['first_ms']:>10.2f}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+                f"{r['peak_kib']:>10.1f}{r['retained_b']:>12.0f}"
+            )
+        lines.append("")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк обработчиков на синтетических обновлениях")
+    parser.add_argument("--teams", type=int, nargs="+", default=list(DEFAULT_SIZES), help="размеры базы")
+    parser.add_argument("--backend", choices=("json", "sqlite", "journal"), default="json")
+    parser.add_argument("--iterations", type=int, default=200, help="замеров времени на обработчик")
+    parser.add_argument("--alloc-iterations", type=int, default=20, help="замеров памяти на обработчик")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="сохранить результаты в JSON для сравнения")
+    args = parser.parse_args()
+
+    reports = {}
+    # Каждый размер в чистом процессе: хранилище и кэши - глобальные объекты модулей
+    spawn = multiprocessing.get_context("spawn")
+    for teams in args.teams:
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+            reports[teams] = pool.submit(
+                run_size, teams, args.backend, args.iterations, args.alloc_iterations, args.seed
+            ).result()
+        print(format_report({teams: reports[teams]}), flush=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"backend": args.backend, "reports": reports}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
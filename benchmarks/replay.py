@@ -0,0 +1,306 @@
+"""Нагрузочный тест бота целиком через фейковый Bot API.
+
+Поднимает benchmarks.fake_bot_api, запускает bot_main_futbotchi.py отдельным
+процессом с TELEGRAM_BASE_URL на этот сервер и подает поток обновлений с
+заданной скоростью. Поток - JSONL-файл (по обновлению Telegram в строке,
+update_id назначаются заново) или синтетические пользователи: /start и
+случайные кнопки меню.
+
+Бот работает во временном каталоге с пустым хранилищем, копией
+data/match_data.json и синтетическим каталогом игроков, так что рабочие
+teams/ не затрагиваются.
+
+--outbound-rate включает ограничитель исходящих сообщений бота (по
+умолчанию он выключен, чтобы мерить сам бот), а --flood-rate заставляет
+фейковый Bot API отвечать 429, как Telegram при превышении лимитов.
+
+--workers N запускает бота с BOT_WORKERS=N: ingress-процесс раздает
+обновления N процессам-воркерам (см. benchmarks.scaling).
+
+С --mode webhook бот запускается с BOT_MODE=webhook, и обновления
+доставляются POST-запросами на его вебхук с секретным токеном; ответ 503
+повторяется через Retry-After, как это делает Telegram.
+
+Отчет: пропускная способность (ответов в секунду), задержка ответа p50/p90/
+p99/max, доля обновлений без ответа и ошибки Bot API.
+
+Запуск из корня репозитория:
+    python -m benchmarks.replay --users 2000 --updates-per-user 5 --rate 500
+    python -m benchmarks.replay --input recorded.jsonl --rate 0
+    python -m benchmarks.replay --mode webhook --users 2000 --rate 500
+    python -m benchmarks.replay --users 200 --rate 50 --outbound-rate 30 --flood-rate 30
+    python -m benchmarks.replay --users 2000 --rate 0 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import shutil
+import signal
+import socket
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Set
+
+import aiohttp
+
+from benchmarks.fake_bot_api import FakeBotAPI, start_server
+from benchmarks.handlers import BENCH_TOKEN, callback_update, message_update, write_catalog
+from game_data import MATCH_DATA_PATH
+from webhook import SECRET_HEADER
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_SECRET = "replay-secret"
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Действия синтетических пользователей после /start и их веса
+SYNTHETIC_ACTIONS = (
+    (("text", "💼 Состав"), 3),
+    (("text", "🏆 Топ"), 2),
+    (("text", "🧑 Профиль"), 2),
+    (("text", "🎲 Купить игрока"), 2),
+    (("text", "🏟 Играть матч"), 1),
+    (("button", "match_easy"), 2),
+    (("button", "support_money"), 1),
+)
+
+def synthetic_stream(users: int, updates_per_user: int, seed: int) -> Iterator[Dict]:
+    """Все пользователи начинают с /start, затем по очереди жмут случайные кнопки"""
+    rng = random.Random(seed)
+    actions, weights = zip(*SYNTHETIC_ACTIONS)
+    for user_id in range(1, users + 1):
+        yield message_update(0, user_id, "/start")
+    for _ in range(updates_per_user - 1):
+        for user_id in range(1, users + 1):
+            kind, value = rng.choices(actions, weights)[0]
+            if kind == "text":
+                yield message_update(0, user_id, value)
+            else:
+                yield callback_update(0, user_id, value)
+
+def file_stream(path: str) -> Iterator[Dict]:
+    """Записанный поток: по одному обновлению Telegram в строке"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def prepare_workdir(players_path: Optional[str], seed: int) -> str:
+    """Временный рабочий каталог бота с данными и медиа"""
+    workdir = tempfile.mkdtemp(prefix="futbochi-replay-")
+    os.makedirs(os.path.join(workdir, "data"))
+    shutil.copy(os.path.join(REPO_ROOT, MATCH_DATA_PATH), os.path.join(workdir, MATCH_DATA_PATH))
+    players_target = os.path.join(workdir, "data", "players.json")
+    if players_path:
+        shutil.copy(players_path, players_target)
+    else:
+        write_catalog(players_target, seed)
+    os.symlink(os.path.join(REPO_ROOT, "media"), os.path.join(workdir, "media"))
+    return workdir
+
+class WebhookDelivery:
+    """Доставка обновлений POST-запросами на вебхук бота"""
+
+    def __init__(self, url: str, secret: str):
+        self.url = url
+        self.secret = secret
+        self.statuses: Counter = Counter()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def open(self) -> None:
+        self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=100))
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self.drain()
+            await self._session.close()
+
+    async def wait_ready(self, timeout: float) -> None:
+        """Дождаться, пока сервер вебхука бота начнет отвечать"""
+        health_url = self.url.rsplit("/", 1)[0] + "/healthz"
+        deadline = time.perf_counter() + timeout
+        while True:
+            try:
+                async with self._session.get(health_url) as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                if time.perf_counter() > deadline:
+                    raise
+            await asyncio.sleep(0.1)
+
+    async def _post(self, update: Dict) -> None:
+        # Как Telegram: на 503 доставка повторяется через Retry-After
+        while True:
+            try:
+                async with self._session.post(
+                    self.url, json=update, headers={SECRET_HEADER: self.secret}
+                ) as response:
+                    self.statuses[response.status] += 1
+                    if response.status != 503:
+                        return
+                    delay = float(response.headers.get("Retry-After", 1))
+            except aiohttp.ClientError as e:
+                self.statuses[type(e).__name__] += 1
+                return
+            await asyncio.sleep(delay)
+
+    def send(self, updates: List[Dict]) -> None:
+        for update in updates:
+            task = asyncio.create_task(self._post(update))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def drain(self) -> None:
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
+
+async def feed(api: FakeBotAPI, stream: Iterator[Dict], rate: float,
+               webhook: Optional[WebhookDelivery] = None) -> None:
+    """Подавать обновления со скоростью rate в секунду (0 - все сразу)"""
+    def deliver(batch: List[Dict]) -> None:
+        if webhook is None:
+            api.push(batch)
+        else:
+            webhook.send(api.push(batch, enqueue=False))
+
+    if rate <= 0:
+        deliver(list(stream))
+        return
+    started = time.perf_counter()
+    sent = 0
+    batch: List[Dict] = []
+    for update in stream:
+        batch.append(update)
+        # Пачками по расписанию, а не по одному sleep на обновление
+        due = started + (sent + len(batch)) / rate
+        if due - time.perf_counter() > 0.005:
+            deliver(batch)
+            sent += len(batch)
+            batch = []
+            await asyncio.sleep(due - time.perf_counter())
+    deliver(batch)
+
+async def run(args) -> Dict:
+    api = FakeBotAPI(args.flood_rate)
+    runner = await start_server(api, port=args.port)
+    host, port = runner.addresses[0][:2]
+    workdir = prepare_workdir(args.players, args.seed)
+
+    env = dict(
+        os.environ,
+        TELEGRAM_TOKEN=BENCH_TOKEN,
+        TELEGRAM_BASE_URL=f"http://{host}:{port}/bot",
+        STORAGE_TEAMS_DIR=os.path.join(workdir, "teams"),
+        STORAGE_SQLITE_PATH=os.path.join(workdir, "teams.db"),
+        MEDIA_CACHE_PATH=os.path.join(workdir, "file_ids.json"),
+        PYTHONPATH=REPO_ROOT,
+        BOT_MODE=args.mode,
+        OUTBOUND_RATE_LIMIT=str(args.outbound_rate),
+        BOT_WORKERS=str(args.workers),
+    )
+    webhook = None
+    if args.mode == "webhook":
+        webhook_port = _free_port()
+        env.update(WEBHOOK_SECRET=WEBHOOK_SECRET, WEBHOOK_HOST="127.0.0.1", PORT=str(webhook_port))
+        env.pop("WEBHOOK_URL", None)
+        webhook = WebhookDelivery(f"http://127.0.0.1:{webhook_port}/telegram", WEBHOOK_SECRET)
+    bot_log = open(os.path.join(workdir, "bot.log"), "wb")
+    bot = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(REPO_ROOT, "bot_main_futbotchi.py"),
+        cwd=workdir, env=env, stdout=bot_log, stderr=bot_log,
+    )
+    try:
+        stream = file_stream(args.input) if args.input else synthetic_stream(
+            args.users, args.updates_per_user, args.seed
+        )
+        if webhook is None:
+            await asyncio.wait_for(api.polling.wait(), args.startup_timeout)
+            started = time.perf_counter()
+            await feed(api, stream, args.rate)
+        else:
+            await webhook.open()
+            await webhook.wait_ready(args.startup_timeout)
+            started = time.perf_counter()
+            await feed(api, stream, args.rate, webhook)
+            await webhook.drain()
+        fed = time.perf_counter() - started
+
+        # Ждем ответов на все обновления или истечения drain_timeout
+        deadline = time.perf_counter() + args.drain_timeout
+        while api.answered < api.pushed and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+    finally:
+        if webhook is not None:
+            await webhook.close()
+        if bot.returncode is None:
+            bot.send_signal(signal.SIGINT)
+            await bot.wait()
+        bot_log.close()
+        await runner.cleanup()
+
+    return {"feed_s": fed, "elapsed_s": elapsed, "workdir": workdir, "exit_code": bot.returncode, **api.stats(),
+            "latencies": api.latencies, "webhook_statuses": dict(webhook.statuses) if webhook else None}
+
+def format_report(result: Dict) -> str:
+    latencies = sorted(result["latencies"])
+    pushed, answered = result["pushed"], result["answered"]
+    lines = [
+        f"Updates: {pushed} fed in {result['feed_s']:.1f} s, {answered} answered in {result['elapsed_s']:.1f} s",
+        f"Throughput: {answered / result['elapsed_s']:.0f} answered updates/s",
+        f"Unanswered: {pushed - answered} ({(pushed - answered) / max(pushed, 1):.1%})",
+    ]
+    if latencies:
+        pick = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000
+        lines.append(
+            f"Reply latency ms: p50 {statistics.median(latencies) * 1000:.1f}  p90 {pick(0.9):.1f}  "
+            f"p99 {pick(0.99):.1f}  max {latencies[-1] * 1000:.1f}"
+        )
+    lines.append(f"Bot API calls: {result['calls']}")
+    lines.append(f"Bot API errors: {result['errors'] or 'none'}")
+    if result["webhook_statuses"] is not None:
+        lines.append(f"Webhook responses: {result['webhook_statuses']}")
+    lines.append(f"Bot exit code: {result['exit_code']}, log: {os.path.join(result['workdir'], 'bot.log')}")
+    return "\n".join(lines)
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота через фейковый Bot API")
+    parser.add_argument("--mode", choices=("polling", "webhook"), default="polling",
+                        help="как бот получает обновления")
+    parser.add_argument("--input", help="JSONL с обновлениями Telegram (по умолчанию синтетический поток)")
+    parser.add_argument("--users", type=int, default=1000, help="синтетических пользователей")
+    parser.add_argument("--updates-per-user", type=int, default=5, help="обновлений на пользователя")
+    parser.add_argument("--rate", type=float, default=500, help="обновлений в секунду, 0 - все сразу")
+    parser.add_argument("--players", help="каталог игроков для бота (по умолчанию синтетический)")
+    parser.add_argument("--outbound-rate", type=float, default=0,
+                        help="OUTBOUND_RATE_LIMIT бота, сообщений в секунду (0 - без ограничения)")
+    parser.add_argument("--flood-rate", type=float, default=0,
+                        help="фейковый Bot API отвечает 429 сверх стольких сообщений в секунду")
+    parser.add_argument("--port", type=int, default=0, help="порт фейкового Bot API (0 - любой свободный)")
+    parser.add_argument("--startup-timeout", type=float, default=30)
+    parser.add_argument("--drain-timeout", type=float, default=60, help="сколько ждать ответов после подачи")
+    parser.add_argument("--workers", type=int, default=1, help="BOT_WORKERS бота: процессов с обработчиками")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser
+
+def main():
+    args = build_parser().parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    print(format_report(asyncio.run(run(args))))
+
+if __name__ == "__main__":
+    main()
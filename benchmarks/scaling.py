@@ -0,0 +1,85 @@
+"""Масштабирование бота по процессам-воркерам (BOT_WORKERS).
+
+Для каждого числа воркеров прогоняет benchmarks.replay на одном и том же
+синтетическом потоке, поданном разом (--rate 0), и сравнивает пропускную
+способность с одним процессом. Ingress-процесс тоже занимает ядро, поэтому
+рост близок к линейному, пока воркеров меньше, чем ядер.
+
+Запуск из корня репозитория:
+    python -m benchmarks.scaling
+    python -m benchmarks.scaling --workers 1 2 4 8 --users 4000 --output scaling.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+from typing import Dict, List
+
+from benchmarks import replay
+
+def default_workers() -> List[int]:
+    """1, 2, 4, ... до числа ядер"""
+    cores = os.cpu_count() or 1
+    workers = [1]
+    while workers[-1] * 2 <= cores:
+        workers.append(workers[-1] * 2)
+    if workers[-1] != cores:
+        workers.append(cores)
+    return workers
+
+def run_once(workers: int, args) -> Dict:
+    replay_args = replay.build_parser().parse_args([
+        "--mode", args.mode,
+        "--users", str(args.users),
+        "--updates-per-user", str(args.updates_per_user),
+        "--rate", "0",
+        "--drain-timeout", str(args.drain_timeout),
+        "--workers", str(workers),
+        "--seed", str(args.seed),
+    ])
+    result = asyncio.run(replay.run(replay_args))
+    latencies = sorted(result.pop("latencies"))
+    return {
+        "workers": workers,
+        "pushed": result["pushed"],
+        "answered": result["answered"],
+        "elapsed_s": result["elapsed_s"],
+        "throughput": result["answered"] / result["elapsed_s"],
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else None,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else None,
+        "exit_code": result["exit_code"],
+    }
+
+def format_report(rows: List[Dict]) -> str:
+    base = rows[0]["throughput"]
+    lines = [f"{'workers':>7}{'answered':>10}{'updates/s':>11}{'speedup':>9}{'p50 ms':>9}{'p99 ms':>9}{'exit':>6}"]
+    for row in rows:
+        lines.append(
+            f"{row['workers']:>7}{row['answered']:>10}{row['throughput']:>11.0f}{row['throughput'] / base:>9.2f}"
+            f"{row['p50_ms'] or 0:>9.0f}{row['p99_ms'] or 0:>9.0f}{row['exit_code']:>6}"
+        )
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Масштабирование бота по процессам-воркерам")
+    parser.add_argument("--workers", type=int, nargs="+", default=default_workers(),
+                        help="числа воркеров для прогонов (по умолчанию 1, 2, 4, ... до числа ядер)")
+    parser.add_argument("--mode", choices=("polling", "webhook"), default="polling")
+    parser.add_argument("--users", type=int, default=2000, help="синтетических пользователей")
+    parser.add_argument("--updates-per-user", type=int, default=5, help="обновлений на пользователя")
+    parser.add_argument("--drain-timeout", type=float, default=120, help="сколько ждать ответов после подачи")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="записать результаты в JSON-файл")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    rows = [run_once(workers, args) for workers in args.workers]
+    print(format_report(rows))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+if __name__ == "__main__":
+    main()
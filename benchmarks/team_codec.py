@@ -0,0 +1,103 @@
+"""Бенчмарк форматов хранения команд: размер и скорость кодирования.
+
+Сравниваются JSON с отступами (файлы teams/<id>.json), компактный JSON
+(прежний формат колонки data в SQLite) и двоичный формат
+models.team_codec. Команды случайные: полный состав, основа из трех
+игроков, время последнего матча, у части команд выбрана стратегия.
+Декодирование включает сборку объекта Team.
+
+Запуск из корня репозитория:
+    python -m benchmarks.team_codec
+    python -m benchmarks.team_codec --teams 5000 --repeat 5 --output codec.json
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+from models.team import MAX_SQUAD_SIZE, Team
+from models.team_codec import decode_team, encode_team
+
+CATALOG_SIZE = 400
+
+def make_teams(count: int, seed: int) -> List[Team]:
+    rng = random.Random(seed)
+    started = datetime(2025, 1, 1)
+    teams = []
+    for user_id in range(count):
+        team = Team(f"FC User{user_id}")
+        squad = [rng.randint(1, CATALOG_SIZE) for _ in range(MAX_SQUAD_SIZE)]
+        team._set_roster(squad, rng.sample(squad, 3))
+        team.money = rng.randint(0, 50000)
+        team.points = rng.randint(0, 3000)
+        team.last_match_time = started + timedelta(seconds=rng.randint(0, 10 ** 7), microseconds=rng.randint(0, 10 ** 6))
+        team.strategy = rng.choice((None, "attack", "defense"))
+        team.sirena_player_bonus_used = rng.random() < 0.5
+        team.version = rng.randint(1, 500)
+        teams.append(team)
+    return teams
+
+# Формат: (кодирование в bytes, декодирование в Team)
+FORMATS: Dict[str, Tuple[Callable[[Team], bytes], Callable[[bytes], Team]]] = {
+    "json_indent": (
+        lambda team: json.dumps(team.to_dict(), ensure_ascii=False, indent=2).encode("utf-8"),
+        lambda data: Team.from_dict(json.loads(data)),
+    ),
+    "json_compact": (
+        lambda team: json.dumps(team.to_dict(), ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+        lambda data: Team.from_dict(json.loads(data)),
+    ),
+    "binary": (encode_team, decode_team),
+}
+
+def measure(teams: List[Team], repeat: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name, (encode, decode) in FORMATS.items():
+        encode_runs, decode_runs = [], []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            documents = [encode(team) for team in teams]
+            encode_runs.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            decoded = [decode(data) for data in documents]
+            decode_runs.append(time.perf_counter() - started)
+
+        # Формат должен возвращать ту же команду
+        assert [team.to_dict() for team in decoded] == [team.to_dict() for team in teams], name
+        sizes = [len(data) for data in documents]
+        results[name] = {
+            "bytes_avg": statistics.mean(sizes),
+            "bytes_total": sum(sizes),
+            "encode_us": min(encode_runs) / len(teams) * 1e6,
+            "decode_us": min(decode_runs) / len(teams) * 1e6,
+        }
+    return results
+
+def format_report(results: Dict[str, Dict[str, float]]) -> str:
+    lines = [f"{'format':<14}{'bytes':>9}{'total KiB':>12}{'encode us':>12}{'decode us':>12}"]
+    for name, row in results.items():
+        lines.append(
+            f"{name:<14}{row['bytes_avg']:>9.0f}{row['bytes_total'] / 1024:>12.1f}"
+            f"{row['encode_us']:>12.2f}{row['decode_us']:>12.2f}"
+        )
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк форматов хранения команд")
+    parser.add_argument("--teams", type=int, default=10000, help="количество команд")
+    parser.add_argument("--repeat", type=int, default=3, help="повторов, берется лучший")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="записать результаты в JSON-файл")
+    args = parser.parse_args()
+
+    results = measure(make_teams(args.teams, args.seed), args.repeat)
+    print(format_report(results))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"teams": args.teams, "formats": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
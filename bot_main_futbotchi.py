@@ -1,52 +1,80 @@
 # main bot entry point
 
 import os
+import asyncio
 import logging
 import random
-import json
-import time
-from datetime import datetime, timedelta
+from collections import deque
 from dotenv import load_dotenv
+
+# Load environment variables before the storage backend is selected
+load_dotenv()
+
 from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import (
-    Updater,
+    Application,
+    ApplicationBuilder,
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
-    Filters,
-    CallbackContext
+    ContextTypes,
+    filters
 )
-from storage import storage
+from storage import storage, limiter
+from game_data import game_data
 from models.team import Team
+from models.limits import format_wait
+from models.match import (
+    TEAM_ATTACKS, OPPONENT_ATTACKS, calculate_team_rating, match_odds, match_reward,
+    opponent_goal_chance, team_goal_chance,
+)
 from handlers.button_handlers import (
     handle_toggle_player,
     handle_support_action,
     create_support_keyboard,
-    create_squad_keyboard,
-    format_squad_message
+)
+from handlers.squad_view import squad_views
+from handlers.update_processor import PerUserUpdateProcessor, UpdateQueue
+from media_cache import media_registry
+from rate_limiter import OutboundRateLimiter, PRIORITY_BACKGROUND
+from webhook import WebhookServer, run_webhook
+from cluster import WorkerPool, build_ingress
+from metrics import (
+    InstrumentedRequest, MetricsServer, instrument_handlers, instrument_storage, register_runtime_collector,
 )
 
 # Configure logging
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.DEBUG
+    level=os.getenv('LOG_LEVEL', 'INFO').upper()
 )
+# httpx пишет каждый запрос вместе с URL, а в URL Bot API есть токен
+logging.getLogger('httpx').setLevel(logging.WARNING)
+# APScheduler пишет о каждом тике трансляции матча
+logging.getLogger('apscheduler').setLevel(logging.WARNING)
 
 # Create logger
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
 TOKEN = os.getenv('TELEGRAM_TOKEN')
 
 if not TOKEN:
     raise ValueError("No token found! Make sure you have TELEGRAM_TOKEN in your .env file")
 
-# Debug print
-logger.info(f"Starting bot with token: {TOKEN}")
-
 # Constants
 PLAYER_COST = 1000  # Стоимость покупки игрока
+BASE_URL = os.getenv('TELEGRAM_BASE_URL')  # Свой сервер Bot API, например http://127.0.0.1:8081/bot
+MAX_CONCURRENT_UPDATES = int(os.getenv('MAX_CONCURRENT_UPDATES', '256'))  # Одновременно обрабатываемых обновлений
+UPDATE_QUEUE_SIZE = int(os.getenv('UPDATE_QUEUE_SIZE', '1000'))  # Лимит принятых, но еще не обработанных обновлений
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()  # polling или webhook
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))  # Порт для /metrics в формате Prometheus, 0 - выключено
+OUTBOUND_RATE_LIMIT = float(os.getenv('OUTBOUND_RATE_LIMIT', '25'))  # Сообщений в секунду на всех, 0 - без ограничения
+OUTBOUND_CHAT_RATE_LIMIT = float(os.getenv('OUTBOUND_CHAT_RATE_LIMIT', '1'))  # Сообщений в секунду в один чат
+BOT_WORKERS = int(os.getenv('BOT_WORKERS', '1'))  # Процессов с обработчиками; больше 1 - ingress-процесс и воркеры
+# Как часто перестраивать рейтинг по хранилищу: воркеры не видят сохранения друг друга
+LEADERBOARD_REFRESH_INTERVAL = float(os.getenv('LEADERBOARD_REFRESH_INTERVAL', '60' if BOT_WORKERS > 1 else '0'))
+WELCOME_IMAGE = 'media/welcome.jpg'  # Пережатая картинка из generate_welcome_image.py
+MATCH_EVENT_DELAY = 2  # Пауза между событиями трансляции матча, секунды
 
 # Keyboard layouts
 MAIN_KEYBOARD = ReplyKeyboardMarkup([
@@ -77,40 +105,32 @@ def get_bot_info():
         "Удачи в создании своей футбольной империи! 🏆"
     )
 
-def start(update: Update, context: CallbackContext):
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Начало работы с ботом"""
     user = update.effective_user
     user_id = str(user.id)
     
-    team = storage.get_team(user_id)
+    team = await storage.aget_team(user_id)
     if not team:
         # Создаем новую команду
         team = Team(f"FC {user.first_name}")
-        # Добавляем стартовых игроков
-        players_db = storage.load_players_database()
-        
-        # Находим common игроков
-        common_players = [p for p in players_db["players"] if p["rarity"] == "common"]
-        # Находим rare игроков
-        rare_players = [p for p in players_db["players"] if p["rarity"] == "rare"]
-        
-        # Выбираем случайных игроков
-        starter_players = random.sample(common_players, 2) + random.sample(rare_players, 1)
+        # Добавляем стартовых игроков: два common и один rare; если в каталоге
+        # их не хватает, недостающие выбираются по шансам редкости, как при покупке
+        catalog = game_data.current.catalog
+        starter_players = catalog.sample_or_draw("common", 2) + catalog.sample_or_draw("rare", 1)
         
         for player in starter_players:
             team.add_player(player)
         team.set_active_players([p["id"] for p in starter_players])
         
         # Сохраняем команду
-        storage.save_team(user_id, team)
+        await storage.asave_team(user_id, team)
         
         welcome_message = (
             f"Привет, {user.first_name}! 👋\n\n"
             f"{get_bot_info()}\n\n"
             "Я создал для тебя команду и выдал тебе стартовых игроков:\n"
-            f"• {starter_players[0]['name']} (Common)\n"
-            f"• {starter_players[1]['name']} (Common)\n"
-            f"• {starter_players[2]['name']} (Rare)"
+            + "\n".join(f"• {p['name']} ({p['rarity'].capitalize()})" for p in starter_players)
         )
     else:
         welcome_message = (
@@ -118,41 +138,45 @@ def start(update: Update, context: CallbackContext):
             "Твоя команда ждет тебя! Используй кнопки ниже, чтобы продолжить игру."
         )
     
-    # Отправляем приветственное изображение вместе с сообщением
-    with open('media/welcome.png', 'rb') as photo:
-        update.message.reply_photo(
-            photo=photo,
-            caption=welcome_message,
-            reply_markup=MAIN_KEYBOARD,
-            parse_mode='HTML'
-        )
+    # Отправляем приветственное изображение вместе с сообщением;
+    # файл загружается в Telegram один раз, дальше отправляется его file_id
+    await media_registry.send_photo(
+        context.bot,
+        update.effective_chat.id,
+        WELCOME_IMAGE,
+        caption=welcome_message,
+        reply_markup=MAIN_KEYBOARD,
+        parse_mode='HTML'
+    )
 
-def show_squad(update: Update, context: CallbackContext):
+async def show_squad(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать состав команды"""
     user_id = str(update.effective_user.id)
-    team = storage.get_team(user_id)
+    team = await storage.aget_team(user_id)
     if not team:
-        update.message.reply_text("Сначала начните игру командой /start")
+        await update.message.reply_text("Сначала начните игру командой /start")
         return
 
-    squad_message = format_squad_message(team)
-    keyboard = create_squad_keyboard(team)
-    update.message.reply_text(squad_message, reply_markup=keyboard)
+    view = squad_views.render(user_id, team)
+    await update.message.reply_text(view.text, reply_markup=view.keyboard)
 
-def support_club(update: Update, context: CallbackContext):
+async def support_club(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Поддержать клуб"""
     user_id = str(update.effective_user.id)
-    team = storage.get_team(user_id)
+    team = await storage.aget_team(user_id)
     if not team:
-        update.message.reply_text("Сначала начните игру командой /start")
+        await update.message.reply_text("Сначала начните игру командой /start")
         return
 
-    if not team.can_support():
-        update.message.reply_text("Подождите 2 минуты перед следующей поддержкой клуба")
+    check = await limiter.acheck(user_id, "support")
+    if not check.allowed:
+        await update.message.reply_text(
+            f"Подождите {format_wait(check.retry_after)} перед следующей поддержкой клуба"
+        )
         return
 
     keyboard = create_support_keyboard()
-    update.message.reply_text(
+    await update.message.reply_text(
         "Выберите действие для поддержки клуба:",
         reply_markup=keyboard
     )
@@ -166,20 +190,21 @@ def create_sirena_keyboard(bonus_type: str):
     ])
     return keyboard
 
-def buy_player(update: Update, context: CallbackContext):
+async def buy_player(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Покупка нового игрока"""
     user = update.effective_user
     user_id = str(user.id)
     
-    team = storage.get_team(user_id)
+    team = await storage.aget_team(user_id)
     if not team:
-        update.message.reply_text("Сначала создайте команду с помощью /start")
+        await update.message.reply_text("Сначала создайте команду с помощью /start")
         return
 
     # Проверка лимита покупок
-    if not team.can_buy_player():
+    check = await limiter.acheck(user_id, "buy_player")
+    if not check.allowed:
         if team.can_use_sirena_player_bonus():
-            update.message.reply_text(
+            await update.message.reply_text(
                 "Трансферный лимит 3 игрока за 10 минут!\n"
                 "Но «СиренаБет» спешит на помощь!\n"
                 "Нажми по ссылке, сделай депозит, и получи одного игрока.",
@@ -187,48 +212,48 @@ def buy_player(update: Update, context: CallbackContext):
             )
             return
         else:
-            update.message.reply_text(
+            await update.message.reply_text(
                 "Достигнут лимит покупок (4 игрока за 10 минут).\n"
-                "Подождите некоторое время."
+                f"Следующая покупка через {format_wait(check.retry_after)}."
             )
             return
 
     # Проверка наличия денег
     if team.money < PLAYER_COST:
         if team.can_use_sirena_no_money_bonus():
-            update.message.reply_text(
+            await update.message.reply_text(
                 "Кончились деньги! Но «СиренаБет» спешит на помощь!\n"
                 "Нажми по ссылке, сделай депозит, и получи одного игрока.",
                 reply_markup=create_sirena_keyboard("nomoney")
             )
             return
         else:
-            update.message.reply_text(
+            await update.message.reply_text(
                 f"Недостаточно монет для покупки игрока.\n"
                 f"Нужно: {PLAYER_COST} 🪙\nУ вас есть: {team.money} 🪙"
             )
             return
 
-    # Загружаем базу игроков
-    players_db = storage.load_players_database()
-    
     # Выбираем случайного игрока с учетом редкости
-    rarity = random.choices(
-        list(players_db["rarity_chances"].keys()),
-        list(players_db["rarity_chances"].values())
-    )[0]
-    
-    available_players = [p for p in players_db["players"] if p["rarity"] == rarity]
-    if not available_players:
-        update.message.reply_text("Ошибка: не удалось найти подходящего игрока")
+    player = game_data.current.catalog.draw()
+    if player is None:
+        await update.message.reply_text("Ошибка: не удалось найти подходящего игрока")
         return
     
-    player = random.choice(available_players)
-    
-    # Добавляем игрока в команду
-    team.add_player(player)
-    team.add_player_purchase()  # Записываем покупку
-    team.money -= PLAYER_COST
+    # Занимаем слот лимита; его мог успеть занять другой процесс
+    check = await limiter.aacquire(user_id, "buy_player")
+    if not check.allowed:
+        await update.message.reply_text(
+            f"Достигнут лимит покупок. Следующая покупка через {format_wait(check.retry_after)}."
+        )
+        return
+
+    # Добавляем игрока в команду; покупка повторяется на свежей копии,
+    # если команду изменил другой процесс
+    def buy(team):
+        team.add_player(player)
+        team.money -= PLAYER_COST
+    await storage.aupdate_team(user_id, buy)
     
     # Определяем эмодзи для редкости
     rarity_emoji = {
@@ -248,43 +273,13 @@ def buy_player(update: Update, context: CallbackContext):
     message += f"⚽️ Удар: {player['stats']['finishing']}\n"
     message += f"🛡 Защита: {player['stats']['defense']}"
     
-    storage.save_team(user_id, team)
-    update.message.reply_text(message)
-
-def calculate_team_strength(team_power):
-    """Calculate team strength based on stats"""
-    # Weights for different stats
-    weights = {
-        'speed': 0.25,
-        'mentality': 0.2,
-        'finishing': 0.35,
-        'defense': 0.2
-    }
-    
-    # Calculate weighted strength
-    strength = sum(team_power[stat] * weight for stat, weight in weights.items())
-    return strength / 100  # Convert to 0-1 range
-
-def calculate_team_rating(team_power):
-    """Calculate overall team rating based on power stats"""
-    # Веса для расчета общего рейтинга
-    weights = {
-        'speed': 0.25,
-        'mentality': 0.2,
-        'finishing': 0.35,
-        'defense': 0.2
-    }
-    
-    rating = sum(team_power[stat] * weight for stat, weight in weights.items())
-    return round(rating, 1)
+    await update.message.reply_text(message)
 
 def generate_match_events(team, opponent, difficulty):
     """Generate match events and calculate the result"""
     try:
-        # Load match data
-        with open('data/match_data.json', 'r', encoding='utf-8') as f:
-            match_data = json.load(f)
-        
+        data = game_data.current
+
         # Initialize variables
         events = []
         team_goals = 0
@@ -295,53 +290,34 @@ def generate_match_events(team, opponent, difficulty):
         opponent_strength = opponent['strength']
         opponent_rating = opponent_strength * 10  # Конвертируем в такой же формат как у команды игрока
         
-        # Рассчитываем базовую вероятность гола для команды игрока
-        # Учитываем параметр удара и общий рейтинг
-        finishing_factor = team_power['finishing'] / 100  # 0-1
-        rating_factor = team_rating / 10  # 0-1
-        
-        # Базовый шанс гола зависит от сложности
-        difficulty_goal_chance = {
-            'easy': 0.4,    # 40% базовый шанс на легком
-            'medium': 0.35,  # 35% на среднем
-            'hard': 0.3     # 30% на сложном
-        }
-        
-        base_goal_chance = difficulty_goal_chance[difficulty]
-        
-        # Финальный шанс гола учитывает удар, рейтинг и сложность
-        team_goal_chance = base_goal_chance * (0.6 * finishing_factor + 0.4 * rating_factor)
+        # Шанс гола учитывает удар, рейтинг и сложность (модель в models.match)
+        team_chance = team_goal_chance(team_power, difficulty)
         
         # Для каждой атаки проверяем шанс гола
-        num_attacks = 5  # Увеличиваем количество атак
-        for _ in range(num_attacks):
+        for _ in range(TEAM_ATTACKS):
             # Выбираем случайного игрока
             player = random.choice(team.active_players)
             
             # Проверяем успешность атаки
-            if random.random() < team_goal_chance:
+            if random.random() < team_chance:
                 # Гол!
-                action = random.choice([a for a in match_data['match_actions']['positive'] if a['is_goal']])
+                action = random.choice(data.goal_actions)
                 team_goals += 1
                 events.append(f"{player['name']}... {action['action']}")
             else:
                 # Неудачная атака
                 if random.random() < 0.7:  # 70% шанс позитивного события
-                    action = random.choice([a for a in match_data['match_actions']['positive'] if not a['is_goal']])
+                    action = random.choice(data.chance_actions)
                 else:
-                    action = random.choice(match_data['match_actions']['negative'])
+                    action = random.choice(data.negative_actions)
                 events.append(f"{player['name']}... {action['action']}")
         
         # Рассчитываем голы соперника
         opponent_goals = 0
-        opponent_attacks = 4  # Меньше атак у соперника
-        
-        # Защита команды влияет на шансы соперника
-        defense_factor = team_power['defense'] / 100
-        opponent_goal_chance = opponent_strength * (1 - defense_factor * 0.5)  # Защита блокирует до 50% шансов
+        opponent_chance = opponent_goal_chance(team_power, opponent_strength)
         
-        for _ in range(opponent_attacks):
-            if random.random() < opponent_goal_chance:
+        for _ in range(OPPONENT_ATTACKS):
+            if random.random() < opponent_chance:
                 opponent_goals += 1
         
         # Генерируем сообщение о результате
@@ -363,7 +339,7 @@ def generate_match_events(team, opponent, difficulty):
         }
         
     except Exception as e:
-        logger.error(f"Error generating match events: {e}", exc_info=True)
+        logger.error("Error generating match events: %s", e, exc_info=True)
         raise
 
 def create_match_difficulty_keyboard():
@@ -375,22 +351,23 @@ def create_match_difficulty_keyboard():
     ])
     return keyboard
 
-def play_match(update: Update, context: CallbackContext):
+async def play_match(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать выбор сложности матча"""
     user_id = str(update.effective_user.id)
-    team = storage.get_team(user_id)
+    team = await storage.aget_team(user_id)
     if not team:
-        update.message.reply_text("Сначала начните игру командой /start")
+        await update.message.reply_text("Сначала начните игру командой /start")
         return
 
-    if len(team.active_players) == 0:
-        update.message.reply_text("Сначала выберите активных игроков в составе!")
+    if len(team.active_ids) == 0:
+        await update.message.reply_text("Сначала выберите активных игроков в составе!")
         return
 
     # Проверка лимита матчей
-    if not team.can_play_match():
+    check = await limiter.acheck(user_id, "play_match")
+    if not check.allowed:
         if team.can_use_sirena_match_bonus():
-            update.message.reply_text(
+            await update.message.reply_text(
                 "Лимит матчей 3 матча за 10 минут!\n"
                 "Но «СиренаБет» спешит на помощь!\n"
                 "Нажми по ссылке, сделай депозит, и сыграй еще 1 матч.",
@@ -398,14 +375,14 @@ def play_match(update: Update, context: CallbackContext):
             )
             return
         else:
-            update.message.reply_text(
+            await update.message.reply_text(
                 "Достигнут лимит матчей (3 матча за 10 минут).\n"
-                "Подождите некоторое время."
+                f"Следующий матч через {format_wait(check.retry_after)}."
             )
             return
 
     keyboard = create_match_difficulty_keyboard()
-    update.message.reply_text(
+    await update.message.reply_text(
         "🏟 Выберите сложность матча:\n\n"
         "⚪️ Легкий матч - против слабых команд\n"
         "🔵 Средний матч - против команд среднего уровня\n"
@@ -414,76 +391,74 @@ def play_match(update: Update, context: CallbackContext):
         reply_markup=keyboard
     )
 
-def calculate_match_probabilities(team_rating, opponent_strength):
-    """Calculate win/draw/lose probabilities based on team ratings"""
-    # Конвертируем силу соперника в рейтинг (примерно такой же алгоритм как у команды игрока)
-    opponent_rating = opponent_strength * 10  # Сила 0.8 = рейтинг 8.0
-    
-    # Разница в рейтинге влияет на вероятности
-    rating_diff = team_rating - opponent_rating
-    
-    # Базовые вероятности
-    if rating_diff >= 2:  # Намного сильнее
-        win_prob = 0.7
-        draw_prob = 0.2
-        lose_prob = 0.1
-    elif rating_diff >= 1:  # Немного сильнее
-        win_prob = 0.5
-        draw_prob = 0.3
-        lose_prob = 0.2
-    elif rating_diff >= -1:  # Примерно равны
-        win_prob = 0.35
-        draw_prob = 0.3
-        lose_prob = 0.35
-    elif rating_diff >= -2:  # Немного слабее
-        win_prob = 0.2
-        draw_prob = 0.3
-        lose_prob = 0.5
-    else:  # Намного слабее
-        win_prob = 0.1
-        draw_prob = 0.2
-        lose_prob = 0.7
-    
-    return {
-        'win': round(win_prob * 100),
-        'draw': round(draw_prob * 100),
-        'lose': round(lose_prob * 100)
-    }
+def calculate_match_probabilities(team_power, opponent_strength, difficulty):
+    """Calculate win/draw/lose probabilities by simulating the match model"""
+    return match_odds(team_power, opponent_strength, difficulty)
 
-def handle_match_difficulty(update: Update, context: CallbackContext):
+def apply_match_rewards(team, match_result, difficulty):
+    """Начислить очки и монеты за матч, вернуть сообщение о награде"""
+    # Calculate rewards based on difficulty and opponent strength
+    points, reward = match_reward(
+        difficulty, match_result['opponent_strength'],
+        match_result['team_goals'], match_result['opponent_goals']
+    )
+    if not points:
+        return None
+    team.add_points(points)
+    team.add_money(reward)
+    if points == 3:
+        return f"💰 Награда за победу: +{reward} монет"
+    return f"💰 Награда за ничью: +{reward} монет"
+
+async def send_match_tick(context: ContextTypes.DEFAULT_TYPE):
+    """Отправить очередные сообщения трансляции матча (задача JobQueue)"""
+    job = context.job
+    ticks = job.data['ticks']
+    for text in ticks.popleft():
+        # Трансляция уступает очередь ответам на действия пользователей
+        await context.bot.send_message(chat_id=job.chat_id, text=text, rate_limit_args=PRIORITY_BACKGROUND)
+    if not ticks:
+        job.schedule_removal()
+
+async def handle_match_difficulty(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle match difficulty selection"""
     query = update.callback_query
     user_id = str(query.from_user.id)
     difficulty = query.data.split('_')[1]  # match_easy -> easy
     
-    logger.info(f"Starting match with difficulty: {difficulty} for user: {user_id}")
+    logger.debug("Starting match with difficulty: %s for user: %s", difficulty, user_id)
     
-    team = storage.get_team(user_id)
+    team = await storage.aget_team(user_id)
     if not team:
-        logger.error(f"Team not found for user {user_id}")
-        query.answer("Ошибка: команда не найдена")
+        logger.error("Team not found for user %s", user_id)
+        await query.answer("Ошибка: команда не найдена")
         return
     
     try:
-        # Load match data
-        logger.info("Loading match data...")
-        with open('data/match_data.json', 'r', encoding='utf-8') as f:
-            match_data = json.load(f)
-        
+        opponents = game_data.current.opponents
+
         # Select random opponent based on difficulty
-        logger.info(f"Selecting opponent for difficulty: {difficulty}")
-        if difficulty not in match_data['opponent_teams']:
-            logger.error(f"Invalid difficulty level: {difficulty}")
+        logger.debug("Selecting opponent for difficulty: %s", difficulty)
+        if difficulty not in opponents:
+            logger.error("Invalid difficulty level: %s", difficulty)
             raise ValueError(f"Invalid difficulty level: {difficulty}")
             
-        opponent = random.choice(match_data['opponent_teams'][difficulty])
-        logger.info(f"Selected opponent: {opponent['name']}")
+        # Матч записывается в лимит до начала, чтобы старое меню не обошло его
+        check = await limiter.aacquire(user_id, "play_match")
+        if not check.allowed:
+            await query.answer(
+                f"Лимит матчей: следующий матч через {format_wait(check.retry_after)}", show_alert=True
+            )
+            return
+
+        opponent = random.choice(opponents[difficulty])
+        logger.debug("Selected opponent: %s", opponent['name'])
         
         # Calculate team rating and probabilities
-        logger.info("Calculating team power and probabilities...")
+        logger.debug("Calculating team power and probabilities...")
         team_power = team.get_team_power()
         team_rating = calculate_team_rating(team_power)
-        probabilities = calculate_match_probabilities(team_rating, opponent['strength'])
+        probabilities = calculate_match_probabilities(team_power, opponent['strength'], difficulty)
         
         # Edit message to show match preview
         preview_message = (
@@ -498,180 +473,154 @@ def handle_match_difficulty(update: Update, context: CallbackContext):
             f"❌ Поражение: {probabilities['lose']}%\n\n"
             f"⏳ Матч начинается..."
         )
-        query.edit_message_text(preview_message)
+        await query.edit_message_text(preview_message)
         
         # Generate and process match events
-        logger.info("Generating match events...")
+        logger.debug("Generating match events...")
         match_result = generate_match_events(team, opponent, difficulty)
         
-        # Send match events with delay
-        logger.info("Sending match events...")
-        for event in match_result['events']:
-            context.bot.send_message(chat_id=update.effective_chat.id, text=event)
-            time.sleep(2)  # 2-second delay between events
-        
-        # Send final result
-        context.bot.send_message(chat_id=update.effective_chat.id, text=match_result['result'])
-        
-        # Calculate rewards based on difficulty and opponent strength
-        logger.info("Calculating rewards...")
-        reward_ranges = {
-            'easy': (200, 400),
-            'medium': (400, 800),
-            'hard': (800, 1500)
-        }
-        
-        base_min, base_max = reward_ranges[difficulty]
-        strength_factor = match_result['opponent_strength']
-        
-        if match_result['team_goals'] > match_result['opponent_goals']:
-            # Win reward
-            reward = int(base_min + (base_max - base_min) * strength_factor)
-            team.add_points(3)
-            team.add_money(reward)
-            context.bot.send_message(
-                chat_id=update.effective_chat.id,
-                text=f"💰 Награда за победу: +{reward} монет"
-            )
-        elif match_result['team_goals'] == match_result['opponent_goals']:
-            # Draw reward
-            reward = int((base_min + (base_max - base_min) * strength_factor) * 0.4)  # 40% of win reward
-            team.add_points(1)
-            team.add_money(reward)
-            context.bot.send_message(
-                chat_id=update.effective_chat.id,
-                text=f"💰 Награда за ничью: +{reward} монет"
-            )
-        
-        # Записываем сыгранный матч
-        logger.info("Saving match result...")
-        team.add_match_played()
-        storage.save_team(user_id, team)
-        logger.info("Match completed successfully")
+        # Награда начисляется сразу, а трансляция матча идет в фоне
+        logger.debug("Calculating rewards...")
+        def record_match(team):
+            return apply_match_rewards(team, match_result, difficulty)
+        
+        # Награда повторяется на свежей копии, если команду изменил другой процесс
+        logger.debug("Saving match result...")
+        reward_message = await storage.aupdate_team(user_id, record_match)
+        
+        # Каждое событие - отдельный тик, итог и награда приходят вместе
+        ticks = [[event] for event in match_result['events']]
+        ticks.append([match_result['result']] + ([reward_message] if reward_message else []))
+        
+        # Schedule match playback instead of sleeping in the worker thread
+        logger.debug("Scheduling match events...")
+        context.job_queue.run_repeating(
+            send_match_tick,
+            interval=MATCH_EVENT_DELAY,
+            first=0,
+            data={'ticks': deque(ticks)},
+            chat_id=update.effective_chat.id,
+            name=f"match_{user_id}"
+        )
+        logger.debug("Match completed successfully")
         
     except Exception as e:
-        logger.error(f"Error in handle_match_difficulty: {str(e)}", exc_info=True)
-        context.bot.send_message(
+        logger.error("Error in handle_match_difficulty: %s", e, exc_info=True)
+        await context.bot.send_message(
             chat_id=update.effective_chat.id,
             text=f"Произошла ошибка во время матча: {str(e)}"
         )
 
-def show_top(update: Update, context: CallbackContext):
+async def show_top(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать таблицу лидеров"""
-    teams = storage.get_all_teams()
-    sorted_teams = sorted(
-        teams.items(),
-        key=lambda x: x[1].points,
-        reverse=True
-    )
+    user_id = str(update.effective_user.id)
+    top_teams = storage.get_top_teams(10)
 
     top_message = "🏆 Таблица лидеров:\n\n"
-    for i, (user_id, team) in enumerate(sorted_teams[:10], 1):
-        top_message += f"{i}. {team.name}: {team.points} очков\n"
+    for i, (_, name, points) in enumerate(top_teams, 1):
+        top_message += f"{i}. {name}: {points} очков\n"
 
-    update.message.reply_text(top_message)
+    rank = storage.get_team_rank(user_id)
+    if rank is not None:
+        top_message += f"\nВаше место: {rank} из {storage.count_teams()}"
 
-def show_profile(update: Update, context: CallbackContext):
+    await update.message.reply_text(top_message)
+
+async def show_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать профиль команды"""
     user_id = str(update.effective_user.id)
-    team = storage.get_team(user_id)
+    team = await storage.aget_team(user_id)
     if not team:
-        update.message.reply_text("Сначала начните игру командой /start")
+        await update.message.reply_text("Сначала начните игру командой /start")
         return
 
+    team_power = team.get_team_power()
     profile_message = (
         f"🧑 Профиль команды {team.name}\n\n"
         f"💰 Деньги: {team.money}\n"
         f"🏆 Очки: {team.points}\n"
-        f"👥 Игроков в составе: {len(team.squad)}/22\n"
-        f"🌟 Активных игроков: {len(team.active_players)}/3\n\n"
+        f"👥 Игроков в составе: {len(team.squad_ids)}/22\n"
+        f"🌟 Активных игроков: {len(team.active_ids)}/3\n\n"
         "Сила команды:\n"
-        f"⚡️ Скорость: {team.get_team_power()['speed']}\n"
-        f"🧠 Менталка: {team.get_team_power()['mentality']}\n"
-        f"⚽️ Удар: {team.get_team_power()['finishing']}\n"
-        f"🛡 Защита: {team.get_team_power()['defense']}"
+        f"⚡️ Скорость: {team_power['speed']}\n"
+        f"🧠 Менталка: {team_power['mentality']}\n"
+        f"⚽️ Удар: {team_power['finishing']}\n"
+        f"🛡 Защита: {team_power['defense']}"
     )
 
-    update.message.reply_text(profile_message)
+    await update.message.reply_text(profile_message)
 
-def handle_text(update: Update, context: CallbackContext):
+async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка текстовых сообщений"""
     text = update.message.text
     
     if text == "💼 Состав":
-        show_squad(update, context)
+        await show_squad(update, context)
     elif text == "💰 Поддержать клуб":
-        support_club(update, context)
+        await support_club(update, context)
     elif text == "🎲 Купить игрока":
-        buy_player(update, context)
+        await buy_player(update, context)
     elif text == "🏟 Играть матч":
-        play_match(update, context)
+        await play_match(update, context)
     elif text == "🏆 Топ":
-        show_top(update, context)
+        await show_top(update, context)
     elif text == "🧑 Профиль":
-        show_profile(update, context)
+        await show_profile(update, context)
     elif text == "❓ Напомни, что за бот":
-        update.message.reply_text(
+        await update.message.reply_text(
             get_bot_info(),
             reply_markup=MAIN_KEYBOARD
         )
 
-def handle_sirena_callback(update: Update, context: CallbackContext):
+async def handle_sirena_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка нажатия на кнопку Забрать от SirenaBet"""
     query = update.callback_query
     user_id = str(query.from_user.id)
     action_type = query.data.split('_')[1]  # sirena_player, sirena_match, sirena_nomoney
     
-    team = storage.get_team(user_id)
+    team = await storage.aget_team(user_id)
     if not team:
-        query.answer("Ошибка: команда не найдена")
+        await query.answer("Ошибка: команда не найдена")
         return
     
     try:
         # Проверяем, можно ли использовать бонус
         if action_type == 'match' and not team.can_use_sirena_match_bonus():
-            query.answer("Бонус уже был использован")
+            await query.answer("Бонус уже был использован")
             return
         elif action_type == 'player' and not team.can_use_sirena_player_bonus():
-            query.answer("Бонус уже был использован")
+            await query.answer("Бонус уже был использован")
             return
         elif action_type == 'nomoney' and not team.can_use_sirena_no_money_bonus():
-            query.answer("Бонус уже был использован")
+            await query.answer("Бонус уже был использован")
             return
 
         if action_type == 'match':
             # Отмечаем использование бонуса на матч
-            team.use_sirena_match_bonus()
-            storage.save_team(user_id, team)
+            await storage.aupdate_team(user_id, lambda team: team.use_sirena_match_bonus())
             
             # Отправляем сообщение об успешном получении бонусного матча
-            query.edit_message_text(
+            await query.edit_message_text(
                 "✅ Вы получили бонусный матч от SirenaBet!\n"
                 "Теперь вы можете сыграть еще один матч."
             )
             return
 
         # Обработка других типов бонусов...
-        # Загружаем базу игроков
-        players_db = storage.load_players_database()
-        
         # Для бонусного игрока выбираем из common или rare
-        available_players = [p for p in players_db["players"] if p["rarity"] in ["common", "rare"]]
-        if not available_players:
-            query.answer("Ошибка: не удалось найти подходящего игрока")
+        player = game_data.current.catalog.draw_uniform(("common", "rare"))
+        if player is None:
+            await query.answer("Ошибка: не удалось найти подходящего игрока")
             return
         
-        # Выбираем случайного игрока
-        player = random.choice(available_players)
-        
-        # Добавляем игрока в команду
-        team.add_player(player)
-        
-        # Отмечаем использование бонуса
-        if action_type == 'player':
-            team.use_sirena_player_bonus()
-        else:  # nomoney
-            team.use_sirena_no_money_bonus()
+        # Добавляем игрока в команду и отмечаем использование бонуса
+        def take_bonus(team):
+            team.add_player(player)
+            if action_type == 'player':
+                team.use_sirena_player_bonus()
+            else:  # nomoney
+                team.use_sirena_no_money_bonus()
+        await storage.aupdate_team(user_id, take_bonus)
         
         # Определяем эмодзи для редкости
         rarity_emoji = {
@@ -691,41 +640,130 @@ def handle_sirena_callback(update: Update, context: CallbackContext):
         message += f"⚽️ Удар: {player['stats']['finishing']}\n"
         message += f"🛡 Защита: {player['stats']['defense']}"
         
-        storage.save_team(user_id, team)
-        query.edit_message_text(message)
+        await query.edit_message_text(message)
         
     except Exception as e:
-        logger.error(f"Error in handle_sirena_callback: {str(e)}", exc_info=True)
-        query.answer("Произошла ошибка при обработке бонуса")
-
-def main():
-    """Start the bot"""
-    # Initialize bot and create dispatcher
-    updater = Updater(TOKEN)
-    dispatcher = updater.dispatcher
+        logger.error("Error in handle_sirena_callback: %s", e, exc_info=True)
+        await query.answer("Произошла ошибка при обработке бонуса")
+
+async def show_bot_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Напомнить, что это за бот"""
+    await update.message.reply_text(get_bot_info(), reply_markup=MAIN_KEYBOARD)
+
+async def refresh_leaderboard(context: ContextTypes.DEFAULT_TYPE):
+    """Перестроить рейтинг с учетом команд, сохраненных другими процессами"""
+    await asyncio.to_thread(storage.refresh_leaderboard)
+
+async def on_startup(application: Application):
+    """Загрузить игровые данные и построить индекс рейтинга до приема обновлений"""
+    game_data.start_watching()
+    await asyncio.to_thread(storage.count_teams)
+    if LEADERBOARD_REFRESH_INTERVAL > 0:
+        application.job_queue.run_repeating(
+            refresh_leaderboard, interval=LEADERBOARD_REFRESH_INTERVAL, first=LEADERBOARD_REFRESH_INTERVAL,
+        )
+    metrics_port = application.bot_data.get('metrics_port')
+    if metrics_port:
+        metrics_server = MetricsServer(port=metrics_port)
+        await metrics_server.start()
+        application.bot_data['metrics_server'] = metrics_server
+
+async def on_shutdown(application: Application):
+    """Сбросить кэш команд на диск при остановке"""
+    metrics_server = application.bot_data.pop('metrics_server', None)
+    if metrics_server:
+        await metrics_server.stop()
+    await asyncio.to_thread(storage.close)
+
+def build_application(updater: bool = True, outbound_rate: float = OUTBOUND_RATE_LIMIT,
+                      metrics_port: int = METRICS_PORT) -> Application:
+    """Приложение бота со всеми обработчиками.
+
+    updater=False собирает его без приема обновлений из Telegram: так
+    работают воркеры, которым обновления раздает ingress-процесс.
+    """
+    # Обновления обрабатываются конкурентно, но для одного пользователя - по очереди
+    builder = (
+        ApplicationBuilder()
+        .token(TOKEN)
+        .concurrent_updates(PerUserUpdateProcessor(MAX_CONCURRENT_UPDATES))
+        .update_queue(UpdateQueue(UPDATE_QUEUE_SIZE))
+        # Те же размеры пулов, что ApplicationBuilder выбирает по умолчанию
+        .request(InstrumentedRequest(connection_pool_size=256))
+        .get_updates_request(InstrumentedRequest(connection_pool_size=1))
+        # Все исходящие сообщения проходят через лимиты Telegram
+        .rate_limiter(OutboundRateLimiter(outbound_rate, OUTBOUND_CHAT_RATE_LIMIT))
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    if not updater:
+        builder.updater(None)
+    if BASE_URL:
+        # Локальный Bot API (в том числе стенд benchmarks.fake_bot_api)
+        builder.base_url(BASE_URL)
+    application = builder.build()
+    application.bot_data['metrics_port'] = metrics_port
 
     # Add handlers
-    dispatcher.add_handler(CommandHandler("start", start))
-    dispatcher.add_handler(MessageHandler(Filters.regex('^💼 Состав$'), show_squad))
-    dispatcher.add_handler(MessageHandler(Filters.regex('^🎲 Купить игрока$'), buy_player))
-    dispatcher.add_handler(MessageHandler(Filters.regex('^🏟 Играть матч$'), play_match))
-    dispatcher.add_handler(MessageHandler(Filters.regex('^💰 Поддержать клуб$'), support_club))
-    dispatcher.add_handler(MessageHandler(Filters.regex('^❓ Напомни, что за бот$'), get_bot_info))
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(MessageHandler(filters.Regex('^💼 Состав$'), show_squad))
+    application.add_handler(MessageHandler(filters.Regex('^🎲 Купить игрока$'), buy_player))
+    application.add_handler(MessageHandler(filters.Regex('^🏟 Играть матч$'), play_match))
+    application.add_handler(MessageHandler(filters.Regex('^💰 Поддержать клуб$'), support_club))
+    application.add_handler(MessageHandler(filters.Regex('^🏆 Топ$'), show_top))
+    application.add_handler(MessageHandler(filters.Regex('^🧑 Профиль$'), show_profile))
+    application.add_handler(MessageHandler(filters.Regex('^❓ Напомни, что за бот$'), show_bot_info))
     
     # Callback handlers
-    dispatcher.add_handler(CallbackQueryHandler(handle_toggle_player, pattern='^toggle_player_'))
-    dispatcher.add_handler(CallbackQueryHandler(handle_support_action, pattern='^support_'))
-    dispatcher.add_handler(CallbackQueryHandler(handle_match_difficulty, pattern='^match_'))
-    dispatcher.add_handler(CallbackQueryHandler(handle_sirena_callback, pattern='^sirena_'))
-
-    # Start the bot
-    logger.info("Starting bot...")
-    updater.start_polling()
-    logger.info("Bot is running!")
-    
+    application.add_handler(CallbackQueryHandler(handle_toggle_player, pattern='^toggle_player_'))
+    application.add_handler(CallbackQueryHandler(handle_support_action, pattern='^support_'))
+    application.add_handler(CallbackQueryHandler(handle_match_difficulty, pattern='^match_'))
+    application.add_handler(CallbackQueryHandler(handle_sirena_callback, pattern='^sirena_'))
+
+    # Метрики: время обработчиков и хранилища, кэш, очереди
+    instrument_handlers(application)
+    instrument_storage(storage)
+    register_runtime_collector(application, storage)
+    return application
+
+def build_cluster() -> Application:
+    """Ingress-приложение, раздающее обновления BOT_WORKERS процессам-воркерам"""
+    if os.getenv('STORAGE_BACKEND', 'json').lower() == 'journal':
+        raise ValueError("STORAGE_BACKEND=journal can only be opened by one process, use BOT_WORKERS=1")
+    worker_kwargs = [
+        {
+            "updater": False,
+            # Лимит Telegram общий на бота, делим его между воркерами;
+            # лимит на чат остается прежним: чат обслуживает один воркер
+            "outbound_rate": OUTBOUND_RATE_LIMIT / BOT_WORKERS,
+            # У каждого воркера свой /metrics: METRICS_PORT, METRICS_PORT + 1, ...
+            "metrics_port": METRICS_PORT + index if METRICS_PORT else 0,
+        }
+        for index in range(BOT_WORKERS)
+    ]
+    pool = WorkerPool(build_application, worker_kwargs, queue_size=UPDATE_QUEUE_SIZE)
+    return build_ingress(pool, TOKEN, base_url=BASE_URL, queue_size=UPDATE_QUEUE_SIZE)
+
+def main():
+    """Start the bot"""
+    application = build_cluster() if BOT_WORKERS > 1 else build_application()
+
     # Run the bot until you press Ctrl-C
+    logger.info("Starting bot in %s mode with %d worker process(es)...", BOT_MODE, BOT_WORKERS)
     print("Bot is running! Press Ctrl+C to stop.")
-    updater.idle()
+    if BOT_MODE == 'webhook':
+        server = WebhookServer(
+            application,
+            secret_token=os.getenv('WEBHOOK_SECRET', ''),
+            path=os.getenv('WEBHOOK_PATH', '/telegram'),
+            host=os.getenv('WEBHOOK_HOST', '0.0.0.0'),
+            port=int(os.getenv('PORT', '8080')),
+        )
+        asyncio.run(run_webhook(application, server, webhook_url=os.getenv('WEBHOOK_URL')))
+    elif BOT_MODE == 'polling':
+        application.run_polling()
+    else:
+        raise ValueError(f"Unknown BOT_MODE: {BOT_MODE}")
 
 if __name__ == "__main__":
     main()
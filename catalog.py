@@ -0,0 +1,93 @@
+import random
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+class AliasSampler:
+    """Выбор исхода по весам за O(1) (метод псевдонимов Уолкера в варианте Воуза)"""
+
+    def __init__(self, outcomes: Sequence[Any], weights: Sequence[float]):
+        if len(outcomes) != len(weights) or not outcomes:
+            raise ValueError("outcomes and weights must be non-empty and of equal length")
+        total = float(sum(weights))
+        if total <= 0:
+            raise ValueError("weights must sum to a positive value")
+
+        size = len(outcomes)
+        scaled = [w * size / total for w in weights]
+        self.outcomes = tuple(outcomes)
+        self._prob = [1.0] * size
+        self._alias = list(range(size))
+
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self._prob[less] = scaled[less]
+            self._alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+        # Оставшиеся (в том числе из-за ошибок округления) выбираются всегда
+        for i in small + large:
+            self._prob[i] = 1.0
+
+    def sample(self, rng: random.Random = random) -> Any:
+        """Один исход: одна корзина и один бросок монеты"""
+        u = rng.random() * len(self._prob)
+        i = int(u)
+        return self.outcomes[i] if u - i < self._prob[i] else self.outcomes[self._alias[i]]
+
+class PlayerCatalog:
+    """Каталог игроков, разложенный по редкости, с выбором карточки за O(1)"""
+
+    def __init__(self, players: Iterable[Mapping], rarity_chances: Mapping[str, float]):
+        by_rarity: Dict[str, list] = {}
+        for player in players:
+            by_rarity.setdefault(player["rarity"], []).append(player)
+        self.by_rarity = MappingProxyType({r: tuple(p) for r, p in by_rarity.items()})
+        self.rarity_chances = rarity_chances
+        self._samplers: Dict[Tuple, Optional[AliasSampler]] = {}
+
+    def _sampler(self, weights: Mapping[str, float]) -> Optional[AliasSampler]:
+        """Сэмплер редкостей для набора весов; редкости без игроков исключаются"""
+        key = tuple(sorted(weights.items()))
+        if key not in self._samplers:
+            available = [(r, w) for r, w in key if w > 0 and self.by_rarity.get(r)]
+            self._samplers[key] = AliasSampler(*zip(*available)) if available else None
+        return self._samplers[key]
+
+    def _draw_one(self, sampler: AliasSampler, rng: random.Random) -> Mapping:
+        bucket = self.by_rarity[sampler.sample(rng)]
+        return bucket[int(rng.random() * len(bucket))]
+
+    def draw(self, n: Optional[int] = None, weights: Optional[Mapping[str, float]] = None,
+             rng: random.Random = random) -> Any:
+        """Случайный игрок с учетом шансов редкости.
+
+        По умолчанию используются rarity_chances каталога. При n=None
+        возвращает одного игрока (или None, если выбирать не из кого),
+        иначе список из n игроков для открытия нескольких паков.
+        """
+        sampler = self._sampler(self.rarity_chances if weights is None else weights)
+        if sampler is None:
+            return None if n is None else []
+        if n is None:
+            return self._draw_one(sampler, rng)
+        return [self._draw_one(sampler, rng) for _ in range(n)]
+
+    def draw_uniform(self, rarities: Sequence[str], rng: random.Random = random) -> Optional[Mapping]:
+        """Равновероятный игрок среди всех игроков указанных редкостей"""
+        # Вес корзины равен числу игроков в ней, поэтому каждый игрок равновероятен
+        weights = {r: len(self.by_rarity.get(r, ())) for r in rarities}
+        return self.draw(weights=weights, rng=rng)
+
+    def sample(self, rarity: str, k: int, rng: random.Random = random) -> List[Mapping]:
+        """k разных игроков одной редкости"""
+        return rng.sample(self.by_rarity.get(rarity, ()), k)
+
+    def sample_or_draw(self, rarity: str, k: int, rng: random.Random = random) -> List[Mapping]:
+        """k разных игроков редкости rarity; если их меньше k, недостающие
+        выбираются по шансам редкости, как при покупке (draw)"""
+        bucket = self.by_rarity.get(rarity, ())
+        if len(bucket) >= k:
+            return self.sample(rarity, k, rng)
+        return list(bucket) + self.draw(n=k - len(bucket), rng=rng)
@@ -0,0 +1,196 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import signal
+import threading
+import zlib
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, List, Optional
+from telegram import Update
+from telegram.ext import Application, ApplicationBuilder, ContextTypes, TypeHandler
+from handlers.update_processor import UpdateQueue
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH = 256  # Обновлений в одной пересылке воркеру
+WORKER_STOP_TIMEOUT = 30  # Секунд на завершение воркера после команды остановки
+
+def partition(update: Update, workers: int) -> int:
+    """Номер воркера для обновления: все обновления пользователя попадают в один воркер"""
+    if update.effective_user is not None:
+        key = update.effective_user.id
+    elif update.effective_chat is not None:
+        key = update.effective_chat.id
+    else:
+        return 0
+    return zlib.crc32(str(key).encode()) % workers
+
+class WorkerPool:
+    """Процессы-воркеры с обработчиками бота и раздача им обновлений.
+
+    Ingress-процесс принимает обновления (polling или вебхук) и по хэшу id
+    пользователя отправляет каждое в один из воркеров. Все обновления
+    пользователя обрабатывает один процесс, поэтому его кэш команд, экраны
+    состава и трансляции матчей не требуют блокировок между процессами.
+
+    Воркер - отдельный процесс (spawn) с приложением из factory(**kwargs),
+    собранным без Updater. Обновления уходят к нему пачками по каналу
+    multiprocessing. Если воркер не успевает, его UpdateQueue упирается в
+    лимит необработанных обновлений, и воркер перестает читать канал.
+    Тогда останавливается отправка из очереди ingress для этого воркера
+    (queue_size), обработчик route ждет места в ней, и ingress перестает
+    принимать обновления: polling не запрашивает новые, вебхук отвечает 503.
+
+    При остановке ingress перестает принимать обновления, дописывает
+    очереди воркерам и ждет, пока они обработают принятое и завершатся.
+    Если воркер упал, ingress останавливается целиком (SIGTERM себе).
+    """
+
+    def __init__(self, factory: Callable[..., Application], worker_kwargs: List[Dict[str, Any]],
+                 queue_size: int = 1000):
+        self.factory = factory
+        self.worker_kwargs = worker_kwargs
+        self.queue_size = queue_size
+        self._processes: List[multiprocessing.Process] = []
+        self._connections: List[Connection] = []
+        self._queues: List[asyncio.Queue] = []
+        self._senders: List[asyncio.Task] = []
+        self.routed = [0] * len(worker_kwargs)
+
+    @property
+    def workers(self) -> int:
+        return len(self.worker_kwargs)
+
+    async def start(self, application: Optional[Application] = None) -> None:
+        """Запустить воркеры (подходит для post_init ingress-приложения)"""
+        context = multiprocessing.get_context("spawn")
+        for index, kwargs in enumerate(self.worker_kwargs):
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(
+                target=run_worker, args=(self.factory, kwargs, receiver), name=f"bot-worker-{index}"
+            )
+            process.start()
+            receiver.close()
+            self._processes.append(process)
+            self._connections.append(sender)
+            self._queues.append(asyncio.Queue(maxsize=self.queue_size))
+            self._senders.append(asyncio.create_task(self._send_loop(index)))
+        logger.info("Started %d bot workers", self.workers)
+
+    async def route(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Обработчик ingress-приложения: передать обновление воркеру пользователя"""
+        index = partition(update, self.workers)
+        self.routed[index] += 1
+        await self._queues[index].put(update.to_dict())
+
+    async def _send_loop(self, index: int) -> None:
+        queue, connection = self._queues[index], self._connections[index]
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < MAX_BATCH and not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                await asyncio.to_thread(connection.send_bytes, json.dumps(batch).encode())
+            except OSError as e:
+                logger.critical("Bot worker %d is gone (%s), shutting down", index, e)
+                signal.raise_signal(signal.SIGTERM)
+                return
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": [queue.qsize() for queue in self._queues],
+            "routed": list(self.routed),
+            "alive": sum(process.is_alive() for process in self._processes),
+        }
+
+    async def stop(self, application: Optional[Application] = None) -> None:
+        """Дописать очереди, остановить воркеры и дождаться их (подходит для post_shutdown)"""
+        for queue, sender in zip(self._queues, self._senders):
+            if not sender.done():
+                await queue.join()
+            sender.cancel()
+        for connection in self._connections:
+            try:
+                # Пустое сообщение - команда остановки
+                connection.send_bytes(b"")
+            except OSError:
+                pass
+            connection.close()
+        await asyncio.to_thread(self._join)
+        logger.info("Bot workers stopped")
+
+    def _join(self) -> None:
+        for process in self._processes:
+            process.join(WORKER_STOP_TIMEOUT)
+            if process.is_alive():
+                logger.warning("Bot worker %s did not stop in %d s, terminating", process.name, WORKER_STOP_TIMEOUT)
+                process.terminate()
+                process.join()
+
+def build_ingress(pool: WorkerPool, token: str, base_url: Optional[str] = None,
+                  queue_size: int = 1000) -> Application:
+    """Приложение ingress-процесса: принимает обновления и только раздает их воркерам.
+
+    Обновления разбираются по одному, чтобы сохранить их порядок для
+    каждого пользователя.
+    """
+    builder = (
+        ApplicationBuilder()
+        .token(token)
+        .update_queue(UpdateQueue(queue_size))
+        .post_init(pool.start)
+        .post_shutdown(pool.stop)
+    )
+    if base_url:
+        builder.base_url(base_url)
+    application = builder.build()
+    application.add_handler(TypeHandler(Update, pool.route))
+    return application
+
+def run_worker(factory: Callable[..., Application], kwargs: Dict[str, Any], connection: Connection) -> None:
+    """Точка входа процесса-воркера"""
+    # Ctrl+C и SIGTERM приходят всей группе процессов; воркер останавливает
+    # ingress, когда доставит ему все принятые обновления
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    application = factory(**kwargs)
+    asyncio.run(_serve_worker(application, connection))
+
+async def _serve_worker(application: Application, connection: Connection) -> None:
+    loop = asyncio.get_running_loop()
+    finished = asyncio.Event()
+
+    async def enqueue(updates: List[Dict[str, Any]]) -> None:
+        for data in updates:
+            await application.update_queue.put(Update.de_json(data, application.bot))
+
+    def read() -> None:
+        try:
+            while True:
+                data = connection.recv_bytes()
+                if not data:
+                    break
+                # Ждем места в очереди приложения, чтобы не читать канал впрок
+                asyncio.run_coroutine_threadsafe(enqueue(json.loads(data)), loop).result()
+        except EOFError:
+            logger.warning("Ingress process closed the channel, stopping worker")
+        finally:
+            loop.call_soon_threadsafe(finished.set)
+
+    async with application:
+        # post_init/post_shutdown сам вызывает только run_polling/run_webhook
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        threading.Thread(target=read, name="ingress-reader", daemon=True).start()
+        try:
+            await finished.wait()
+        finally:
+            # Application.stop дорабатывает уже поставленные в очередь обновления
+            await application.stop()
+    if application.post_shutdown:
+        await application.post_shutdown(application)
@@ -0,0 +1,114 @@
+import json
+import logging
+import os
+import threading
+from types import MappingProxyType
+from typing import Any, Dict, Optional, Tuple
+from catalog import PlayerCatalog
+
+logger = logging.getLogger(__name__)
+
+MATCH_DATA_PATH = "data/match_data.json"
+PLAYERS_PATH = "data/players.json"
+
+def freeze(value: Any) -> Any:
+    """Сделать вложенные dict/list неизменяемыми (MappingProxyType/tuple)"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+class GameData:
+    """Неизменяемый снимок игровых данных с готовыми индексами"""
+
+    def __init__(self, match_data: Dict, players: Dict, generation: int):
+        self.generation = generation
+        self.match_data = freeze(match_data)
+        self.players = freeze(players)
+
+        # Индексы каталога игроков
+        self.players_by_id = MappingProxyType({p["id"]: p for p in self.players["players"]})
+        self.catalog = PlayerCatalog(self.players["players"], self.players["rarity_chances"])
+        self.players_by_rarity = self.catalog.by_rarity
+
+        # Соперники и действия матча, разложенные так, как их выбирают обработчики
+        self.opponents = self.match_data["opponent_teams"]
+        actions = self.match_data["match_actions"]
+        self.goal_actions = tuple(a for a in actions["positive"] if a["is_goal"])
+        self.chance_actions = tuple(a for a in actions["positive"] if not a["is_goal"])
+        self.positive_actions = actions["positive"]
+        self.negative_actions = actions["negative"]
+
+class GameDataRegistry:
+    """Держит текущий снимок data/*.json и подменяет его при изменении файлов.
+
+    Обработчики читают только game_data.current, без обращения к диску.
+    Фоновый поток раз в reload_interval секунд сверяет mtime файлов и при
+    изменении целиком собирает новый снимок; битые файлы не заменяют рабочий.
+    """
+
+    def __init__(self, match_data_path: str = MATCH_DATA_PATH,
+                 players_path: str = PLAYERS_PATH, reload_interval: float = 5.0):
+        self.match_data_path = match_data_path
+        self.players_path = players_path
+        self.reload_interval = reload_interval
+        self._snapshot: Optional[GameData] = None
+        self._mtimes: Tuple[float, float] = (0.0, 0.0)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    @property
+    def current(self) -> GameData:
+        """Текущий снимок игровых данных"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.reload()
+        return snapshot
+
+    def _file_mtimes(self) -> Tuple[float, float]:
+        return os.stat(self.match_data_path).st_mtime, os.stat(self.players_path).st_mtime
+
+    def reload(self, force: bool = True) -> GameData:
+        """Перечитать файлы (при force=False только если изменился mtime)"""
+        with self._lock:
+            mtimes = self._file_mtimes()
+            if not force and self._snapshot is not None and mtimes == self._mtimes:
+                return self._snapshot
+
+            with open(self.match_data_path, "r", encoding="utf-8") as f:
+                match_data = json.load(f)
+            with open(self.players_path, "r", encoding="utf-8") as f:
+                players = json.load(f)
+
+            generation = self._snapshot.generation + 1 if self._snapshot else 1
+            # Подмена одной ссылкой: читатели видят либо старый, либо новый снимок
+            self._snapshot = GameData(match_data, players, generation)
+            self._mtimes = mtimes
+            logger.info("Loaded game data (generation %d)", generation)
+            return self._snapshot
+
+    def start_watching(self) -> None:
+        """Загрузить данные и следить за изменением файлов"""
+        self.current
+        if self._watcher is not None or self.reload_interval <= 0:
+            return
+        self._watcher = threading.Thread(target=self._watch_loop, name="game-data-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch_loop(self) -> None:
+        while not self._stop.wait(self.reload_interval):
+            try:
+                self.reload(force=False)
+            except Exception as e:
+                logger.error("Error reloading game data, keeping previous version: %s", e, exc_info=True)
+
+# Создаем глобальный реестр игровых данных
+game_data = GameDataRegistry(reload_interval=float(os.getenv("GAME_DATA_RELOAD_INTERVAL", "5")))
@@ -0,0 +1,142 @@
+from collections import OrderedDict
+from typing import Dict, List, Mapping, NamedTuple, Optional, Tuple
+from telegram import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
+from game_data import game_data
+from models.match import calculate_team_rating
+
+# Характеристики в порядке вывода: ключ, иконка, название
+STAT_LABELS = (
+    ("speed", "⚡️", "Скорость"),
+    ("mentality", "🧠", "Менталка"),
+    ("finishing", "⚽️", "Удар"),
+    ("defense", "🛡", "Защита"),
+)
+
+class SquadView(NamedTuple):
+    """Отрисованный экран состава"""
+    text: str
+    keyboard: InlineKeyboardMarkup
+    power: Mapping[str, int]
+
+class SquadRenderCache:
+    """Экраны состава, отрисованные заново только при смене состава.
+
+    Экран пользователя хранится вместе с ключом (id состава, id активных
+    игроков): пока состав тот же, render возвращает готовые текст и
+    клавиатуру. Строки игроков и ряды кнопок общие для всех команд и
+    строятся один раз на поколение каталога game_data.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._views: "OrderedDict[str, Tuple[Tuple, SquadView]]" = OrderedDict()
+        self._generation: Optional[int] = None
+        self._player_lines: Dict[int, str] = {}
+        self._rows: Dict[Tuple[int, bool], List[InlineKeyboardButton]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _sync(self) -> None:
+        # После перезагрузки каталога карточки могли измениться
+        generation = game_data.current.generation
+        if generation != self._generation:
+            self._generation = generation
+            self._views.clear()
+            self._player_lines.clear()
+            self._rows.clear()
+
+    def player_line(self, player: Mapping) -> str:
+        line = self._player_lines.get(player['id'])
+        if line is None:
+            stats = player['stats']
+            line = self._player_lines[player['id']] = (
+                f"• {player['name']} ({player['rarity'].capitalize()})\n"
+                f"  ⚡️ {stats['speed']} 🧠 {stats['mentality']} "
+                f"⚽️ {stats['finishing']} 🛡 {stats['defense']}"
+            )
+        return line
+
+    def keyboard_row(self, player: Mapping, is_active: bool) -> List[InlineKeyboardButton]:
+        # Кнопки неизменяемы, поэтому один ряд можно отдавать во все клавиатуры
+        key = (player['id'], is_active)
+        row = self._rows.get(key)
+        if row is None:
+            status = "✅" if is_active else "➕"
+            row = self._rows[key] = [InlineKeyboardButton(
+                f"{status} {player['name']} ({player['rarity']})",
+                callback_data=f"toggle_player_{player['id']}"
+            )]
+        return row
+
+    def format_text(self, team) -> str:
+        """Текст экрана состава: рейтинг, характеристики, активные и запасные"""
+        self._sync()
+        team_power = team.get_team_power()
+        active_ids = set(team.active_ids)
+        lines = [
+            "👥 Состав команды:",
+            "",
+            f"⭐️ Рейтинг команды: {calculate_team_rating(team_power)}",
+            f"👥 Активных игроков: {len(active_ids)}/3",
+            "",
+            "📊 Характеристики команды:",
+        ]
+        lines.extend(f"{icon} {name}: {team_power[stat]}" for stat, icon, name in STAT_LABELS)
+        lines.append("")
+        lines.append("🌟 Активные игроки:")
+        lines.extend(self.player_line(p) for p in team.active_players)
+        lines.append("")
+        lines.append("🔄 Запасные игроки:")
+        lines.extend(self.player_line(p) for p in team.squad if p['id'] not in active_ids)
+        lines.append("")
+        return "\n".join(lines)
+
+    def keyboard(self, team) -> InlineKeyboardMarkup:
+        """Кнопки включения и выключения игроков состава"""
+        self._sync()
+        active_ids = set(team.active_ids)
+        return InlineKeyboardMarkup([self.keyboard_row(p, p['id'] in active_ids) for p in team.squad])
+
+    def render(self, user_id: str, team) -> SquadView:
+        """Экран состава команды пользователя, из кэша, если состав не менялся"""
+        self._sync()
+        key = (team.squad_ids, team.active_ids)
+        cached = self._views.get(user_id)
+        if cached is not None and cached[0] == key:
+            self._views.move_to_end(user_id)
+            self.hits += 1
+            return cached[1]
+
+        self.misses += 1
+        view = SquadView(self.format_text(team), self.keyboard(team), team.get_team_power())
+        self._views[user_id] = (key, view)
+        self._views.move_to_end(user_id)
+        if len(self._views) > self.max_size:
+            self._views.popitem(last=False)
+        return view
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._views)}
+
+async def edit_message_if_changed(query: CallbackQuery, text: str,
+                                  reply_markup: Optional[InlineKeyboardMarkup] = None) -> bool:
+    """Отредактировать сообщение, только если текст или кнопки отличаются от показанных.
+
+    Возвращает False, если редактировать было нечего: Telegram ответил бы
+    на такой запрос ошибкой "message is not modified".
+    """
+    message = query.message
+    # Telegram обрезает пробелы и переводы строк по краям текста
+    if message is not None and message.text == text.strip() and message.reply_markup == reply_markup:
+        return False
+    try:
+        await query.edit_message_text(text, reply_markup=reply_markup)
+    except BadRequest as e:
+        if "not modified" not in str(e).lower():
+            raise
+        return False
+    return True
+
+# Общий кэш экранов состава процесса
+squad_views = SquadRenderCache()
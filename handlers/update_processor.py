@@ -0,0 +1,88 @@
+import asyncio
+from typing import Any, Awaitable, Optional
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+from storage.locks import user_locks
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Конкурентная обработка обновлений с очередью на каждого пользователя.
+
+    Всего одновременно обрабатывается не больше max_concurrent_updates
+    обновлений, а обновления одного пользователя выполняются строго по
+    очереди под его блокировкой из storage.locks, чтобы два быстрых нажатия
+    не перезаписали команду друг друга.
+
+    Блокировка пользователя берется раньше общего слота: обновления,
+    ждущие своей очереди, не занимают слоты, и серия обновлений одного
+    пользователя не останавливает остальных.
+    """
+
+    @staticmethod
+    def _user_id(update: object) -> Optional[str]:
+        if isinstance(update, Update) and update.effective_user:
+            return str(update.effective_user.id)
+        return None
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:  # type: ignore[misc]
+        # BaseUpdateProcessor.process_update берет общий слот и вызывает do_process_update
+        user_id = self._user_id(update)
+        if user_id is None:
+            await super().process_update(update, coroutine)
+            return
+        async with user_locks.lock(user_id):
+            await super().process_update(update, coroutine)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        """Ресурсы не нужны"""
+
+    async def shutdown(self) -> None:
+        """Ресурсы не нужны"""
+
+class UpdateQueue(asyncio.Queue):
+    """Очередь обновлений Application с лимитом на принятые, но не обработанные.
+
+    При конкурентной обработке Application сразу забирает каждое
+    обновление из очереди и запускает для него задачу, поэтому maxsize
+    обычной asyncio.Queue ничего не ограничивает. Здесь limit считает
+    обновления от put до task_done, который Application вызывает после
+    обработки: ждущие в очереди, ждущие блокировки пользователя и
+    обрабатываемые. Когда лимит исчерпан, put ждет освобождения места
+    (polling перестает запрашивать обновления, воркер - читать канал
+    ingress), а put_nowait бросает asyncio.QueueFull (вебхук отвечает 503).
+    """
+
+    def __init__(self, limit: int):
+        if limit < 1:
+            raise ValueError("limit must be a positive integer")
+        super().__init__()
+        self.limit = limit
+        self._in_flight = 0
+        # Взводится в task_done: место освобождается после обработки, а не при извлечении
+        self._released = asyncio.Event()
+
+    @property
+    def unfinished(self) -> int:
+        """Принятые обновления, обработка которых еще не закончилась"""
+        return self._in_flight
+
+    def full(self) -> bool:
+        return self._in_flight >= self.limit
+
+    async def put(self, item: Any) -> None:
+        while self.full():
+            self._released.clear()
+            await self._released.wait()
+        self.put_nowait(item)
+
+    def put_nowait(self, item: Any) -> None:
+        # Базовая очередь сама проверяет full() и бросает QueueFull
+        super().put_nowait(item)
+        self._in_flight += 1
+
+    def task_done(self) -> None:
+        super().task_done()
+        self._in_flight -= 1
+        self._released.set()
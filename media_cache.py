@@ -0,0 +1,111 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+from telegram import Bot, Message
+from telegram.error import BadRequest
+
+logger = logging.getLogger(__name__)
+
+MEDIA_CACHE_PATH = "media/file_ids.json"
+# Ответы Bot API, означающие, что сохраненный file_id больше не действует
+STALE_FILE_ID_ERRORS = ("wrong file identifier", "wrong remote file identifier", "file reference expired")
+
+def is_stale_file_id(error: BadRequest) -> bool:
+    message = error.message.lower()
+    return any(text in message for text in STALE_FILE_ID_ERRORS)
+
+class MediaRegistry:
+    """Загруженные в Telegram медиафайлы: путь -> file_id.
+
+    Каждый файл отправляется целиком только один раз, дальше бот шлет
+    полученный от Telegram file_id. Запись хранит sha256 содержимого и id
+    бота (file_id действителен только для него); если файл изменился или
+    бот другой, файл загружается заново. Реестр сохраняется в JSON, чтобы
+    file_id переживали перезапуск.
+    """
+
+    def __init__(self, path: str = MEDIA_CACHE_PATH):
+        self.path = path
+        self._entries: Dict[str, Dict[str, Any]] = self._load()
+        # (mtime_ns, size) -> sha256, чтобы не читать файл при каждой отправке
+        self._digests: Dict[str, Tuple[Tuple[int, int], str]] = {}
+        self._upload_locks: Dict[str, asyncio.Lock] = {}
+        self._write_lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable media cache %s: %s", self.path, e)
+            return {}
+
+    def _save(self) -> None:
+        with self._write_lock:
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def digest(self, asset: str) -> str:
+        """sha256 файла; пересчитывается, только если изменились mtime или размер"""
+        stat = os.stat(asset)
+        key = (stat.st_mtime_ns, stat.st_size)
+        cached = self._digests.get(asset)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        sha = hashlib.sha256()
+        with open(asset, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                sha.update(chunk)
+        self._digests[asset] = (key, sha.hexdigest())
+        return sha.hexdigest()
+
+    def file_id(self, asset: str, bot_id: int) -> Optional[str]:
+        """file_id для текущего содержимого файла или None, если его нужно загрузить"""
+        entry = self._entries.get(asset)
+        if entry is None or entry["bot_id"] != bot_id or entry["sha256"] != self.digest(asset):
+            return None
+        return entry["file_id"]
+
+    def remember(self, asset: str, bot_id: int, file_id: str) -> None:
+        self._entries[asset] = {"sha256": self.digest(asset), "bot_id": bot_id, "file_id": file_id}
+        self._save()
+
+    def forget(self, asset: str) -> None:
+        if self._entries.pop(asset, None) is not None:
+            self._save()
+
+    async def send_photo(self, bot: Bot, chat_id: int, asset: str, **kwargs) -> Message:
+        """Отправить фото из файла asset, загружая его в Telegram только при изменении"""
+        file_id = self.file_id(asset, bot.id)
+        if file_id is not None:
+            try:
+                return await bot.send_photo(chat_id, photo=file_id, **kwargs)
+            except BadRequest as e:
+                # Остальные BadRequest (чат не найден, плохая подпись) не связаны с file_id
+                if not is_stale_file_id(e):
+                    raise
+                logger.warning("Cached file_id for %s was rejected (%s), uploading again", asset, e)
+                self.forget(asset)
+
+        # Одновременные первые отправки ждут одну загрузку, а не грузят файл каждая
+        lock = self._upload_locks.setdefault(asset, asyncio.Lock())
+        async with lock:
+            file_id = self.file_id(asset, bot.id)
+            if file_id is not None:
+                return await bot.send_photo(chat_id, photo=file_id, **kwargs)
+            with open(asset, "rb") as photo:
+                message = await bot.send_photo(chat_id, photo=photo, **kwargs)
+            # Самый большой размер из тех, что Telegram сделал из загруженного фото
+            await asyncio.to_thread(self.remember, asset, bot.id, message.photo[-1].file_id)
+            logger.info("Uploaded %s, cached file_id", asset)
+            return message
+
+media_registry = MediaRegistry(os.getenv("MEDIA_CACHE_PATH", MEDIA_CACHE_PATH))
@@ -0,0 +1,224 @@
+import functools
+import inspect
+import logging
+import time
+from typing import Any, Callable, Optional
+from aiohttp import web
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from telegram.ext import Application
+from telegram.request import HTTPXRequest
+from storage.base import BaseStorage
+from storage.locks import user_locks
+from handlers.squad_view import squad_views
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+HANDLER_LATENCY = Histogram(
+    "futbochi_handler_duration_seconds", "Время работы обработчика обновления",
+    ["handler"], buckets=LATENCY_BUCKETS,
+)
+HANDLER_ERRORS = Counter(
+    "futbochi_handler_errors_total", "Исключения, вышедшие из обработчика", ["handler"],
+)
+STORAGE_LATENCY = Histogram(
+    "futbochi_storage_duration_seconds", "Время вызова метода хранилища",
+    ["backend", "method"], buckets=LATENCY_BUCKETS,
+)
+STORAGE_ERRORS = Counter(
+    "futbochi_storage_errors_total", "Исключения в методах хранилища", ["backend", "method"],
+)
+BOT_API_LATENCY = Histogram(
+    "futbochi_bot_api_duration_seconds", "Время запроса к Bot API",
+    ["method"], buckets=LATENCY_BUCKETS,
+)
+BOT_API_REQUESTS = Counter(
+    "futbochi_bot_api_requests_total", "Запросы к Bot API по HTTP-статусу ответа", ["method", "status"],
+)
+
+# Публичные методы хранилища, которые оборачиваются таймерами
+STORAGE_METHODS = (
+    "get_team", "save_team", "save_teams", "get_all_teams",
+    "update_team", "aget_team", "asave_team", "aupdate_team",
+    "get_top_teams", "get_team_rank", "count_teams", "flush", "update_limit",
+)
+
+def timed_handler(callback: Callable, name: Optional[str] = None) -> Callable:
+    """Обернуть async-обработчик PTB: время выполнения и число исключений"""
+    name = name or callback.__name__
+    latency = HANDLER_LATENCY.labels(name)
+    errors = HANDLER_ERRORS.labels(name)
+
+    @functools.wraps(callback)
+    async def wrapper(update: Any, context: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            latency.observe(time.perf_counter() - started)
+    wrapper.timed = True
+    return wrapper
+
+def instrument_handlers(application: Application) -> None:
+    """Обернуть все зарегистрированные в приложении обработчики (повторный вызов ничего не меняет)"""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if not getattr(handler.callback, "timed", False):
+                handler.callback = timed_handler(handler.callback)
+
+def _timed_method(method: Callable, backend: str, name: str) -> Callable:
+    latency = STORAGE_LATENCY.labels(backend, name)
+    errors = STORAGE_ERRORS.labels(backend, name)
+
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                latency.observe(time.perf_counter() - started)
+        async_wrapper.timed = True
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            latency.observe(time.perf_counter() - started)
+    wrapper.timed = True
+    return wrapper
+
+def instrument_storage(storage: BaseStorage) -> None:
+    """Обернуть методы хранилища и, если это кэш, хранилища под ним.
+
+    Метка backend отличает обращения к кэшу (CachedStorage) от реального
+    ввода-вывода (JsonStorage, SQLiteStorage). Уже обернутые методы не
+    оборачиваются повторно.
+    """
+    targets = [storage]
+    backend = getattr(storage, "backend", None)
+    if backend is not None:
+        targets.append(backend)
+    for target in targets:
+        backend_name = type(target).__name__
+        for name in STORAGE_METHODS:
+            method = getattr(target, name, None)
+            if method is not None and not getattr(method, "timed", False):
+                setattr(target, name, _timed_method(method, backend_name, name))
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest, считающий запросы к Bot API по методу и статусу"""
+
+    async def do_request(self, url: str, method: str, request_data=None, **kwargs) -> Any:
+        endpoint = url.rsplit("/", 1)[-1]
+        started = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, request_data, **kwargs)
+        except Exception:
+            BOT_API_REQUESTS.labels(endpoint, "error").inc()
+            raise
+        finally:
+            BOT_API_LATENCY.labels(endpoint).observe(time.perf_counter() - started)
+        BOT_API_REQUESTS.labels(endpoint, str(code)).inc()
+        return code, payload
+
+class RuntimeCollector:
+    """Значения, которые дешевле прочитать в момент опроса, чем считать на лету"""
+
+    def __init__(self, application: Application, storage: BaseStorage):
+        self.application = application
+        self.storage = storage
+
+    def collect(self):
+        yield GaugeMetricFamily(
+            "futbochi_update_queue_size", "Принятые, но еще не обработанные обновления",
+            value=getattr(self.application.update_queue, "unfinished", self.application.update_queue.qsize()),
+        )
+        yield GaugeMetricFamily(
+            "futbochi_active_users", "Пользователи с обновлением в обработке или в очереди",
+            value=len(user_locks),
+        )
+        if self.application.job_queue is not None:
+            yield GaugeMetricFamily(
+                "futbochi_scheduled_jobs", "Задачи JobQueue (трансляции матчей)",
+                value=len(self.application.job_queue.jobs()),
+            )
+
+        rate_limiter = getattr(self.application.bot, "rate_limiter", None)
+        if rate_limiter is not None and hasattr(rate_limiter, "stats"):
+            outbound = rate_limiter.stats()
+            queued = GaugeMetricFamily(
+                "futbochi_outbound_queue_size", "Исходящие запросы, ждущие лимита Telegram", labels=["lane"],
+            )
+            for lane, size in outbound["queued"].items():
+                queued.add_metric([lane], size)
+            yield queued
+            yield CounterMetricFamily(
+                "futbochi_outbound_retry_after", "Ответы 429 (RetryAfter) от Bot API", value=outbound["retry_after"],
+            )
+
+        views = squad_views.stats()
+        yield CounterMetricFamily("futbochi_squad_render_hits", "Экраны состава, взятые из кэша", value=views["hits"])
+        yield CounterMetricFamily("futbochi_squad_render_misses", "Экраны состава, отрисованные заново", value=views["misses"])
+
+        stats = getattr(self.storage, "stats", None)
+        if stats is not None:
+            cache = stats()
+            yield CounterMetricFamily("futbochi_cache_hits", "Попадания в кэш команд", value=cache["hits"])
+            yield CounterMetricFamily("futbochi_cache_misses", "Промахи кэша команд", value=cache["misses"])
+            yield GaugeMetricFamily("futbochi_cache_teams", "Команды в кэше", value=cache["size"])
+            yield GaugeMetricFamily("futbochi_cache_dirty", "Несохраненные команды в кэше", value=cache["dirty"])
+
+# Один сборщик на процесс: реестр не принимает метрики с теми же именами дважды
+_runtime_collector: Optional[RuntimeCollector] = None
+
+def register_runtime_collector(application: Application, storage: BaseStorage) -> RuntimeCollector:
+    """Зарегистрировать RuntimeCollector; при повторном вызове он переключается на новое приложение"""
+    global _runtime_collector
+    if _runtime_collector is None:
+        _runtime_collector = RuntimeCollector(application, storage)
+        REGISTRY.register(_runtime_collector)
+    else:
+        _runtime_collector.application = application
+        _runtime_collector.storage = storage
+    return _runtime_collector
+
+class MetricsServer:
+    """HTTP-сервер с метриками в текстовом формате Prometheus на /metrics"""
+
+    def __init__(self, host: str = "0.0.0.0", port: int = 9100):
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        response = web.Response(body=generate_latest(REGISTRY))
+        response.headers["Content-Type"] = CONTENT_TYPE_LATEST
+        return response
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info("Metrics available on %s:%d/metrics", self.host, self.port)
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,50 @@
+from typing import List, NamedTuple
+
+class ActionLimit(NamedTuple):
+    """Не больше count действий за window секунд"""
+    count: int
+    window: float
+
+class LimitCheck(NamedTuple):
+    """Результат проверки лимита"""
+    allowed: bool
+    retry_after: float = 0.0  # Секунд до освобождения слота, если действие запрещено
+
+# Лимиты действий пользователя
+ACTION_LIMITS = {
+    "buy_player": ActionLimit(4, 600),  # 4 покупки за 10 минут
+    "play_match": ActionLimit(3, 600),  # 3 матча за 10 минут
+    "support": ActionLimit(1, 120),     # поддержка клуба раз в 2 минуты
+}
+
+def check_slots(slots: List[float], limit: ActionLimit, now: float) -> LimitCheck:
+    """Проверить лимит по временам последних действий (старые первыми).
+
+    Хранится не больше limit.count времен, поэтому проверка смотрит одно
+    значение: самое старое из последних count действий.
+    """
+    if len(slots) < limit.count:
+        return LimitCheck(True)
+    free_at = slots[-limit.count] + limit.window
+    if now >= free_at:
+        return LimitCheck(True)
+    return LimitCheck(False, free_at - now)
+
+def take_slot(slots: List[float], limit: ActionLimit, now: float) -> LimitCheck:
+    """Проверить лимит и, если он позволяет, записать действие в slots"""
+    check = check_slots(slots, limit, now)
+    if check.allowed:
+        slots.append(now)
+        # Кольцевой буфер: самое старое время вытесняется новым
+        del slots[:-limit.count]
+    return check
+
+def format_wait(seconds: float) -> str:
+    """Время ожидания для сообщения пользователю: "3 мин 20 с" или "45 с" """
+    seconds = max(1, int(seconds + 0.999))
+    minutes, seconds = divmod(seconds, 60)
+    if not minutes:
+        return f"{seconds} с"
+    if not seconds:
+        return f"{minutes} мин"
+    return f"{minutes} мин {seconds} с"
@@ -0,0 +1,96 @@
+from functools import lru_cache
+from typing import Dict, Mapping, Optional, Tuple
+import numpy as np
+
+# Веса характеристик в общем рейтинге команды
+RATING_WEIGHTS = {
+    'speed': 0.25,
+    'mentality': 0.2,
+    'finishing': 0.35,
+    'defense': 0.2
+}
+
+# Базовый шанс гола зависит от сложности
+DIFFICULTY_GOAL_CHANCE = {
+    'easy': 0.4,    # 40% базовый шанс на легком
+    'medium': 0.35,  # 35% на среднем
+    'hard': 0.3     # 30% на сложном
+}
+
+# Награда за матч в зависимости от сложности: (минимум, максимум)
+REWARD_RANGES = {
+    'easy': (200, 400),
+    'medium': (400, 800),
+    'hard': (800, 1500)
+}
+DRAW_REWARD_SHARE = 0.4  # Ничья приносит 40% награды за победу
+
+TEAM_ATTACKS = 5
+OPPONENT_ATTACKS = 4  # Меньше атак у соперника
+
+# Число симулируемых матчей для оценки вероятностей исхода
+ODDS_SIMULATIONS = 20000
+# Шаг квантования шансов гола в ключе таблицы вероятностей (1/200 = 0.5%)
+ODDS_RESOLUTION = 200
+
+_rng = np.random.default_rng()
+
+def calculate_team_rating(team_power: Mapping[str, float]) -> float:
+    """Calculate overall team rating based on power stats"""
+    rating = sum(team_power[stat] * weight for stat, weight in RATING_WEIGHTS.items())
+    return round(rating, 1)
+
+def team_goal_chance(team_power: Mapping[str, float], difficulty: str,
+                     goal_chances: Mapping[str, float] = DIFFICULTY_GOAL_CHANCE) -> float:
+    """Шанс гола в одной атаке команды игрока: учитывает удар, рейтинг и сложность"""
+    finishing_factor = team_power['finishing'] / 100  # 0-1
+    rating_factor = calculate_team_rating(team_power) / 10  # 0-1
+    return goal_chances[difficulty] * (0.6 * finishing_factor + 0.4 * rating_factor)
+
+def opponent_goal_chance(team_power: Mapping[str, float], opponent_strength: float) -> float:
+    """Шанс гола в одной атаке соперника: защита блокирует до 50% шансов"""
+    defense_factor = team_power['defense'] / 100
+    return opponent_strength * (1 - defense_factor * 0.5)
+
+def match_reward(difficulty: str, opponent_strength: float, team_goals: int, opponent_goals: int,
+                 reward_ranges: Mapping[str, Tuple[int, int]] = REWARD_RANGES) -> Tuple[int, int]:
+    """Очки и монеты за исход матча; сильный соперник дает награду ближе к максимуму"""
+    base_min, base_max = reward_ranges[difficulty]
+    win_reward = base_min + (base_max - base_min) * opponent_strength
+    if team_goals > opponent_goals:
+        return 3, int(win_reward)
+    if team_goals == opponent_goals:
+        return 1, int(win_reward * DRAW_REWARD_SHARE)
+    return 0, 0
+
+def simulate_scores(team_chance: float, opponent_chance: float, n: int,
+                    rng: Optional[np.random.Generator] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Сыграть n матчей разом: голы команды и соперника как массивы длины n"""
+    rng = rng or _rng
+    # Атаки независимы, поэтому число голов за матч - биномиальная величина
+    team_goals = rng.binomial(TEAM_ATTACKS, min(max(team_chance, 0.0), 1.0), n)
+    opponent_goals = rng.binomial(OPPONENT_ATTACKS, min(max(opponent_chance, 0.0), 1.0), n)
+    return team_goals, opponent_goals
+
+@lru_cache(maxsize=(ODDS_RESOLUTION + 1) ** 2)
+def _simulated_odds(team_step: int, opponent_step: int) -> Tuple[int, int, int]:
+    team_goals, opponent_goals = simulate_scores(
+        team_step / ODDS_RESOLUTION, opponent_step / ODDS_RESOLUTION, ODDS_SIMULATIONS
+    )
+    win = np.count_nonzero(team_goals > opponent_goals) / ODDS_SIMULATIONS
+    lose = np.count_nonzero(team_goals < opponent_goals) / ODDS_SIMULATIONS
+    win, lose = round(win * 100), round(lose * 100)
+    return win, 100 - win - lose, lose
+
+def match_odds(team_power: Mapping[str, float], opponent_strength: float, difficulty: str) -> Dict[str, int]:
+    """Вероятности победы/ничьей/поражения в процентах по модели generate_match_events.
+
+    Результат симуляции запоминается по квантованным шансам гола, так что
+    повторный расчет для той же пары сил ничего не стоит.
+    """
+    team_step = round(team_goal_chance(team_power, difficulty) * ODDS_RESOLUTION)
+    opponent_step = round(opponent_goal_chance(team_power, opponent_strength) * ODDS_RESOLUTION)
+    win, draw, lose = _simulated_odds(
+        min(max(team_step, 0), ODDS_RESOLUTION), min(max(opponent_step, 0), ODDS_RESOLUTION)
+    )
+    return {'win': win, 'draw': draw, 'lose': lose}
@@ -1,27 +1,115 @@
-from typing import List, Dict, Tuple
-import json
-from datetime import datetime, timedelta
+from typing import List, Dict, Mapping, Optional, Sequence, Tuple
+from datetime import datetime
+from types import MappingProxyType
 import random
-import time
+from game_data import game_data
+
+# Бонус за количество активных игроков
+# 1 игрок: без бонуса
+# 2 игрока: +10% к общей силе
+# 3 игрока: +25% к общей силе
+PLAYER_COUNT_BONUS = {
+    1: 1.0,    # без бонуса
+    2: 1.1,    # +10%
+    3: 1.25    # +25%
+}
+
+MAX_SQUAD_SIZE = 22  # Игроков в составе
+
+EMPTY_POWER = MappingProxyType({"speed": 0, "mentality": 0, "finishing": 0, "defense": 0})
+
+def lineup_power(players: Sequence[Mapping]) -> Mapping[str, int]:
+    """Сила состава из карточек игроков с бонусом за их количество"""
+    if not players:
+        return EMPTY_POWER
+    total_power = dict(EMPTY_POWER)
+    # Сначала суммируем все статы
+    for player in players:
+        stats = player['stats']
+        for stat in total_power:
+            total_power[stat] += stats[stat]
+
+    # Применяем бонус за количество игроков и округляем
+    bonus_multiplier = PLAYER_COUNT_BONUS[len(players)]
+    for stat in total_power:
+        total_power[stat] = round(total_power[stat] * bonus_multiplier)
+    return MappingProxyType(total_power)
 
 class Team:
+    # Без __dict__: в кэше хранилища живут тысячи команд
+    __slots__ = (
+        "name", "money", "points",
+        "_squad_ids", "_active_ids", "_squad_index", "_power_cache",
+        "last_match_time", "strategy",
+        "sirena_player_bonus_used", "sirena_match_bonus_used", "sirena_no_money_bonus_used",
+        "last_season", "version",
+    )
+
     def __init__(self, name: str):
         self.name = name
         self.money = 1000
         self.points = 0
-        self.active_players = []  # до 3 активных игроков
-        self.squad = []  # до 22 игроков всего
-        self.last_support_time = None
+        # Игроки хранятся id из каталога, карточки берутся из game_data
+        self._active_ids: List[int] = []  # до 3 активных игроков
+        self._squad_ids: List[int] = []  # до 22 игроков всего
+        # id игрока -> сколько его карточек в составе; строится при первом обращении
+        self._squad_index: Optional[Dict[int, int]] = None
+        # (поколение каталога, сила команды); сбрасывается при смене состава
+        self._power_cache: Optional[Tuple[int, Mapping[str, int]]] = None
         self.last_match_time = None
         self.strategy = None
         
-        # Лимиты и таймеры для SirenaBet
-        self.player_purchases = []  # список timestamp'ов покупок игроков
-        self.matches_played = []    # список timestamp'ов сыгранных матчей
+        # Бонусы SirenaBet; лимиты покупок и матчей ведет storage.limiter
         self.sirena_player_bonus_used = False  # использован ли бонус на покупку игрока
         self.sirena_match_bonus_used = False   # использован ли бонус на матч
         self.sirena_no_money_bonus_used = False  # использован ли бонус при отсутствии денег
 
+        # Последний сезон лиг, награды которого получены (scripts/season.py)
+        self.last_season: Optional[str] = None
+
+        # Версия сохраненной копии; хранилище сверяет ее при записи
+        self.version = 0
+
+    @property
+    def squad_ids(self) -> Tuple[int, ...]:
+        """id игроков состава (меняется только через методы команды)"""
+        return tuple(self._squad_ids)
+
+    @property
+    def active_ids(self) -> Tuple[int, ...]:
+        """id активных игроков (меняется только через методы команды)"""
+        return tuple(self._active_ids)
+
+    def _index(self) -> Dict[int, int]:
+        if self._squad_index is None:
+            index: Dict[int, int] = {}
+            for pid in self._squad_ids:
+                index[pid] = index.get(pid, 0) + 1
+            self._squad_index = index
+        return self._squad_index
+
+    def has_player(self, player_id: int) -> bool:
+        """Есть ли игрок в составе"""
+        return player_id in self._index()
+
+    def _set_roster(self, squad_ids: List[int], active_ids: List[int]) -> None:
+        self._squad_ids = list(squad_ids)
+        self._active_ids = list(active_ids)
+        self._squad_index = None
+        self._power_cache = None
+
+    @property
+    def squad(self) -> List[Dict]:
+        """Карточки игроков состава из текущего каталога"""
+        players_by_id = game_data.current.players_by_id
+        return [players_by_id[pid] for pid in self._squad_ids if pid in players_by_id]
+
+    @property
+    def active_players(self) -> List[Dict]:
+        """Карточки активных игроков из текущего каталога"""
+        players_by_id = game_data.current.players_by_id
+        return [players_by_id[pid] for pid in self._active_ids if pid in players_by_id]
+
     def add_points(self, points: int):
         """Add points to the team's total"""
         self.points += points
@@ -30,29 +118,6 @@ class Team:
         """Add money to the team's balance"""
         self.money += amount
 
-    def can_buy_player(self) -> bool:
-        """Проверяет, можно ли купить игрока (не более 4 за 10 минут)"""
-        current_time = time.time()
-        # Удаляем старые записи (старше 10 минут)
-        self.player_purchases = [t for t in self.player_purchases if current_time - t <= 600]
-        return len(self.player_purchases) < 4
-
-    def record_player_purchase(self):
-        """Записывает время покупки игрока"""
-        self.player_purchases.append(time.time())
-
-    def can_play_match(self) -> bool:
-        """Проверка возможности играть матч"""
-        now = datetime.now()
-        # Очищаем старые записи о матчах (старше 10 минут)
-        self.matches_played = [t for t in self.matches_played 
-                             if now - t < timedelta(minutes=10)]
-        return len(self.matches_played) < 3
-
-    def add_match_played(self):
-        """Записать сыгранный матч"""
-        self.matches_played.append(datetime.now())
-
     def can_use_sirena_player_bonus(self) -> bool:
         """Проверяет, можно ли использовать бонус на покупку игрока"""
         return not self.sirena_player_bonus_used
@@ -77,87 +142,61 @@ class Team:
         """Отмечает использование бонуса при отсутствии денег"""
         self.sirena_no_money_bonus_used = True
 
-    def can_support(self) -> bool:
-        """Проверка возможности поддержать клуб (кулдаун 2 минуты)"""
-        if not self.last_support_time:
-            return True
-        cooldown = timedelta(minutes=2)
-        return datetime.now() - self.last_support_time >= cooldown
-
     def add_player(self, player: Dict) -> bool:
         """Добавить игрока в команду"""
-        if len(self.squad) >= 22:
+        if len(self._squad_ids) >= MAX_SQUAD_SIZE:
             return False
-        self.squad.append(player)
+        player_id = player['id']
+        self._squad_ids.append(player_id)
+        if self._squad_index is not None:
+            self._squad_index[player_id] = self._squad_index.get(player_id, 0) + 1
         return True
 
     def remove_player(self, player_id: int) -> bool:
         """Удалить игрока из команды"""
-        for player in self.squad:
-            if player['id'] == player_id:
-                self.squad.remove(player)
-                if player in self.active_players:
-                    self.active_players.remove(player)
-                return True
-        return False
+        index = self._index()
+        count = index.get(player_id)
+        if not count:
+            return False
+        self._squad_ids.remove(player_id)
+        if count == 1:
+            del index[player_id]
+        else:
+            index[player_id] = count - 1
+        if player_id in self._active_ids:
+            self._active_ids.remove(player_id)
+            self._power_cache = None
+        return True
 
     def set_active_players(self, player_ids: List[int]) -> bool:
         """Установить активных игроков"""
         if len(player_ids) > 3:
             return False
         
-        active = []
-        for pid in player_ids:
-            for player in self.squad:
-                if player['id'] == pid:
-                    active.append(player)
-                    break
-        
-        if len(active) == len(player_ids):
-            self.active_players = active
+        index = self._index()
+        if all(pid in index for pid in player_ids):
+            self._active_ids = list(player_ids)
+            self._power_cache = None
             return True
         return False
 
-    def get_team_power(self):
-        """Calculate total team power from active players"""
-        total_power = {
-            "speed": 0,
-            "mentality": 0,
-            "finishing": 0,
-            "defense": 0
-        }
-        
-        if not self.active_players:
-            return total_power
-            
-        # Сначала суммируем все статы
-        for player in self.active_players:
-            for stat in total_power:
-                total_power[stat] += player['stats'][stat]
-        
-        # Применяем бонус за количество игроков
-        # 1 игрок: без бонуса
-        # 2 игрока: +10% к общей силе
-        # 3 игрока: +25% к общей силе
-        player_count_bonus = {
-            1: 1.0,    # без бонуса
-            2: 1.1,    # +10%
-            3: 1.25    # +25%
-        }
-        
-        bonus_multiplier = player_count_bonus[len(self.active_players)]
-        
-        # Применяем бонус и округляем
-        for stat in total_power:
-            total_power[stat] = round(total_power[stat] * bonus_multiplier)
-            
-        return total_power
+    def get_team_power(self) -> Mapping[str, int]:
+        """Calculate total team power from active players.
 
-    def support_club(self, action: str) -> tuple[bool, str]:
-        """Поддержать клуб одним из действий"""
-        if not self.can_support():
-            return False, "Подождите 2 минуты перед следующей поддержкой клуба"
+        Результат кэшируется до смены состава или перезагрузки каталога
+        и возвращается только для чтения.
+        """
+        data = game_data.current
+        cached = self._power_cache
+        if cached is not None and cached[0] == data.generation:
+            return cached[1]
+
+        power = lineup_power(self.active_players)
+        self._power_cache = (data.generation, power)
+        return power
 
+    def support_club(self, action: str) -> tuple[bool, str]:
+        """Поддержать клуб одним из действий (кулдаун проверяет storage.limiter)"""
         if action == "money":
             self.money += 500
             msg = "Получено 500 монет"
@@ -169,13 +208,11 @@ class Team:
         else:
             return False, "Неверное действие"
 
-        self.last_support_time = datetime.now()
         return True, msg
 
     def get_match_commentary(self) -> Tuple[List[str], int]:
         """Генерирует комментарии к матчу и считает голы"""
-        with open("data/match_data.json", "r", encoding="utf-8") as f:
-            match_data = json.load(f)
+        data = game_data.current
 
         commentary = []
         goals_scored = 0
@@ -186,30 +223,23 @@ class Team:
         for player in players:
             # Определяем, будет ли действие позитивным или негативным
             if random.random() < 0.7:  # 70% шанс позитивного действия
-                action = random.choice(match_data["match_actions"]["positive"])
+                action = random.choice(data.positive_actions)
                 if action["is_goal"]:
                     goals_scored += 1
             else:
-                action = random.choice(match_data["match_actions"]["negative"])
+                action = random.choice(data.negative_actions)
             
             commentary.append(f"{player['name']}... {action['action']}")
         
         return commentary, goals_scored
 
     def play_match(self, difficulty: str) -> tuple[bool, List[str], int, int]:
-        """Играть матч"""
-        if not self.can_play_match():
-            return False, ["Подождите перед следующим матчем"], 0, 0
-
-        if len(self.active_players) == 0:
+        """Играть матч (лимит матчей проверяет storage.limiter)"""
+        if len(self._active_ids) == 0:
             return False, ["Сначала выберите активных игроков!"], 0, 0
 
-        # Загружаем данные о командах
-        with open("data/match_data.json", "r", encoding="utf-8") as f:
-            match_data = json.load(f)
-        
         # Выбираем случайного соперника
-        opponent = random.choice(match_data["opponent_teams"])
+        opponent = random.choice(game_data.current.opponents)
         
         # Рассчитываем силу команды
         team_power = self.get_team_power()
@@ -282,16 +312,15 @@ class Team:
             "name": self.name,
             "money": self.money,
             "points": self.points,
-            "active_players": self.active_players,
-            "squad": self.squad,
-            "last_support_time": self.last_support_time.isoformat() if self.last_support_time else None,
+            "active_players": list(self._active_ids),
+            "squad": list(self._squad_ids),
             "last_match_time": self.last_match_time.isoformat() if self.last_match_time else None,
             "strategy": self.strategy,
-            "player_purchases": self.player_purchases,
-            "matches_played": [t.isoformat() for t in self.matches_played],
             "sirena_player_bonus_used": self.sirena_player_bonus_used,
             "sirena_match_bonus_used": self.sirena_match_bonus_used,
-            "sirena_no_money_bonus_used": self.sirena_no_money_bonus_used
+            "sirena_no_money_bonus_used": self.sirena_no_money_bonus_used,
+            "last_season": self.last_season,
+            "version": self.version
         }
 
     @classmethod
@@ -300,14 +329,16 @@ class Team:
         team = cls(data["name"])
         team.money = data["money"]
         team.points = data["points"]
-        team.active_players = data["active_players"]
-        team.squad = data["squad"]
-        team.last_support_time = datetime.fromisoformat(data["last_support_time"]) if data["last_support_time"] else None
+        # Старые файлы хранят полные карточки игроков, новые - только id
+        team._set_roster(
+            [p["id"] if isinstance(p, dict) else p for p in data["squad"]],
+            [p["id"] if isinstance(p, dict) else p for p in data["active_players"]],
+        )
         team.last_match_time = datetime.fromisoformat(data["last_match_time"]) if data["last_match_time"] else None
         team.strategy = data["strategy"]
-        team.player_purchases = data.get("player_purchases", [])
-        team.matches_played = [datetime.fromisoformat(t) for t in data.get("matches_played", [])]
         team.sirena_player_bonus_used = data.get("sirena_player_bonus_used", False)
         team.sirena_match_bonus_used = data.get("sirena_match_bonus_used", False)
         team.sirena_no_money_bonus_used = data.get("sirena_no_money_bonus_used", False)
+        team.last_season = data.get("last_season")
+        team.version = data.get("version", 0)
         return team 
\ No newline at end of file
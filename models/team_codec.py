@@ -0,0 +1,138 @@
+import json
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Union
+from .team import Team
+
+# Двоичный формат команды:
+#   заголовок HEADER: метка b"FT", версия формата, флаги, деньги, очки,
+#   версия команды, время последнего матча (микросекунды от 1970-01-01),
+#   число игроков в составе и в основе, длина названия;
+#   затем название (UTF-8), стратегия и последний сезон (uint16 длины +
+#   UTF-8, если есть флаг) и id игроков состава и основы (uint16 или uint32 при флаге WIDE_IDS).
+MAGIC = b"FT"
+CODEC_VERSION = 1
+HEADER = struct.Struct("<2sBBqiIqBBH")
+
+FLAG_PLAYER_BONUS = 1 << 0
+FLAG_MATCH_BONUS = 1 << 1
+FLAG_NO_MONEY_BONUS = 1 << 2
+FLAG_LAST_MATCH = 1 << 3
+FLAG_STRATEGY = 1 << 4
+FLAG_WIDE_IDS = 1 << 5
+FLAG_SEASON = 1 << 6
+
+# Поля, которые можно прочитать без сборки команды (см. project_team)
+PROJECTION_FIELDS = ("name", "money", "points", "version")
+
+# last_match_time хранится без часового пояса, как и в JSON
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+def is_binary(data: Union[bytes, str]) -> bool:
+    """Документ команды в двоичном формате (а не старый JSON)"""
+    return isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:2]) == MAGIC
+
+def encode_team(team: Team) -> bytes:
+    """Команда в двоичном формате"""
+    squad, active = team._squad_ids, team._active_ids
+    flags = 0
+    if team.sirena_player_bonus_used:
+        flags |= FLAG_PLAYER_BONUS
+    if team.sirena_match_bonus_used:
+        flags |= FLAG_MATCH_BONUS
+    if team.sirena_no_money_bonus_used:
+        flags |= FLAG_NO_MONEY_BONUS
+    last_match = 0
+    if team.last_match_time is not None:
+        flags |= FLAG_LAST_MATCH
+        last_match = (team.last_match_time - EPOCH) // MICROSECOND
+    if max(squad, default=0) > 0xFFFF or max(active, default=0) > 0xFFFF:
+        flags |= FLAG_WIDE_IDS
+    tail = b""
+    if team.strategy is not None:
+        flags |= FLAG_STRATEGY
+        strategy = team.strategy.encode("utf-8")
+        tail = struct.pack("<H", len(strategy)) + strategy
+    if team.last_season is not None:
+        flags |= FLAG_SEASON
+        season = team.last_season.encode("utf-8")
+        tail += struct.pack("<H", len(season)) + season
+    ids = array("I" if flags & FLAG_WIDE_IDS else "H", squad)
+    ids.extend(active)
+    if sys.byteorder == "big":
+        ids.byteswap()  # id всегда little-endian
+    name = team.name.encode("utf-8")
+
+    return b"".join((
+        HEADER.pack(
+            MAGIC, CODEC_VERSION, flags, team.money, team.points, team.version, last_match,
+            len(squad), len(active), len(name),
+        ),
+        name, tail, ids.tobytes(),
+    ))
+
+def decode_team(data: bytes) -> Team:
+    """Команда из двоичного формата"""
+    (magic, codec_version, flags, money, points, version, last_match,
+     squad_count, active_count, name_length) = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a binary team document")
+    if codec_version != CODEC_VERSION:
+        raise ValueError(f"Unsupported team codec version: {codec_version}")
+
+    offset = HEADER.size
+    team = Team(data[offset:offset + name_length].decode("utf-8"))
+    offset += name_length
+    if flags & FLAG_STRATEGY:
+        strategy_length, = struct.unpack_from("<H", data, offset)
+        offset += 2
+        team.strategy = data[offset:offset + strategy_length].decode("utf-8")
+        offset += strategy_length
+    if flags & FLAG_SEASON:
+        season_length, = struct.unpack_from("<H", data, offset)
+        offset += 2
+        team.last_season = data[offset:offset + season_length].decode("utf-8")
+        offset += season_length
+
+    ids = array("I" if flags & FLAG_WIDE_IDS else "H")
+    ids.frombytes(data[offset:offset + (squad_count + active_count) * ids.itemsize])
+    if sys.byteorder == "big":
+        ids.byteswap()
+    ids = ids.tolist()
+    team._set_roster(ids[:squad_count], ids[squad_count:])
+
+    team.money = money
+    team.points = points
+    team.version = version
+    team.last_match_time = EPOCH + last_match * MICROSECOND if flags & FLAG_LAST_MATCH else None
+    team.sirena_player_bonus_used = bool(flags & FLAG_PLAYER_BONUS)
+    team.sirena_match_bonus_used = bool(flags & FLAG_MATCH_BONUS)
+    team.sirena_no_money_bonus_used = bool(flags & FLAG_NO_MONEY_BONUS)
+    return team
+
+def load_team(data: Union[bytes, str]) -> Team:
+    """Команда из двоичного документа или из JSON, записанного до его появления.
+
+    Старые документы переводятся в двоичный формат при следующем сохранении.
+    """
+    if is_binary(data):
+        return decode_team(data)
+    return Team.from_dict(json.loads(data))
+
+def project_team(data: Union[bytes, str], fields: Iterable[str]) -> Dict[str, Any]:
+    """Отдельные поля команды без разбора состава и сборки Team.
+
+    Для двоичного документа читается только заголовок и название.
+    """
+    if is_binary(data):
+        _, _, _, money, points, version, _, _, _, name_length = HEADER.unpack_from(data)
+        values = {"money": money, "points": points, "version": version}
+        if "name" in fields:
+            values["name"] = bytes(data[HEADER.size:HEADER.size + name_length]).decode("utf-8")
+    else:
+        values = json.loads(data)
+        values.setdefault("version", 0)
+    return {field: values[field] for field in fields}
@@ -0,0 +1,193 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Полосы исходящих сообщений: меньшее значение обслуживается раньше
+PRIORITY_INTERACTIVE = 0  # ответы на действия пользователя
+PRIORITY_BACKGROUND = 1   # трансляции матчей и прочие фоновые рассылки
+LANES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BACKGROUND: "background"}
+
+class TokenBucket:
+    """Ведро жетонов: rate жетонов в секунду, не больше capacity про запас"""
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now: float) -> float:
+        """Взять жетон и вернуть, сколько секунд ждать до его появления.
+
+        Жетоны можно брать в долг: следующий запрос в том же ведре встанет
+        в очередь за предыдущим, а не проскочит раньше него.
+        """
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self) -> None:
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def idle(self, now: float) -> bool:
+        """Ведро полное, его можно забыть без потери ограничения"""
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+class OutboundRateLimiter(BaseRateLimiter[int]):
+    """Планировщик исходящих запросов к Bot API под лимиты Telegram.
+
+    Запросы с chat_id (отправка и редактирование сообщений) сначала ждут
+    жетон в ведре своего чата (chat_rate в секунду), затем общий жетон
+    (global_rate в секунду). Общие жетоны выдаются по приоритету из
+    rate_limit_args: ответы пользователям (PRIORITY_INTERACTIVE) обгоняют
+    трансляции матчей (PRIORITY_BACKGROUND). Прочие запросы, например
+    answerCallbackQuery, идут без ожидания.
+
+    На RetryAfter вся отправка приостанавливается на указанное Telegram
+    время, после чего запрос повторяется (не больше max_retries раз).
+    Обработчик ждет, пока его сообщение не уйдет, а его обновление до тех
+    пор считается необработанным в UpdateQueue (handlers.update_processor).
+    Поэтому при перегрузке бот упирается в лимит UPDATE_QUEUE_SIZE и
+    перестает принимать новые обновления, а трансляции матчей замедляются,
+    а не копятся в памяти.
+
+    Ведро пропускает за любую секунду не больше rate + burst запросов,
+    поэтому значения по умолчанию (25 + 5 на всех, 1 + 2 в чат) не
+    превышают лимиты Telegram в 30 сообщений в секунду и около трех в чат.
+    global_rate=0 отключает ограничение скорости, но не повторы после
+    RetryAfter.
+    """
+
+    # Ведра чатов чистятся, когда их становится больше этого числа
+    MAX_IDLE_CHATS = 10000
+
+    def __init__(self, global_rate: float = 25, chat_rate: float = 1, global_burst: float = 5,
+                 chat_burst: float = 2, max_retries: int = 3):
+        self.global_rate = global_rate
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_burst) if global_rate > 0 else None
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        self._chats: Dict[Any, TokenBucket] = {}
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._paused_until = 0.0
+        self.retry_after_count = 0
+
+    async def initialize(self) -> None:
+        # ExtBot вызывает initialize и у Application, и у Updater
+        if self._global is not None and self._dispatcher is None:
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def shutdown(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        for _, _, waiter in self._waiters:
+            waiter.cancel()
+        self._waiters.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        queued = {lane: 0 for lane in LANES.values()}
+        for priority, _, waiter in self._waiters:
+            if not waiter.done():
+                queued[LANES.get(priority, "background")] += 1
+        return {
+            "queued": queued,
+            "chats": len(self._chats),
+            "retry_after": self.retry_after_count,
+        }
+
+    def _chat_delay(self, chat_id: Any, now: float) -> float:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.MAX_IDLE_CHATS:
+                self._chats = {key: b for key, b in self._chats.items() if not b.idle(now)}
+            bucket = self._chats[chat_id] = TokenBucket(self._chat_rate, self._chat_burst)
+        return bucket.reserve(now)
+
+    async def _dispatch(self) -> None:
+        """Выдавать общие жетоны ожидающим в порядке приоритета"""
+        while True:
+            if not self._waiters:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            delay = self._global.reserve(time.monotonic())
+            if delay:
+                await asyncio.sleep(delay)
+            # За время ожидания мог прийти запрос важнее, жетон достанется ему
+            while self._waiters:
+                _, _, waiter = heapq.heappop(self._waiters)
+                if not waiter.done():
+                    waiter.set_result(None)
+                    break
+            else:
+                self._global.refund()
+
+    async def _acquire(self, chat_id: Any, priority: int) -> None:
+        now = time.monotonic()
+        delay = max(self._chat_delay(chat_id, now), self._paused_until - now)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), waiter))
+        self._wakeup.set()
+        await waiter
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Any:
+        chat_id = data.get("chat_id")
+        if chat_id is not None:
+            # chat_id приходит и числом, и строкой
+            chat_id = str(chat_id)
+        throttled = chat_id is not None and self._global is not None
+        priority = PRIORITY_INTERACTIVE if rate_limit_args is None else rate_limit_args
+        for attempt in range(self.max_retries + 1):
+            if throttled:
+                await self._acquire(chat_id, priority)
+            else:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                self.retry_after_count += 1
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(
+                    "Flood limit on %s for chat %s, pausing sends for %s s", endpoint, chat_id, e.retry_after
+                )
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
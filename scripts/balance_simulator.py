@@ -0,0 +1,212 @@
+"""Офлайн-симулятор баланса матчей и экономики.
+
+Берет каталог игроков и соперников из data/, собирает случайные составы
+по шансам редкости (как при покупке игроков) и прогоняет их матчи со всеми
+соперниками по модели generate_match_events (models.match). Работа делится
+на пачки составов и считается в пуле процессов.
+
+Отчет: доля побед/ничьих/поражений и средний доход за матч по сложностям,
+доля побед по рейтингу состава и кривые инфляции - сколько монет
+накапливается у игрока, который играет только матчи одной сложности.
+
+Запуск из корня репозитория:
+    python -m scripts.balance_simulator --lineups 20000 --matches 10
+    python -m scripts.balance_simulator --goal-chance hard=0.35 --reward easy=150:300
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Mapping, Tuple
+
+import numpy as np
+
+from catalog import PlayerCatalog
+from game_data import MATCH_DATA_PATH, PLAYERS_PATH
+from models.match import (
+    DIFFICULTY_GOAL_CHANCE, OPPONENT_ATTACKS, REWARD_RANGES, TEAM_ATTACKS,
+    calculate_team_rating, match_reward, opponent_goal_chance, team_goal_chance,
+)
+from models.team import Team, lineup_power
+
+logger = logging.getLogger(__name__)
+
+LINEUP_SIZE = 3  # Максимум активных игроков
+DEFAULT_PLAYER_COST = 1000  # PLAYER_COST в bot_main_futbotchi
+CAREER_CHECKPOINTS = (10, 25, 50, 100, 200, 500, 1000)
+
+def load_setup(match_data_path: str, players_path: str) -> Dict:
+    """Соперники и каталог игроков в виде, пригодном для передачи в процессы"""
+    with open(match_data_path, "r", encoding="utf-8") as f:
+        match_data = json.load(f)
+    with open(players_path, "r", encoding="utf-8") as f:
+        players = json.load(f)
+    return {
+        "opponents": match_data["opponent_teams"],
+        "players": players["players"],
+        "rarity_chances": players["rarity_chances"],
+    }
+
+
+def simulate_chunk(setup: Mapping, lineups: int, matches: int, career: int,
+                   goal_chances: Mapping[str, float], reward_ranges: Mapping[str, Tuple[int, int]],
+                   seed: int) -> Dict[str, Dict]:
+    """Пачка составов: матчи со всеми соперниками и одна карьера на каждую сложность"""
+    rng = np.random.default_rng(seed)
+    catalog = PlayerCatalog(setup["players"], setup["rarity_chances"])
+    draw_rng = random.Random(seed)
+    powers = [lineup_power(catalog.draw(n=LINEUP_SIZE, rng=draw_rng)) for _ in range(lineups)]
+    rating = np.array([calculate_team_rating(p) for p in powers])
+    defense = np.array([p["defense"] for p in powers], dtype=float)
+    start_money = Team("").money
+    checkpoints = [c for c in CAREER_CHECKPOINTS if c <= career] or [career]
+
+    results = {}
+    for difficulty, opponents in setup["opponents"].items():
+        strengths = np.array([o["strength"] for o in opponents])
+        win_reward = np.array([match_reward(difficulty, s, 1, 0, reward_ranges)[1] for s in strengths])
+        draw_reward = np.array([match_reward(difficulty, s, 0, 0, reward_ranges)[1] for s in strengths])
+
+        # Шансы гола: (составы,) для команды и (составы, соперники) для соперника
+        team_chance = np.clip([team_goal_chance(p, difficulty, goal_chances) for p in powers], 0.0, 1.0)
+        # Формула соперника линейна и считается сразу для всех пар состав-соперник
+        opponent_chance = np.clip(
+            opponent_goal_chance({"defense": defense[:, None]}, strengths[None, :]), 0.0, 1.0
+        )
+
+        # Каждый состав играет matches матчей с каждым соперником
+        shape = (lineups, len(opponents), matches)
+        team_goals = rng.binomial(TEAM_ATTACKS, team_chance[:, None, None], shape)
+        opponent_goals = rng.binomial(OPPONENT_ATTACKS, opponent_chance[:, :, None], shape)
+        wins = np.count_nonzero(team_goals > opponent_goals, axis=2)
+        draws = np.count_nonzero(team_goals == opponent_goals, axis=2)
+        coins = wins @ win_reward + draws @ draw_reward
+
+        # Карьера: career матчей подряд со случайным соперником этой сложности
+        picks = rng.integers(len(opponents), size=(lineups, career))
+        career_team = rng.binomial(TEAM_ATTACKS, np.broadcast_to(team_chance[:, None], picks.shape))
+        career_opponent = rng.binomial(OPPONENT_ATTACKS, np.take_along_axis(opponent_chance, picks, axis=1))
+        income = np.where(career_team > career_opponent, win_reward[picks],
+                          np.where(career_team == career_opponent, draw_reward[picks], 0))
+        money = start_money + np.cumsum(income, axis=1)
+
+        results[difficulty] = {
+            "matches": lineups * len(opponents) * matches,
+            "wins": int(wins.sum()),
+            "draws": int(draws.sum()),
+            "coins": int(coins.sum()),
+            "rating": rating,
+            "lineup_wins": wins.sum(axis=1),
+            "checkpoints": checkpoints,
+            "career_money": money[:, [c - 1 for c in checkpoints]],
+        }
+    return results
+
+def merge_results(chunks: List[Dict[str, Dict]]) -> Dict[str, Dict]:
+    """Сложить результаты пачек"""
+    merged = {}
+    for chunk in chunks:
+        for difficulty, part in chunk.items():
+            total = merged.setdefault(difficulty, {
+                "matches": 0, "wins": 0, "draws": 0, "coins": 0,
+                "rating": [], "lineup_wins": [], "career_money": [],
+                "checkpoints": part["checkpoints"],
+            })
+            for key in ("matches", "wins", "draws", "coins"):
+                total[key] += part[key]
+            for key in ("rating", "lineup_wins", "career_money"):
+                total[key].append(part[key])
+    for total in merged.values():
+        for key in ("rating", "lineup_wins", "career_money"):
+            total[key] = np.concatenate(total[key])
+    return merged
+
+def run(setup: Mapping, lineups: int, matches: int, career: int, chunk_size: int, workers: int,
+        goal_chances: Mapping[str, float], reward_ranges: Mapping[str, Tuple[int, int]],
+        seed: int) -> Dict[str, Dict]:
+    """Разбить составы на пачки и посчитать их в пуле процессов"""
+    sizes = [min(chunk_size, lineups - start) for start in range(0, lineups, chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(simulate_chunk, setup, size, matches, career, goal_chances, reward_ranges, seed + i)
+            for i, size in enumerate(sizes)
+        ]
+        return merge_results([future.result() for future in futures])
+
+def format_report(results: Mapping[str, Dict], player_cost: int) -> str:
+    """Текстовый отчет по результатам симуляции"""
+    lines = []
+    for difficulty, total in results.items():
+        played = total["matches"]
+        losses = played - total["wins"] - total["draws"]
+        lines.append(f"== {difficulty}: {played} матчей ==")
+        lines.append(
+            f"Победы {total['wins'] / played:.1%}  Ничьи {total['draws'] / played:.1%}  "
+            f"Поражения {losses / played:.1%}  Доход за матч {total['coins'] / played:.1f} монет"
+        )
+
+        lines.append("Доля побед по рейтингу состава:")
+        played_per_lineup = played // len(total["rating"])
+        buckets = np.floor(total["rating"]).astype(int)
+        for bucket in np.unique(buckets):
+            mask = buckets == bucket
+            rate = total["lineup_wins"][mask].sum() / (mask.sum() * played_per_lineup)
+            lines.append(f"  {bucket}-{bucket + 1}: {rate:.1%} ({mask.sum()} составов)")
+
+        lines.append("Инфляция (монет после N матчей: среднее / p10 / p50 / p90, игроков по средней):")
+        money = total["career_money"]
+        for i, checkpoint in enumerate(total["checkpoints"]):
+            column = money[:, i]
+            p10, p50, p90 = np.percentile(column, [10, 50, 90])
+            lines.append(
+                f"  {checkpoint:>5}: {column.mean():>9.0f} / {p10:>8.0f} / {p50:>8.0f} / {p90:>8.0f}"
+                f"  ({column.mean() / player_cost:.1f})"
+            )
+        lines.append("")
+    return "\n".join(lines)
+
+def _parse_overrides(items: List[str], parse) -> Dict:
+    overrides = {}
+    for item in items:
+        key, _, value = item.partition("=")
+        overrides[key] = parse(value)
+    return overrides
+
+def _parse_range(value: str) -> Tuple[int, int]:
+    low, _, high = value.partition(":")
+    return int(low), int(high)
+
+def main():
+    parser = argparse.ArgumentParser(description="Симуляция баланса матчей и экономики")
+    parser.add_argument("--match-data", default=MATCH_DATA_PATH, help="файл с соперниками")
+    parser.add_argument("--players", default=PLAYERS_PATH, help="каталог игроков")
+    parser.add_argument("--lineups", type=int, default=20000, help="число случайных составов")
+    parser.add_argument("--matches", type=int, default=10, help="матчей каждого состава с каждым соперником")
+    parser.add_argument("--career", type=int, default=500, help="длина карьеры для кривых инфляции, матчей")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="составов в одной задаче пула")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="число процессов")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--player-cost", type=int, default=DEFAULT_PLAYER_COST, help="цена игрока")
+    parser.add_argument("--goal-chance", action="append", default=[], metavar="DIFFICULTY=CHANCE",
+                        help="базовый шанс гола, например hard=0.35")
+    parser.add_argument("--reward", action="append", default=[], metavar="DIFFICULTY=MIN:MAX",
+                        help="диапазон награды, например easy=200:400")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    goal_chances = {**DIFFICULTY_GOAL_CHANCE, **_parse_overrides(args.goal_chance, float)}
+    reward_ranges = {**REWARD_RANGES, **_parse_overrides(args.reward, _parse_range)}
+    setup = load_setup(args.match_data, args.players)
+
+    started = time.perf_counter()
+    results = run(setup, args.lineups, args.matches, args.career, args.chunk_size, args.workers,
+                  goal_chances, reward_ranges, args.seed)
+    total_matches = sum(r["matches"] for r in results.values()) + args.lineups * args.career * len(results)
+    logger.info("Simulated %d matches in %.1f s", total_matches, time.perf_counter() - started)
+    print(format_report(results, args.player_cost))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Одноразовый перенос команд из каталога teams/ в базу SQLite.
+
+Запуск из корня репозитория:
+    python -m scripts.migrate_teams_to_sqlite --teams-dir teams --db teams.db
+"""
+import argparse
+import logging
+from typing import List, Tuple
+
+from storage import ConflictError
+from storage.json_storage import JsonStorage
+from storage.sqlite_storage import SQLiteStorage
+from models.team import Team
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+def _save_new(target: SQLiteStorage, batch: List[Tuple[str, Team]]) -> int:
+    """Записать пачку и вернуть число перенесенных команд; уже перенесенные пропускаются"""
+    try:
+        target.save_teams(batch)
+    except ConflictError as e:
+        # С версией 0 команда вставляется, только если ее еще нет в базе
+        return len(batch) - len(e.user_ids)
+    return len(batch)
+
+def migrate(teams_dir: str, db_path: str) -> Tuple[int, int]:
+    """Перенести команды и вернуть (перенесено, пропущено).
+
+    Команды читаются и пишутся пачками по BATCH_SIZE, поэтому память не
+    растет с размером базы. Команды, которые уже есть в базе, не
+    перезаписываются: повторный запуск после сбоя переносит только
+    оставшиеся. Файлы из плоского каталога teams/ сначала переносятся в шарды.
+    """
+    source = JsonStorage(teams_dir)
+    # Файлы плоской раскладки JsonStorage не видит
+    moved = source.move_to_shards()
+    if moved:
+        logger.info("Moved %d files in %s into shard directories", moved, teams_dir)
+    target = SQLiteStorage(db_path)
+    migrated = total = 0
+    try:
+        batch = []
+        for user_id, team in source.iter_teams(chunk_size=BATCH_SIZE):
+            # Запись новой команды проходит проверку версии с нуля
+            team.version = 0
+            batch.append((user_id, team))
+            if len(batch) == BATCH_SIZE:
+                migrated += _save_new(target, batch)
+                total += len(batch)
+                batch = []
+        migrated += _save_new(target, batch)
+        total += len(batch)
+    finally:
+        target.close()
+    return migrated, total - migrated
+
+def main():
+    parser = argparse.ArgumentParser(description="Перенос команд из JSON-файлов в SQLite")
+    parser.add_argument("--teams-dir", default="teams", help="каталог с файлами команд")
+    parser.add_argument("--db", default="teams.db", help="путь к базе SQLite")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    migrated, skipped = migrate(args.teams_dir, args.db)
+    logger.info("Migrated %d teams from %s to %s (%d already there)", migrated, args.teams_dir, args.db, skipped)
+
+if __name__ == "__main__":
+    main()
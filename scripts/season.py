@@ -0,0 +1,324 @@
+"""Офлайн-сезон: лиги по рейтингу и круговой турнир между командами игроков.
+
+Команды из хранилища сортируются по рейтингу состава (calculate_team_rating)
+и делятся на лиги примерно по --league-size команд: в первой лиге самые
+сильные. Внутри лиги каждая пара играет --legs раз (круговая система,
+расписание по кругу Бергера), во втором круге хозяева меняются.
+
+Матч считается по модели generate_match_events: хозяева атакуют
+TEAM_ATTACKS раз с шансом team_goal_chance, гости - OPPONENT_ATTACKS раз,
+а защита обороняющейся команды блокирует часть шансов, как в
+opponent_goal_chance. Лиги делятся на пачки и считаются в пуле процессов.
+
+Очки турнира (3 за победу, 1 за ничью) добавляются к очкам команды, призеры
+лиги получают монеты (--prize). Изменения пишутся через хранилище пачками
+по --batch-size команд; команду, которую бот успел изменить, сезон
+обновляет повторно через update_team. Команда запоминает --season, за
+который получила награды, и повторный запуск с тем же id ее пропускает.
+Таблицы лиг можно выгрузить в JSONL.
+
+Параллельно с ботом сезон можно запускать на SQLite и на JSON-файлах с
+STORAGE_FILE_LOCKS=1 у обоих процессов: только там запись сверяет версию
+команды. Сезон пишет мимо кэша бота, а обработчики бота меняют команды
+через update_team, поэтому при конфликте кэш повторяет их изменения на
+копии с наградой. JSON без блокировок требует остановленного бота
+(--bot-stopped), а журнал открывается одним процессом и без остановки
+бота не откроется.
+
+Запуск из корня репозитория (хранилище выбирается как у бота, STORAGE_BACKEND):
+    python -m scripts.season --dry-run --output standings.jsonl
+    STORAGE_BACKEND=sqlite python -m scripts.season --season 2026-10 --league-size 20 --legs 2
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from models.match import (
+    DIFFICULTY_GOAL_CHANCE, OPPONENT_ATTACKS, TEAM_ATTACKS,
+    calculate_team_rating, opponent_goal_chance, team_goal_chance,
+)
+from models.team import Team
+from storage import BaseStorage, ConflictError, storage
+from storage.json_storage import JsonStorage
+
+logger = logging.getLogger(__name__)
+
+SEASON_PRIZES = (5000, 3000, 2000, 1000)  # Монеты за 1-е, 2-е, ... место в лиге
+STANDING_FIELDS = ("played", "wins", "draws", "losses", "goals_for", "goals_against", "points", "place")
+
+def load_teams(storage: BaseStorage, difficulty: str, chunk_size: int) -> Tuple[List[str], Dict[str, np.ndarray]]:
+    """id команд, способных сыграть (есть основа), и их характеристики, отсортированные по рейтингу"""
+    user_ids, rating, chance, defense = [], [], [], []
+    skipped = 0
+    for user_id, team in storage.iter_teams(chunk_size=chunk_size):
+        if not team.active_ids:
+            skipped += 1
+            continue
+        power = team.get_team_power()
+        user_ids.append(user_id)
+        rating.append(calculate_team_rating(power))
+        chance.append(team_goal_chance(power, difficulty))
+        defense.append(power["defense"])
+    if skipped:
+        logger.info("Skipped %d teams without active players", skipped)
+
+    # Сильные первыми; при равном рейтинге порядок по id, чтобы сезон повторялся с тем же seed
+    order = np.lexsort((np.array(user_ids, dtype=object).astype(str), -np.array(rating, dtype=float)))
+    teams = {
+        "chance": np.array(chance, dtype=float)[order],
+        "defense": np.array(defense, dtype=float)[order],
+    }
+    return [user_ids[i] for i in order], teams
+
+def league_sizes(teams: int, league_size: int) -> np.ndarray:
+    """Размеры лиг: teams // league_size лиг, остаток раздается по одной команде"""
+    if teams < 2:
+        return np.zeros(0, dtype=int)
+    leagues = max(teams // league_size, 1)
+    return np.array([len(part) for part in np.array_split(np.arange(teams), leagues)])
+
+@lru_cache(maxsize=None)
+def round_robin(size: int, legs: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Расписание лиги из size команд: номера туров, хозяева и гости.
+
+    Круг Бергера: первая команда стоит на месте, остальные сдвигаются на
+    одну позицию каждый тур; при нечетном size одна команда отдыхает.
+    """
+    slots = list(range(size)) + ([None] if size % 2 else [])
+    count = len(slots)
+    rounds, home, away = [], [], []
+    for tour in range(count - 1):
+        for i in range(count // 2):
+            a, b = slots[i], slots[count - 1 - i]
+            if a is None or b is None:
+                continue
+            # Чередуем хозяев, чтобы дома и в гостях играть поровну
+            if (tour + i) % 2:
+                a, b = b, a
+            rounds.append(tour)
+            home.append(a)
+            away.append(b)
+        slots = [slots[0], slots[-1]] + slots[1:-1]
+    rounds, home, away = np.array(rounds), np.array(home), np.array(away)
+    # Следующие круги - те же туры с обменом хозяев
+    tours = count - 1
+    legs_rounds = [rounds + leg * tours for leg in range(legs)]
+    legs_home = [home if leg % 2 == 0 else away for leg in range(legs)]
+    legs_away = [away if leg % 2 == 0 else home for leg in range(legs)]
+    return np.concatenate(legs_rounds), np.concatenate(legs_home), np.concatenate(legs_away)
+
+def simulate_leagues(chance: np.ndarray, defense: np.ndarray, sizes: np.ndarray,
+                     legs: int, seed: int) -> Dict[str, np.ndarray]:
+    """Сыграть подряд идущие лиги и вернуть таблицу (массивы STANDING_FIELDS по командам)"""
+    rng = np.random.default_rng(seed)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    home, away = [], []
+    # Лиг всего двух размеров, поэтому пары строятся сразу для всех лиг одного размера
+    for size in np.unique(sizes):
+        _, league_home, league_away = round_robin(int(size), legs)
+        offsets = starts[sizes == size][:, None]
+        home.append((offsets + league_home).ravel())
+        away.append((offsets + league_away).ravel())
+    home, away = np.concatenate(home), np.concatenate(away)
+
+    # Шанс атакующей команды снижает защита соперника, как у соперников в generate_match_events
+    home_chance = np.clip(opponent_goal_chance({"defense": defense[away]}, chance[home]), 0.0, 1.0)
+    away_chance = np.clip(opponent_goal_chance({"defense": defense[home]}, chance[away]), 0.0, 1.0)
+    home_goals = rng.binomial(TEAM_ATTACKS, home_chance)
+    away_goals = rng.binomial(OPPONENT_ATTACKS, away_chance)
+
+    count = len(chance)
+    def total(values: np.ndarray, teams: np.ndarray) -> np.ndarray:
+        return np.bincount(teams, weights=values, minlength=count).astype(np.int64)
+
+    home_won, away_won, drawn = home_goals > away_goals, home_goals < away_goals, home_goals == away_goals
+    table = {
+        "played": total(np.ones(len(home)), home) + total(np.ones(len(away)), away),
+        "wins": total(home_won, home) + total(away_won, away),
+        "draws": total(drawn, home) + total(drawn, away),
+        "losses": total(away_won, home) + total(home_won, away),
+        "goals_for": total(home_goals, home) + total(away_goals, away),
+        "goals_against": total(away_goals, home) + total(home_goals, away),
+    }
+    table["points"] = table["wins"] * 3 + table["draws"]
+
+    # Место: очки, разница мячей, забитые; при равенстве выше команда с большим рейтингом
+    league = np.repeat(np.arange(len(sizes)), sizes)
+    difference = table["goals_for"] - table["goals_against"]
+    order = np.lexsort((np.arange(count), -table["goals_for"], -difference, -table["points"], league))
+    place = np.empty(count, dtype=np.int64)
+    place[order] = np.arange(count) - starts[league[order]] + 1
+    table["place"] = place
+    return table
+
+def run(teams: Mapping[str, np.ndarray], league_size: int, legs: int, chunk_leagues: int,
+        workers: int, seed: int) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Разбить команды на лиги и сыграть их пачками в пуле процессов; вернуть номера лиг и таблицу"""
+    sizes = league_sizes(len(teams["chance"]), league_size)
+    bounds = np.concatenate(([0], np.cumsum(sizes)))
+    chunks = range(0, len(sizes), chunk_leagues)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for i, first in enumerate(chunks):
+            last = min(first + chunk_leagues, len(sizes))
+            begin, end = bounds[first], bounds[last]
+            futures.append(pool.submit(
+                simulate_leagues, teams["chance"][begin:end], teams["defense"][begin:end],
+                sizes[first:last], legs, seed + i,
+            ))
+        parts = [future.result() for future in futures]
+
+    leagues = np.repeat(np.arange(1, len(sizes) + 1), sizes)
+    if not parts:
+        return leagues, {field: np.zeros(0, dtype=np.int64) for field in STANDING_FIELDS}
+    return leagues, {field: np.concatenate([part[field] for part in parts]) for field in STANDING_FIELDS}
+
+def prizes_for(places: np.ndarray, prizes: Sequence[int]) -> np.ndarray:
+    """Монеты за места в лигах"""
+    table = np.zeros(len(prizes) + 1, dtype=np.int64)
+    table[1:] = prizes
+    return np.where(places <= len(prizes), table[np.minimum(places, len(prizes))], 0)
+
+def apply_rewards(storage: BaseStorage, user_ids: Sequence[str], points: np.ndarray, money: np.ndarray,
+                  season: str, batch_size: int) -> Tuple[int, int]:
+    """Начислить очки и монеты сезона пачками save_teams.
+
+    Вместе с наградой команда запоминает сезон (Team.last_season), поэтому
+    повторный запуск того же сезона, в том числе после сбоя посреди записи,
+    пропускает уже награжденные команды. Команды перечитываются из
+    хранилища, поэтому изменения, сделанные ботом во время расчета, не
+    теряются. Команда, измененная между чтением и записью, обновляется
+    повторно через update_team. Возвращает (награждено, уже было награждено).
+    """
+    index = {user_id: i for i, user_id in enumerate(user_ids)}
+    # Обход хранилища может вернуть команду еще раз, если ее файл переписан в другом формате
+    seen = np.zeros(len(user_ids), dtype=bool)
+    conflicts: List[int] = []
+    rewarded = already = 0
+
+    def reward(i: int):
+        def mutate(team: Team) -> bool:
+            if team.last_season == season:
+                return False
+            team.add_points(int(points[i]))
+            team.add_money(int(money[i]))
+            team.last_season = season
+            return True
+        return mutate
+
+    def flush(batch: List[Tuple[str, Team]]) -> int:
+        try:
+            storage.save_teams(batch)
+        except ConflictError as e:
+            conflicts.extend(index[user_id] for user_id in e.user_ids)
+            return len(batch) - len(e.user_ids)
+        return len(batch)
+
+    batch = []
+    for user_id, team in storage.iter_teams(chunk_size=batch_size):
+        i = index.get(user_id)
+        if i is None or seen[i]:
+            continue
+        seen[i] = True
+        if not reward(i)(team):
+            already += 1
+            continue
+        batch.append((user_id, team))
+        if len(batch) == batch_size:
+            rewarded += flush(batch)
+            batch = []
+    rewarded += flush(batch)
+
+    for i in conflicts:
+        if storage.update_team(user_ids[i], reward(i)):
+            rewarded += 1
+        else:
+            already += 1
+    if conflicts:
+        logger.info("Retried %d teams changed during the write", len(conflicts))
+    missing = len(user_ids) - int(seen.sum())
+    if missing:
+        logger.warning("%d teams were deleted before the rewards were written", missing)
+    return rewarded, already
+
+def check_concurrent_writes(backend: BaseStorage) -> Optional[str]:
+    """Причина, по которой сезон нельзя запускать при работающем боте, или None"""
+    if isinstance(backend, JsonStorage) and not backend.file_locks:
+        return ("JSON storage without STORAGE_FILE_LOCKS=1 does not check team versions, "
+                "so the bot could overwrite the rewards")
+    return None
+
+def write_standings(path: str, user_ids: Sequence[str], leagues: np.ndarray,
+                    table: Mapping[str, np.ndarray], money: np.ndarray) -> None:
+    """Таблицы лиг в JSONL: одна строка на команду, по лигам и местам"""
+    order = np.lexsort((table["place"], leagues))
+    with open(path, "w", encoding="utf-8") as f:
+        for i in order:
+            row = {"user_id": user_ids[i], "league": int(leagues[i])}
+            row.update({field: int(table[field][i]) for field in STANDING_FIELDS})
+            row["money"] = int(money[i])
+            f.write(json.dumps(row) + "\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн-сезон лиг между командами игроков")
+    parser.add_argument("--league-size", type=int, default=20, help="команд в лиге (примерно)")
+    parser.add_argument("--legs", type=int, default=2, help="сколько раз играет каждая пара")
+    parser.add_argument("--difficulty", choices=sorted(DIFFICULTY_GOAL_CHANCE), default="medium",
+                        help="базовый шанс гола из этой сложности")
+    parser.add_argument("--prize", type=int, nargs="*", default=list(SEASON_PRIZES),
+                        help="монеты за 1-е, 2-е, ... место в лиге")
+    parser.add_argument("--chunk-leagues", type=int, default=500, help="лиг в одной задаче пула")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="число процессов")
+    parser.add_argument("--batch-size", type=int, default=1000, help="команд в одной записи в хранилище")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="записать таблицы лиг в JSONL-файл")
+    parser.add_argument("--dry-run", action="store_true", help="не начислять награды")
+    parser.add_argument("--season", help="id сезона (например, 2026-10); награды за него начисляются один раз")
+    parser.add_argument("--bot-stopped", action="store_true",
+                        help="бот остановлен: разрешить запись в JSON-хранилище без блокировок файлов")
+    args = parser.parse_args()
+    if args.league_size < 2 or args.legs < 1:
+        parser.error("--league-size must be at least 2 and --legs at least 1")
+    if not args.dry_run and not args.season:
+        parser.error("--season is required unless --dry-run is given")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    # Сезон пишет мимо кэша бота: хранилище процесса и так открыто при импорте storage
+    backend = getattr(storage, "backend", storage)
+    try:
+        problem = check_concurrent_writes(backend)
+        if problem and not args.dry_run and not args.bot_stopped:
+            parser.error(f"{problem}; stop the bot and pass --bot-stopped, or enable the locks for both")
+        started = time.perf_counter()
+        user_ids, teams = load_teams(backend, args.difficulty, args.batch_size)
+        logger.info("Loaded %d teams in %.1f s", len(user_ids), time.perf_counter() - started)
+
+        started = time.perf_counter()
+        leagues, table = run(teams, args.league_size, args.legs, args.chunk_leagues, args.workers, args.seed)
+        matches = int(table["played"].sum()) // 2
+        logger.info("Played %d matches in %d leagues in %.1f s",
+                    matches, int(leagues.max(initial=0)), time.perf_counter() - started)
+        if not len(leagues):
+            logger.info("Not enough teams for a league, nothing to play")
+            return
+
+        money = prizes_for(table["place"], args.prize)
+        if args.output:
+            write_standings(args.output, user_ids, leagues, table, money)
+        if not args.dry_run:
+            started = time.perf_counter()
+            rewarded, already = apply_rewards(backend, user_ids, table["points"], money, args.season, args.batch_size)
+            logger.info("Rewarded %d teams for season %s in %.1f s (%d already rewarded)",
+                        rewarded, args.season, time.perf_counter() - started, already)
+    finally:
+        storage.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""Перенос файлов команд и лимитов из плоского каталога teams/ в шарды.
+
+До шардирования команды лежали в teams/<id>.*, теперь JsonStorage читает
+их только из teams/ab/cd/. Перенос нужно выполнить один раз перед
+запуском бота с новой раскладкой; повторный запуск ничего не меняет, а
+прерванный можно просто запустить снова.
+
+Запуск из корня репозитория:
+    python -m scripts.shard_teams --teams-dir teams
+"""
+import argparse
+import logging
+import time
+
+from storage.json_storage import JsonStorage
+
+logger = logging.getLogger(__name__)
+
+def main():
+    parser = argparse.ArgumentParser(description="Перенос файлов команд в шарды teams/ab/cd/")
+    parser.add_argument("--teams-dir", default="teams", help="каталог с файлами команд")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    started = time.perf_counter()
+    moved = JsonStorage(args.teams_dir).move_to_shards()
+    logger.info("Moved %d files in %s into shard directories in %.1f s",
+                moved, args.teams_dir, time.perf_counter() - started)
+
+if __name__ == "__main__":
+    main()
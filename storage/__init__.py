@@ -0,0 +1,51 @@
+import atexit
+import os
+from .base import BaseStorage, ConflictError
+from .cache import CachedStorage
+from .journal_storage import JournalStorage
+from .json_storage import DEFAULT_TEAM_FORMAT, JsonStorage
+from .limits import ActionLimiter
+from .sqlite_storage import SQLiteStorage
+
+# Историческое имя хранилища на JSON-файлах
+Storage = JsonStorage
+
+def create_backend() -> BaseStorage:
+    """Создать хранилище по переменной окружения STORAGE_BACKEND (json, sqlite или journal)"""
+    backend = os.getenv("STORAGE_BACKEND", "json").lower()
+    if backend == "json":
+        return JsonStorage(
+            os.getenv("STORAGE_TEAMS_DIR", "teams"),
+            file_locks=os.getenv("STORAGE_FILE_LOCKS", "0") == "1",
+            team_format=os.getenv("STORAGE_TEAM_FORMAT", DEFAULT_TEAM_FORMAT),
+        )
+    if backend == "sqlite":
+        return SQLiteStorage(os.getenv("STORAGE_SQLITE_PATH", "teams.db"))
+    if backend == "journal":
+        return JournalStorage(
+            os.getenv("STORAGE_JOURNAL_DIR", "journal"),
+            compact_bytes=int(os.getenv("STORAGE_JOURNAL_COMPACT_MB", "64")) * 1024 * 1024,
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+def create_storage() -> BaseStorage:
+    """Создать хранилище с write-back кэшем (STORAGE_CACHE_SIZE=0 отключает кэш)"""
+    backend = create_backend()
+    cache_size = int(os.getenv("STORAGE_CACHE_SIZE", "10000"))
+    if cache_size <= 0:
+        return backend
+
+    cached = CachedStorage(
+        backend,
+        max_size=cache_size,
+        flush_interval=float(os.getenv("STORAGE_FLUSH_INTERVAL", "5")),
+    )
+    # Грязные команды записываются и при обычном завершении процесса
+    atexit.register(cached.close)
+    return cached
+
+# Создаем глобальный экземпляр хранилища
+storage = create_storage()
+
+# Лимиты действий пользователей в том же хранилище
+limiter = ActionLimiter(storage)
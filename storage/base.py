@@ -0,0 +1,149 @@
+import asyncio
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from game_data import game_data
+from models.team import Team
+from models.team_codec import PROJECTION_FIELDS
+from .leaderboard import Leaderboard
+
+class ConflictError(Exception):
+    """Команду успел изменить другой процесс: сохраняемая версия устарела"""
+
+    def __init__(self, user_ids: Iterable[str]):
+        self.user_ids = list(user_ids)
+        super().__init__(f"Team version conflict for users: {', '.join(self.user_ids)}")
+
+def check_fields(fields: Sequence[str]) -> None:
+    """Проверить, что поля можно прочитать без сборки команды"""
+    unknown = [field for field in fields if field not in PROJECTION_FIELDS]
+    if unknown:
+        raise ValueError(f"Fields cannot be projected: {', '.join(unknown)}")
+
+class BaseStorage:
+    """Общий контракт хранилищ команд"""
+
+    def __init__(self):
+        self.leaderboard = Leaderboard()
+        self._leaderboard_lock = threading.Lock()
+
+    def get_team(self, user_id: str) -> Optional[Team]:
+        """Получить команду пользователя"""
+        raise NotImplementedError
+
+    def save_team(self, user_id: str, team: Team) -> None:
+        """Сохранить команду пользователя"""
+        raise NotImplementedError
+
+    async def aget_team(self, user_id: str) -> Optional[Team]:
+        """Асинхронно получить команду, не блокируя цикл событий"""
+        return await asyncio.to_thread(self.get_team, user_id)
+
+    async def asave_team(self, user_id: str, team: Team) -> None:
+        """Асинхронно сохранить команду, не блокируя цикл событий"""
+        await asyncio.to_thread(self.save_team, user_id, team)
+
+    def update_team(self, user_id: str, mutate: Callable[[Team], Any], retries: int = 3) -> Any:
+        """Прочитать, изменить и сохранить команду, повторяя при конфликте версий.
+
+        mutate получает свежую команду и может быть вызван несколько раз;
+        возвращается его результат (None, если команды нет).
+        """
+        for attempt in range(retries + 1):
+            team = self.get_team(user_id)
+            if team is None:
+                return None
+            result = mutate(team)
+            try:
+                self.save_team(user_id, team)
+                return result
+            except ConflictError:
+                if attempt == retries:
+                    raise
+
+    async def aupdate_team(self, user_id: str, mutate: Callable[[Team], Any], retries: int = 3) -> Any:
+        """Асинхронный update_team"""
+        return await asyncio.to_thread(self.update_team, user_id, mutate, retries)
+
+    def save_teams(self, teams: Iterable[Tuple[str, Team]]) -> None:
+        """Сохранить несколько команд за один проход.
+
+        Конфликтующие команды пропускаются и перечисляются в ConflictError
+        после записи остальных.
+        """
+        conflicts = []
+        for user_id, team in teams:
+            try:
+                self.save_team(user_id, team)
+            except ConflictError:
+                conflicts.append(user_id)
+        if conflicts:
+            raise ConflictError(conflicts)
+
+    def iter_teams(self, fields: Optional[Sequence[str]] = None, chunk_size: int = 1000) -> Iterator[Tuple[str, Any]]:
+        """Обойти все команды, не загружая их в память разом.
+
+        Без fields выдает пары (user_id, Team). С fields выдает (user_id,
+        словарь этих полей), не собирая команды; допустимы поля
+        PROJECTION_FIELDS (name, money, points, version). chunk_size -
+        сколько записей читается из хранилища за раз.
+        """
+        raise NotImplementedError
+
+    def get_all_teams(self) -> Dict[str, Team]:
+        """Все команды в одном словаре; для больших баз используйте iter_teams"""
+        return dict(self.iter_teams())
+
+    def get_limit(self, user_id: str, action: str) -> List[float]:
+        """Буфер лимита действия пользователя (старые времена первыми) без блокировки записи"""
+        raise NotImplementedError
+
+    def update_limit(self, user_id: str, action: str, mutate: Callable[[List[float]], Any]) -> Any:
+        """Атомарно прочитать и изменить буфер лимита действия пользователя.
+
+        mutate получает список времен действий (старые первыми), меняет его
+        на месте и возвращает результат; измененный список сохраняется.
+        """
+        raise NotImplementedError
+
+    async def aupdate_limit(self, user_id: str, action: str, mutate: Callable[[List[float]], Any]) -> Any:
+        """Асинхронный update_limit"""
+        return await asyncio.to_thread(self.update_limit, user_id, action, mutate)
+
+    def _leaderboard_rows(self) -> Iterable[Tuple[str, str, int]]:
+        """Строки (user_id, название, очки) для первичного построения рейтинга"""
+        for user_id, row in self.iter_teams(fields=("name", "points")):
+            yield user_id, row["name"], row["points"]
+
+    def refresh_leaderboard(self) -> None:
+        """Перестроить рейтинг по хранилищу, если команды сохраняют и другие процессы"""
+        self.leaderboard.load(self._leaderboard_rows)
+
+    def _index_team(self, user_id: str, team: Team) -> None:
+        """Обновить рейтинг после сохранения команды"""
+        self.leaderboard.update(user_id, team.name, team.points)
+
+    def _ensure_leaderboard(self) -> Leaderboard:
+        if not self.leaderboard.loaded:
+            with self._leaderboard_lock:
+                if not self.leaderboard.loaded:
+                    self.leaderboard.load(self._leaderboard_rows)
+        return self.leaderboard
+
+    def get_top_teams(self, limit: int = 10) -> List[Tuple[str, str, int]]:
+        """Лучшие команды по очкам: (user_id, название, очки)"""
+        return self._ensure_leaderboard().top(limit)
+
+    def get_team_rank(self, user_id: str) -> Optional[int]:
+        """Место команды пользователя в рейтинге"""
+        return self._ensure_leaderboard().rank(user_id)
+
+    def count_teams(self) -> int:
+        """Количество команд в рейтинге"""
+        return len(self._ensure_leaderboard())
+
+    def load_players_database(self) -> Dict:
+        """База данных игроков из текущего снимка игровых данных"""
+        return game_data.current.players
+
+    def close(self) -> None:
+        """Освободить ресурсы хранилища"""
@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+from models.team import Team
+from .base import BaseStorage, ConflictError
+
+logger = logging.getLogger(__name__)
+
+class CachedStorage(BaseStorage):
+    """Write-back LRU-кэш готовых объектов Team поверх любого хранилища.
+
+    get_team отдает один и тот же объект, пока он в кэше, а save_team только
+    помечает команду грязной. Грязные команды пачкой сбрасываются в хранилище
+    по таймеру, при вытеснении из кэша и при закрытии.
+
+    Изменения через update_team запоминаются до записи. Если команду успел
+    записать другой процесс, они повторяются на свежей копии из хранилища.
+    Изменение через save_team повторить нельзя: при конфликте копия
+    сбрасывается, а запись завершается ConflictError.
+    """
+
+    def __init__(self, backend: BaseStorage, max_size: int = 10000, flush_interval: float = 5.0):
+        super().__init__()
+        self.backend = backend
+        self.leaderboard = backend.leaderboard
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.RLock()
+        self._teams: "OrderedDict[str, Team]" = OrderedDict()
+        self._dirty: Set[str] = set()
+        # Команды, которые прямо сейчас записываются: их нельзя перечитывать с диска
+        self._pending: Dict[str, Team] = {}
+        # Еще не записанные изменения грязных команд: (mutate, retries);
+        # None - изменение через save_team, которое нельзя повторить
+        self._changes: Dict[str, List[Optional[Tuple[Callable[[Team], Any], int]]]] = {}
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    def get_team(self, user_id: str) -> Optional[Team]:
+        """Получить команду пользователя"""
+        with self._lock:
+            team = self._teams.get(user_id)
+            if team is not None:
+                self._teams.move_to_end(user_id)
+                self.hits += 1
+                return team
+            self.misses += 1
+            team = self._pending.get(user_id)
+
+        if team is None:
+            team = self.backend.get_team(user_id)
+        if team is None:
+            return None
+
+        with self._lock:
+            # Пока читали с диска, команду мог положить другой поток
+            cached = self._teams.get(user_id)
+            if cached is not None:
+                return cached
+            self._teams[user_id] = team
+            evicted = self._evict()
+        self._write(evicted)
+        return team
+
+    def save_team(self, user_id: str, team: Team) -> None:
+        """Пометить команду для отложенной записи"""
+        self._write(self._put(user_id, team))
+
+    def _put(self, user_id: str, team: Team,
+             change: Optional[Tuple[Callable[[Team], Any], int]] = None) -> List[Tuple[str, Team, list]]:
+        """Положить грязную команду в кэш, вернуть вытесненные для записи"""
+        with self._lock:
+            self._teams[user_id] = team
+            self._teams.move_to_end(user_id)
+            self._dirty.add(user_id)
+            self._changes.setdefault(user_id, []).append(change)
+            evicted = self._evict()
+        self._index_team(user_id, team)
+        self._start_flusher()
+        return evicted
+
+    async def aget_team(self, user_id: str) -> Optional[Team]:
+        """Попадание в кэш отдается сразу, промах читается в пуле потоков"""
+        with self._lock:
+            team = self._teams.get(user_id)
+            if team is not None:
+                self._teams.move_to_end(user_id)
+                self.hits += 1
+                return team
+        return await asyncio.to_thread(self.get_team, user_id)
+
+    async def asave_team(self, user_id: str, team: Team) -> None:
+        """Сохранение - запись в память; на диск уходят только вытесненные команды"""
+        evicted = self._put(user_id, team)
+        if evicted:
+            await asyncio.to_thread(self._write, evicted)
+
+    def update_team(self, user_id: str, mutate: Callable[[Team], Any], retries: int = 3) -> Any:
+        """Изменить кэшированную команду.
+
+        Обновления одного пользователя в процессе уже идут по очереди, а
+        конфликт с другим процессом обнаруживается при записи: тогда mutate
+        повторяется на свежей копии из хранилища до retries раз.
+        """
+        team = self.get_team(user_id)
+        if team is None:
+            return None
+        result = mutate(team)
+        self._write(self._put(user_id, team, (mutate, retries)))
+        return result
+
+    async def aupdate_team(self, user_id: str, mutate: Callable[[Team], Any], retries: int = 3) -> Any:
+        """Асинхронный update_team"""
+        team = await self.aget_team(user_id)
+        if team is None:
+            return None
+        result = mutate(team)
+        evicted = self._put(user_id, team, (mutate, retries))
+        if evicted:
+            await asyncio.to_thread(self._write, evicted)
+        return result
+
+    def get_limit(self, user_id: str, action: str) -> List[float]:
+        """Буфер лимита из хранилища"""
+        return self.backend.get_limit(user_id, action)
+
+    def update_limit(self, user_id: str, action: str, mutate: Callable[[List[float]], Any]) -> Any:
+        """Лимиты не кэшируются: их общая копия в хранилище видна всем процессам"""
+        return self.backend.update_limit(user_id, action, mutate)
+
+    def invalidate(self, user_id: str) -> None:
+        """Забыть кэшированную команду, следующее чтение пойдет в хранилище"""
+        with self._lock:
+            self._teams.pop(user_id, None)
+            self._dirty.discard(user_id)
+            self._changes.pop(user_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики кэша для метрик"""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._teams), "dirty": len(self._dirty)}
+
+    def iter_teams(self, fields: Optional[Sequence[str]] = None, chunk_size: int = 1000) -> Iterator[Tuple[str, Any]]:
+        """Обойти команды хранилища, предварительно сбросив грязные"""
+        self.flush()
+        return self.backend.iter_teams(fields, chunk_size)
+
+    def _leaderboard_rows(self) -> Iterable[Tuple[str, str, int]]:
+        # Индекс строится по хранилищу, поэтому сначала сбрасываем грязные команды
+        self.flush()
+        return self.backend._leaderboard_rows()
+
+    def _evict(self) -> List[Tuple[str, Team, list]]:
+        """Вытеснить старые команды; грязные вернуть для записи"""
+        evicted = []
+        while len(self._teams) > self.max_size:
+            user_id, team = self._teams.popitem(last=False)
+            if user_id in self._dirty:
+                self._dirty.discard(user_id)
+                self._pending[user_id] = team
+                evicted.append((user_id, team, self._changes.pop(user_id, [])))
+        return evicted
+
+    def _write(self, batch: List[Tuple[str, Team, list]]) -> None:
+        """Записать пачку команд, уже учтенных в _pending.
+
+        Команды, записанные другим процессом, пересобираются из свежей копии
+        и запомненных изменений; если это невозможно, после записи остальных
+        бросается ConflictError с их id.
+        """
+        if not batch:
+            return
+        try:
+            try:
+                self.backend.save_teams([(user_id, team) for user_id, team, _ in batch])
+            except ConflictError as e:
+                conflicts = set(e.user_ids)
+                lost = [user_id for user_id, team, changes in batch
+                        if user_id in conflicts and not self._rebase(user_id, team, changes)]
+                if lost:
+                    logger.error("Lost changes of teams after version conflict: %s", lost)
+                    raise ConflictError(lost)
+        finally:
+            with self._lock:
+                for user_id, team, _ in batch:
+                    if self._pending.get(user_id) is team:
+                        del self._pending[user_id]
+
+    def _rebase(self, user_id: str, stale: Team, changes: list) -> bool:
+        """Повторить изменения на свежей копии команды и записать ее; False, если не удалось"""
+        if not changes or None in changes:
+            self._forget(user_id, stale)
+            return False
+        retries = max(r for _, r in changes)
+        for attempt in range(retries + 1):
+            team = self.backend.get_team(user_id)
+            if team is None:
+                break
+            for mutate, _ in changes:
+                mutate(team)
+            try:
+                self.backend.save_team(user_id, team)
+            except ConflictError:
+                continue
+            with self._lock:
+                # Если копию с тех пор не меняли, заменяем ее записанной
+                if self._teams.get(user_id) is stale and user_id not in self._dirty:
+                    self._teams[user_id] = team
+            logger.info("Reapplied %d changes to team %s after version conflict", len(changes), user_id)
+            return True
+        self._forget(user_id, stale)
+        return False
+
+    def _forget(self, user_id: str, stale: Team) -> None:
+        """Сбросить устаревшую копию, если ее не заменили"""
+        with self._lock:
+            if self._teams.get(user_id) is stale:
+                self.invalidate(user_id)
+
+    def flush(self) -> None:
+        """Записать все грязные команды в хранилище"""
+        with self._lock:
+            if not self._dirty:
+                return
+            batch = [(user_id, self._teams[user_id], self._changes.pop(user_id, [])) for user_id in self._dirty]
+            self._pending.update((user_id, team) for user_id, team, _ in batch)
+            self._dirty.clear()
+        try:
+            self._write(batch)
+        except Exception as e:
+            # После ConflictError записанные команды уже в хранилище, а потерянные
+            # сброшены; при других ошибках пачка снова становится грязной
+            if not isinstance(e, ConflictError):
+                with self._lock:
+                    for user_id, team, changes in batch:
+                        self._teams.setdefault(user_id, team)
+                        self._dirty.add(user_id)
+                        self._changes[user_id] = changes + self._changes.get(user_id, [])
+            raise
+        logger.debug("Flushed %d teams", len(batch))
+
+    def _start_flusher(self) -> None:
+        if self._flusher is not None or self.flush_interval <= 0:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="storage-flusher", daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Error flushing teams: %s", e, exc_info=True)
+
+    def close(self) -> None:
+        """Остановить фоновую запись, сбросить кэш и закрыть хранилище"""
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+        self.backend.close()
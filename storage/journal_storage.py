@@ -0,0 +1,435 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from models.team import Team
+from .base import BaseStorage, ConflictError, check_fields
+
+try:
+    import fcntl
+except ImportError:  # Windows: межпроцессные блокировки файлов недоступны
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_NAME = "snapshot.jsonl"
+SEGMENT_PREFIX = "journal-"
+SEGMENT_SUFFIX = ".log"
+
+# Поля, которые пишутся отдельными событиями; остальные - событием set
+EVENT_FIELDS = ("money", "points", "squad", "active_players", "last_match_time", "version")
+
+def team_events(old: Optional[Dict], new: Dict) -> List[List]:
+    """События журнала, переводящие документ команды old в new.
+
+    Результат матча пишется одним событием match (время, очки, деньги),
+    остальные изменения денег и очков - приращениями, покупка игрока -
+    событием add, смена основы - lineup.
+    """
+    if old is None:
+        return [["create", new]]
+    events = []
+    money = new["money"] - old["money"]
+    points = new["points"] - old["points"]
+    if new["last_match_time"] != old["last_match_time"] and new["last_match_time"] is not None:
+        events.append(["match", new["last_match_time"], points, money])
+        money = points = 0
+    if money:
+        events.append(["money", money])
+    if points:
+        events.append(["points", points])
+
+    old_squad, new_squad = old["squad"], new["squad"]
+    if new_squad != old_squad:
+        if new_squad[:len(old_squad)] == old_squad:
+            events.extend(["add", player_id] for player_id in new_squad[len(old_squad):])
+        else:
+            events.append(["squad", new_squad])
+    if new["active_players"] != old["active_players"]:
+        events.append(["lineup", new["active_players"]])
+    if new["last_match_time"] is None and old["last_match_time"] is not None:
+        events.append(["set", "last_match_time", None])
+    for field, value in new.items():
+        if field not in EVENT_FIELDS and value != old.get(field):
+            events.append(["set", field, value])
+    return events
+
+def apply_events(doc: Optional[Dict], events: Iterable[List]) -> Dict:
+    """Новый документ команды после событий; doc не изменяется"""
+    doc = dict(doc) if doc is not None else None
+    for event in events:
+        kind = event[0]
+        if kind == "create":
+            doc = dict(event[1])
+        elif kind == "match":
+            doc["last_match_time"] = event[1]
+            doc["points"] += event[2]
+            doc["money"] += event[3]
+        elif kind in ("money", "points"):
+            doc[kind] += event[1]
+        elif kind == "add":
+            doc["squad"] = doc["squad"] + [event[1]]
+        elif kind == "squad":
+            doc["squad"] = list(event[1])
+        elif kind == "lineup":
+            doc["active_players"] = list(event[1])
+        elif kind == "set":
+            doc[event[1]] = event[2]
+        else:
+            raise ValueError(f"Unknown journal event: {kind}")
+    return doc
+
+def _dumps(record: Dict) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+class JournalStorage(BaseStorage):
+    """Хранилище-журнал: изменения команд дописываются в конец файла.
+
+    Команды живут в памяти, а каждое сохранение добавляет в журнал строку
+    JSON с событиями (приращения денег и очков, купленный игрок, новая
+    основа, сыгранный матч) вместо перезаписи всего документа. Записи
+    одновременных сохранений сбрасываются на диск фоновым потоком одним
+    write и fsync (group commit); save_team возвращается после fsync.
+    Чтения видят запись только после ее fsync: до этого новая версия
+    команды хранится отдельно и нужна лишь для проверки версий и событий
+    следующих сохранений.
+
+    Когда текущий сегмент журнала вырастает больше compact_bytes, начинается
+    новый сегмент, а состояние на момент переключения пишется в снимок;
+    после этого старые сегменты удаляются. При запуске команды
+    восстанавливаются из снимка и следующих за ним записей, а строка,
+    оборванная сбоем посреди записи, отбрасывается.
+
+    Журнал открывает один процесс: каталог блокируется через flock.
+    """
+
+    def __init__(self, journal_dir: str = "journal", compact_bytes: int = 64 * 1024 * 1024):
+        super().__init__()
+        self.journal_dir = journal_dir
+        self.compact_bytes = compact_bytes
+        os.makedirs(journal_dir, exist_ok=True)
+        self._dir_lock = self._lock_dir()
+
+        self._teams: Dict[str, Dict] = {}
+        self._limits: Dict[Tuple[str, str], List[float]] = {}
+        self._seq = 0
+        self._recover()
+
+        # Общая блокировка состояния, очереди записей и номера сброшенной записи
+        self._commit = threading.Condition(threading.Lock())
+        self._pending: List[str] = []
+        # Записи, еще не сброшенные на диск, и состояние после них
+        self._unapplied: List[Dict] = []
+        self._staged: Dict[str, Dict] = {}
+        self._staged_limits: Dict[Tuple[str, str], List[float]] = {}
+        self._writing = False
+        self._durable_seq = self._seq
+        self._error: Optional[BaseException] = None
+        self._closing = False
+        self._segment = open(self._segment_path(self._seq + 1), "ab")
+        self._segment_size = self._segment.tell()
+        self._compactor: Optional[threading.Thread] = None
+        self._writer = threading.Thread(target=self._write_loop, name="journal-writer", daemon=True)
+        self._writer.start()
+
+    def _lock_dir(self):
+        lock_file = open(os.path.join(self.journal_dir, "LOCK"), "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                raise RuntimeError(f"Journal {self.journal_dir} is already open in another process")
+        return lock_file
+
+    def _segment_path(self, first_seq: int) -> str:
+        return os.path.join(self.journal_dir, f"{SEGMENT_PREFIX}{first_seq:012d}{SEGMENT_SUFFIX}")
+
+    def _segments(self) -> List[Tuple[int, str]]:
+        """Сегменты журнала (номер первой записи, путь) по порядку"""
+        segments = []
+        for name in os.listdir(self.journal_dir):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                first_seq = int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+                segments.append((first_seq, os.path.join(self.journal_dir, name)))
+        return sorted(segments)
+
+    # Восстановление
+
+    def _apply(self, record: Dict) -> None:
+        user_id = record["u"]
+        if "l" in record:
+            key = (user_id, record["l"])
+            if record["slots"]:
+                self._limits[key] = record["slots"]
+            else:
+                self._limits.pop(key, None)
+        else:
+            doc = apply_events(self._teams.get(user_id), record["e"])
+            doc["version"] = record["v"]
+            self._teams[user_id] = doc
+
+    def _read_segment(self, path: str, last: bool) -> Iterator[Dict]:
+        with open(path, "rb") as f:
+            offset = 0
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("unterminated record")
+                    record = json.loads(line)
+                except ValueError:
+                    if not last:
+                        raise
+                    # Сбой посреди записи: хвост не был подтвержден ни одному сохранению
+                    logger.warning("Dropping torn record at %s:%d", path, offset)
+                    os.truncate(path, offset)
+                    return
+                offset += len(line)
+                yield record
+
+    def _recover(self) -> None:
+        snapshot_path = os.path.join(self.journal_dir, SNAPSHOT_NAME)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, "r", encoding="utf-8") as f:
+                self._seq = json.loads(f.readline())["seq"]
+                for line in f:
+                    entry = json.loads(line)
+                    if "d" in entry:
+                        self._teams[entry["u"]] = entry["d"]
+                    else:
+                        self._limits[(entry["u"], entry["l"])] = entry["slots"]
+
+        segments = self._segments()
+        replayed = 0
+        for index, (_, path) in enumerate(segments):
+            for record in self._read_segment(path, last=index == len(segments) - 1):
+                if record["s"] <= self._seq:
+                    continue  # уже есть в снимке
+                self._apply(record)
+                self._seq = record["s"]
+                replayed += 1
+        logger.info("Journal %s recovered: %d teams, %d records replayed", self.journal_dir, len(self._teams), replayed)
+
+    # Запись
+
+    def _latest_team(self, user_id: str) -> Optional[Dict]:
+        """Команда с учетом еще не сброшенных записей (под _commit)"""
+        doc = self._staged.get(user_id)
+        return doc if doc is not None else self._teams.get(user_id)
+
+    def _latest_slots(self, key: Tuple[str, str]) -> List[float]:
+        slots = self._staged_limits.get(key)
+        return slots if slots is not None else self._limits.get(key, [])
+
+    def _append(self, records: List[Dict]) -> int:
+        """Поставить записи в очередь (под _commit) и вернуть номер последней"""
+        now = round(time.time(), 3)
+        for record in records:
+            self._seq += 1
+            record["s"] = self._seq
+            record["t"] = now
+            self._unapplied.append(record)
+            self._pending.append(_dumps(record))
+        self._commit.notify_all()
+        return self._seq
+
+    def _wait_durable(self, seq: int) -> None:
+        """Дождаться fsync записи seq (под _commit)"""
+        while self._durable_seq < seq:
+            if self._error is not None:
+                raise RuntimeError("Journal write failed") from self._error
+            self._commit.wait()
+
+    def _write_loop(self) -> None:
+        while True:
+            with self._commit:
+                while not self._pending and not self._closing:
+                    self._commit.wait()
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, []
+                last_seq = self._seq
+                segment = self._segment
+                self._writing = True
+
+            data = "".join(batch).encode("utf-8")
+            try:
+                segment.write(data)
+                segment.flush()
+                os.fsync(segment.fileno())
+            except BaseException as e:
+                logger.exception("Journal write failed")
+                with self._commit:
+                    self._error = e
+                    self._writing = False
+                    self._commit.notify_all()
+                return
+
+            with self._commit:
+                self._publish(last_seq)
+                self._writing = False
+                self._durable_seq = last_seq
+                self._segment_size += len(data)
+                self._commit.notify_all()
+                if self._segment_size >= self.compact_bytes and not self._compacting():
+                    self._start_compaction()
+
+    def _publish(self, seq: int) -> None:
+        """Применить к состоянию записи, сброшенные на диск до seq (под _commit)"""
+        count = 0
+        for record in self._unapplied:
+            if record["s"] > seq:
+                break
+            count += 1
+            self._apply(record)
+            user_id = record["u"]
+            if "l" in record:
+                key = (user_id, record["l"])
+                if self._staged_limits.get(key) is record["slots"]:
+                    del self._staged_limits[key]
+            else:
+                staged = self._staged.get(user_id)
+                if staged is not None and staged["version"] == record["v"]:
+                    del self._staged[user_id]
+        del self._unapplied[:count]
+
+    # Сжатие
+
+    def _compacting(self) -> bool:
+        return self._compactor is not None and self._compactor.is_alive()
+
+    def _start_compaction(self) -> None:
+        """Начать новый сегмент и записать снимок в фоне (под _commit, пока нет записи на диск)"""
+        # Документы не меняются на месте, поэтому поверхностной копии достаточно
+        teams, limits, seq = dict(self._teams), dict(self._limits), self._durable_seq
+        # Записи до seq сброшены в старые сегменты и есть в снимке, а очередь
+        # уйдет в новый сегмент
+        self._segment.close()
+        self._segment = open(self._segment_path(seq + 1), "ab")
+        self._segment_size = 0
+        self._compactor = threading.Thread(
+            target=self._write_snapshot, args=(teams, limits, seq), name="journal-compactor", daemon=True
+        )
+        self._compactor.start()
+
+    def _write_snapshot(self, teams: Dict[str, Dict], limits: Dict[Tuple[str, str], List[float]], seq: int) -> None:
+        started = time.monotonic()
+        path = os.path.join(self.journal_dir, SNAPSHOT_NAME)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(_dumps({"seq": seq}))
+                for user_id, doc in teams.items():
+                    f.write(_dumps({"u": user_id, "d": doc}))
+                for (user_id, action), slots in limits.items():
+                    f.write(_dumps({"u": user_id, "l": action, "slots": slots}))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+            self._fsync_dir()
+            for first_seq, segment_path in self._segments():
+                if first_seq <= seq:
+                    os.remove(segment_path)
+        except OSError:
+            # Старые сегменты остаются, восстановление пройдет по ним
+            logger.exception("Journal snapshot failed")
+            return
+        logger.info("Journal snapshot at record %d written in %.2f s", seq, time.monotonic() - started)
+
+    def _fsync_dir(self) -> None:
+        if os.name != "posix":
+            return
+        fd = os.open(self.journal_dir, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def compact(self) -> None:
+        """Сразу начать новый сегмент и записать снимок"""
+        with self._commit:
+            # Пачка, которую сейчас пишет поток, должна попасть в старый сегмент
+            while self._writing:
+                self._commit.wait()
+            if not self._compacting():
+                self._start_compaction()
+            compactor = self._compactor
+        compactor.join()
+
+    # Контракт хранилища
+
+    def get_team(self, user_id: str) -> Optional[Team]:
+        """Получить команду пользователя"""
+        doc = self._teams.get(user_id)
+        return Team.from_dict(doc) if doc is not None else None
+
+    def save_team(self, user_id: str, team: Team) -> None:
+        """Сохранить команду пользователя"""
+        self.save_teams([(user_id, team)])
+
+    def save_teams(self, teams: Iterable[Tuple[str, Team]]) -> None:
+        """Сохранить команды одной пачкой записей журнала и одним fsync"""
+        records, saved, conflicts = [], [], []
+        with self._commit:
+            if self._closing:
+                raise RuntimeError("Journal is closed")
+            for user_id, team in teams:
+                old = self._latest_team(user_id)
+                if (old["version"] if old is not None else 0) != team.version:
+                    conflicts.append(user_id)
+                    continue
+                new = team.to_dict()
+                new["version"] = team.version + 1
+                records.append({"u": user_id, "v": new["version"], "e": team_events(old, new)})
+                self._staged[user_id] = new
+                saved.append((user_id, team))
+            if records:
+                self._wait_durable(self._append(records))
+
+        for user_id, team in saved:
+            team.version += 1
+            self._index_team(user_id, team)
+        if conflicts:
+            raise ConflictError(conflicts)
+
+    def get_limit(self, user_id: str, action: str) -> List[float]:
+        """Буфер лимита из памяти (только сброшенные на диск записи)"""
+        return list(self._limits.get((user_id, action), ()))
+
+    def update_limit(self, user_id: str, action: str, mutate: Callable[[List[float]], Any]) -> Any:
+        """Изменить буфер лимита; изменение пишется в журнал"""
+        with self._commit:
+            if self._closing:
+                raise RuntimeError("Journal is closed")
+            key = (user_id, action)
+            slots = list(self._latest_slots(key))
+            before = list(slots)
+            result = mutate(slots)
+            if slots != before:
+                self._staged_limits[key] = slots
+                self._wait_durable(self._append([{"u": user_id, "l": action, "slots": slots}]))
+        return result
+
+    def iter_teams(self, fields: Optional[Sequence[str]] = None, chunk_size: int = 1000) -> Iterator[Tuple[str, Any]]:
+        """Обойти команды из памяти (chunk_size не используется)"""
+        if fields is not None:
+            check_fields(fields)
+        for user_id in list(self._teams):
+            doc = self._teams.get(user_id)
+            if doc is not None:
+                yield user_id, (Team.from_dict(doc) if fields is None else {field: doc[field] for field in fields})
+
+    def close(self) -> None:
+        """Дописать очередь, дождаться снимка и закрыть журнал"""
+        with self._commit:
+            if self._closing:
+                return
+            self._closing = True
+            self._commit.notify_all()
+        self._writer.join()
+        if self._compactor is not None:
+            self._compactor.join()
+        self._segment.close()
+        self._dir_lock.close()
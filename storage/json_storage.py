@@ -0,0 +1,246 @@
+import json
+import logging
+import os
+import threading
+import zlib
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+from models.team import Team
+from models.team_codec import encode_team, load_team, project_team
+from .base import BaseStorage, ConflictError, check_fields
+
+try:
+    import fcntl
+except ImportError:  # Windows: межпроцессные блокировки файлов недоступны
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Форматы файлов команд: название -> расширение
+TEAM_FORMATS = {"json": ".json", "binary": ".team"}
+# Двоичный формат включается явно: версии бота до него не читают .team
+DEFAULT_TEAM_FORMAT = "json"
+
+class JsonStorage(BaseStorage):
+    """Хранилище: один файл на пользователя в каталоге teams/.
+
+    Файлы разложены по шардам teams/ab/cd/<id>.team, где ab/cd - 16 бит
+    crc32 от id пользователя, чтобы в одном каталоге не лежали миллионы
+    файлов. Файлы из плоского каталога teams/<id>.* (до шардирования) не
+    читаются: их переносит в шарды отдельный шаг move_to_shards
+    (python -m scripts.shard_teams), а конструктор только предупреждает о них.
+
+    Команды пишутся в формате team_format: JSON (<id>.json) или двоичный
+    формат models.team_codec (<id>.team). Файл в другом формате тоже
+    читается и удаляется после записи команды в текущем, поэтому смена
+    формата переводит команды постепенно, по мере их сохранения.
+
+    С file_locks=True запись идет под flock и сверяет версию команды в файле,
+    чтобы несколько процессов не затирали изменения друг друга. Лимиты
+    действий лежат отдельно, в таких же шардах каталога teams/_limits/.
+    """
+
+    def __init__(self, teams_dir: str = "teams", file_locks: bool = False, team_format: str = DEFAULT_TEAM_FORMAT):
+        super().__init__()
+        if file_locks and fcntl is None:
+            raise RuntimeError("File locks require fcntl, which is not available on this platform")
+        if team_format not in TEAM_FORMATS:
+            raise ValueError(f"Unknown team format: {team_format}")
+        self.team_format = team_format
+        # Сначала ищем файл в текущем формате, затем в другом
+        extension = TEAM_FORMATS[team_format]
+        self._extensions = (extension,) + tuple(ext for ext in TEAM_FORMATS.values() if ext != extension)
+        self.teams_dir = teams_dir
+        self.limits_dir = os.path.join(teams_dir, "_limits")
+        self.file_locks = file_locks
+        self._limits_lock = threading.Lock()
+        # Каталоги шардов, уже созданные этим процессом
+        self._shard_dirs: Set[str] = set()
+        if self._has_flat_files():
+            logger.warning("%s has files in the flat layout, they are not visible until "
+                           "moved into shards: python -m scripts.shard_teams --teams-dir %s",
+                           teams_dir, teams_dir)
+
+    @staticmethod
+    def _shard_path(root: str, user_id: str, extension: str) -> str:
+        shard = zlib.crc32(user_id.encode("utf-8")) & 0xFFFF
+        return os.path.join(root, f"{shard >> 8:02x}", f"{shard & 0xFF:02x}", f"{user_id}{extension}")
+
+    def _team_path(self, user_id: str, extension: str) -> str:
+        return self._shard_path(self.teams_dir, user_id, extension)
+
+    def _ensure_dir(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory not in self._shard_dirs:
+            os.makedirs(directory, exist_ok=True)
+            self._shard_dirs.add(directory)
+
+    def _flat_roots(self) -> Tuple[Tuple[str, Sequence[str]], ...]:
+        """Каталоги плоской раскладки и расширения их файлов"""
+        return (self.teams_dir, self._extensions), (self.limits_dir, (".json",))
+
+    def _has_flat_files(self) -> bool:
+        # В шардированном каталоге лежат только подкаталоги, поэтому проверка
+        # быстрая, а в плоском останавливается на первом файле
+        return any(next(_flat_files(root, extensions), None) is not None
+                   for root, extensions in self._flat_roots())
+
+    def move_to_shards(self) -> int:
+        """Перенести файлы команд и лимитов из плоской раскладки в шарды; вернуть их число"""
+        moved = 0
+        for root, extensions in self._flat_roots():
+            for entry in _flat_files(root, extensions):
+                user_id, extension = os.path.splitext(entry.name)
+                path = self._shard_path(root, user_id, extension)
+                self._ensure_dir(path)
+                try:
+                    if os.path.exists(path):
+                        # В шарде уже лежит более новая копия
+                        os.remove(entry.path)
+                    else:
+                        os.replace(entry.path, path)
+                except FileNotFoundError:
+                    continue  # файл перенес другой процесс
+                moved += 1
+        return moved
+
+    def get_team(self, user_id: str) -> Optional[Team]:
+        """Получить команду пользователя"""
+        for extension in self._extensions:
+            try:
+                with open(self._team_path(user_id, extension), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            return load_team(data)
+        return None
+
+    @contextmanager
+    def _file_lock(self, path: str) -> Iterator[None]:
+        with open(f"{path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write_file(self, user_id: str, team: Team) -> None:
+        # Пишем во временный файл и атомарно подменяем, чтобы сбой
+        # посреди записи не оставил обрезанный документ
+        path = self._team_path(user_id, self._extensions[0])
+        self._ensure_dir(path)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        expected = team.version
+        team.version = expected + 1
+        try:
+            if self.team_format == "binary":
+                data = encode_team(team)
+            else:
+                data = json.dumps(team.to_dict(), ensure_ascii=False, indent=2).encode("utf-8")
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        finally:
+            # Версия увеличивается только после успешной записи
+            team.version = expected
+        os.replace(tmp_path, path)
+        team.version = expected + 1
+        # Копия в другом формате устарела
+        for extension in self._extensions[1:]:
+            try:
+                os.remove(self._team_path(user_id, extension))
+            except FileNotFoundError:
+                pass
+
+    def save_team(self, user_id: str, team: Team) -> None:
+        """Сохранить команду пользователя"""
+        if self.file_locks:
+            # Файл блокировки общий для обоих форматов; шарда новой команды еще может не быть
+            lock_path = self._team_path(user_id, ".json")
+            self._ensure_dir(lock_path)
+            with self._file_lock(lock_path):
+                stored = self.get_team(user_id)
+                if stored is not None and stored.version != team.version:
+                    raise ConflictError([user_id])
+                self._write_file(user_id, team)
+        else:
+            self._write_file(user_id, team)
+        self._index_team(user_id, team)
+
+    def get_limit(self, user_id: str, action: str) -> List[float]:
+        """Прочитать буфер лимита без flock: файл подменяется атомарно"""
+        try:
+            with open(self._shard_path(self.limits_dir, user_id, ".json"), "r", encoding="utf-8") as f:
+                return json.load(f).get(action, [])
+        except FileNotFoundError:
+            return []
+
+    def update_limit(self, user_id: str, action: str, mutate: Callable[[List[float]], Any]) -> Any:
+        """Изменить буфер лимита под блокировкой (и под flock при file_locks)"""
+        path = self._shard_path(self.limits_dir, user_id, ".json")
+        self._ensure_dir(path)
+        with self._limits_lock, (self._file_lock(path) if self.file_locks else nullcontext()):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    limits = json.load(f)
+            except FileNotFoundError:
+                limits = {}
+            slots = limits.get(action, [])
+            before = list(slots)
+            result = mutate(slots)
+            if slots != before:
+                if slots:
+                    limits[action] = slots
+                else:
+                    limits.pop(action, None)
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(limits, f)
+                os.replace(tmp_path, path)
+        return result
+
+    def _shard_files(self) -> Iterator[Tuple[str, str]]:
+        """(user_id, путь) файлов команд по шардам; из двух форматов берется текущий"""
+        for first in _subdirs(self.teams_dir):
+            for leaf in _subdirs(first):
+                # Оба файла одного пользователя лежат в одном шарде
+                found = {}
+                with os.scandir(leaf) as entries:
+                    for entry in entries:
+                        user_id, extension = os.path.splitext(entry.name)
+                        if extension == self._extensions[0] or (
+                                extension in self._extensions and user_id not in found):
+                            found[user_id] = entry.path
+                yield from found.items()
+
+    def iter_teams(self, fields: Optional[Sequence[str]] = None, chunk_size: int = 1000) -> Iterator[Tuple[str, Any]]:
+        """Обойти команды по шардам через os.scandir (chunk_size не используется: файл читается целиком)"""
+        if fields is not None:
+            check_fields(fields)
+        for user_id, path in self._shard_files():
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                continue  # файл заменили копией в другом формате
+            yield user_id, (load_team(data) if fields is None else project_team(data, fields))
+
+def _flat_files(root: str, extensions: Sequence[str]) -> Iterator[os.DirEntry]:
+    """Файлы с расширениями extensions прямо в каталоге root (плоская раскладка)"""
+    try:
+        with os.scandir(root) as entries:
+            for entry in entries:
+                if os.path.splitext(entry.name)[1] in extensions and entry.is_file():
+                    yield entry
+    except FileNotFoundError:
+        return
+
+def _subdirs(path: str) -> Iterable[str]:
+    """Каталоги шардов внутри path; прочие каталоги (например, _limits) пропускаются"""
+    try:
+        with os.scandir(path) as entries:
+            names = [entry.name for entry in entries if len(entry.name) == 2 and entry.is_dir()]
+    except FileNotFoundError:
+        return []
+    return [os.path.join(path, name) for name in sorted(names)]
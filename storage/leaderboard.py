@@ -0,0 +1,80 @@
+import bisect
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+class Leaderboard:
+    """Отсортированный по очкам индекс команд для таблицы лидеров"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._entries: Dict[str, Tuple[int, str]] = {}  # user_id -> (очки, название)
+        self._order: List[Tuple[int, str]] = []  # (-очки, user_id) по возрастанию
+        # Обновления, пришедшие во время перестроения: user_id -> (название, очки)
+        self._recent: Optional[Dict[str, Tuple[str, int]]] = None
+        self.loaded = False
+
+    def load(self, read_rows: Callable[[], Iterable[Tuple[str, str, int]]]) -> None:
+        """Построить индекс по строкам (user_id, название, очки) из read_rows()
+
+        Индекс строится без блокировки, и рейтинг продолжает отвечать.
+        Сохранения, прошедшие во время чтения строк, могли в них не попасть,
+        поэтому update() их запоминает, а в конце они применяются к новому
+        индексу под блокировкой.
+        """
+        with self._load_lock:
+            with self._lock:
+                self._recent = {}
+            try:
+                entries = {user_id: (points, name) for user_id, name, points in read_rows()}
+                order = sorted((-points, user_id) for user_id, (points, _) in entries.items())
+            except BaseException:
+                with self._lock:
+                    self._recent = None
+                raise
+            with self._lock:
+                for user_id, (name, points) in self._recent.items():
+                    self._apply(entries, order, user_id, name, points)
+                self._recent = None
+                self._entries = entries
+                self._order = order
+                self.loaded = True
+
+    @staticmethod
+    def _apply(entries: Dict[str, Tuple[int, str]], order: List[Tuple[int, str]],
+               user_id: str, name: str, points: int) -> None:
+        old = entries.get(user_id)
+        if old is not None:
+            if old[0] != points:
+                del order[bisect.bisect_left(order, (-old[0], user_id))]
+                bisect.insort(order, (-points, user_id))
+        else:
+            bisect.insort(order, (-points, user_id))
+        entries[user_id] = (points, name)
+
+    def update(self, user_id: str, name: str, points: int) -> None:
+        """Обновить позицию команды после сохранения"""
+        with self._lock:
+            if self._recent is not None:
+                self._recent[user_id] = (name, points)
+            if self.loaded:
+                self._apply(self._entries, self._order, user_id, name, points)
+
+    def top(self, limit: int) -> List[Tuple[str, str, int]]:
+        """Первые limit команд: (user_id, название, очки)"""
+        with self._lock:
+            return [
+                (user_id, self._entries[user_id][1], -neg_points)
+                for neg_points, user_id in self._order[:limit]
+            ]
+
+    def rank(self, user_id: str) -> Optional[int]:
+        """Место команды (команды с равными очками делят место)"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            return bisect.bisect_left(self._order, (-entry[0], "")) + 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,45 @@
+import asyncio
+import time
+from typing import Dict, Optional
+from models.limits import ACTION_LIMITS, ActionLimit, LimitCheck, check_slots, take_slot
+from .base import BaseStorage
+
+class ActionLimiter:
+    """Лимиты частоты действий пользователей (покупки, матчи, поддержка клуба).
+
+    На каждую пару (пользователь, действие) хранится кольцевой буфер из
+    последних limit.count времен действия, поэтому проверка занимает O(1),
+    а команды не хранят растущие списки времен. Буферы лежат в хранилище и
+    меняются атомарно через update_limit, так что несколько процессов с
+    общим хранилищем видят одни и те же лимиты. Проверка без занятия слота
+    только читает буфер (get_limit) и не берет блокировку записи.
+    """
+
+    def __init__(self, storage: BaseStorage, limits: Dict[str, ActionLimit] = ACTION_LIMITS):
+        self.storage = storage
+        self.limits = limits
+
+    def check(self, user_id: str, action: str, now: Optional[float] = None) -> LimitCheck:
+        """Можно ли выполнить действие сейчас (не занимая слот)"""
+        limit = self.limits[action]
+        now = time.time() if now is None else now
+        return check_slots(self.storage.get_limit(user_id, action), limit, now)
+
+    def acquire(self, user_id: str, action: str, now: Optional[float] = None) -> LimitCheck:
+        """Занять слот, если лимит позволяет; иначе вернуть время ожидания"""
+        limit = self.limits[action]
+        now = time.time() if now is None else now
+        return self.storage.update_limit(user_id, action, lambda slots: take_slot(slots, limit, now))
+
+    def reset(self, user_id: str, action: Optional[str] = None) -> None:
+        """Сбросить лимит действия (или всех действий) пользователя"""
+        for name in ([action] if action else self.limits):
+            self.storage.update_limit(user_id, name, list.clear)
+
+    async def acheck(self, user_id: str, action: str) -> LimitCheck:
+        """Асинхронный check"""
+        return await asyncio.to_thread(self.check, user_id, action)
+
+    async def aacquire(self, user_id: str, action: str) -> LimitCheck:
+        """Асинхронный acquire"""
+        return await asyncio.to_thread(self.acquire, user_id, action)
@@ -0,0 +1,39 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+class UserLocks:
+    """Таблица asyncio-блокировок по пользователям.
+
+    Запись о пользователе живет, только пока кто-то держит или ждет его
+    блокировку, поэтому таблица не растет вместе с числом игроков.
+    """
+
+    def __init__(self):
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._waiters: Dict[str, int] = {}
+
+    @asynccontextmanager
+    async def lock(self, user_id: str) -> AsyncIterator[None]:
+        """Выполнить блок кода эксклюзивно для пользователя"""
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        self._waiters[user_id] = self._waiters.get(user_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._waiters[user_id] -= 1
+            if not self._waiters[user_id]:
+                del self._waiters[user_id]
+                del self._locks[user_id]
+
+    def locked(self, user_id: str) -> bool:
+        """Занята ли блокировка пользователя"""
+        lock = self._locks.get(user_id)
+        return lock is not None and lock.locked()
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+# Общая таблица блокировок процесса
+user_locks = UserLocks()
@@ -0,0 +1,199 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+from models.team import Team
+from models.team_codec import encode_team, load_team, project_team
+from .base import BaseStorage, ConflictError, check_fields
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS teams (
+    user_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    points INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+# Буферы лимитов действий: JSON-список времен, старые первыми
+LIMITS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS limits (
+    user_id TEXT NOT NULL,
+    action TEXT NOT NULL,
+    slots TEXT NOT NULL,
+    PRIMARY KEY (user_id, action)
+)
+"""
+
+# Оптимистичная запись: обновляем, только если в базе лежит ожидаемая версия
+UPDATE_TEAM = """
+UPDATE teams SET name = ?, points = ?, data = ?, version = ?
+WHERE user_id = ? AND version = ?
+"""
+
+INSERT_TEAM = """
+INSERT OR IGNORE INTO teams (name, points, data, version, user_id) VALUES (?, ?, ?, ?, ?)
+"""
+
+# Поля команды, которые хранятся отдельными колонками
+TEAM_COLUMNS = ("name", "points", "version")
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище во встроенной базе SQLite (режим WAL).
+
+    Команды лежат в колонке data в двоичном формате models.team_codec;
+    строки со старым JSON читаются как раньше и переписываются в двоичном
+    формате при следующем сохранении команды.
+    """
+
+    def __init__(self, path: str = "teams.db"):
+        super().__init__()
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Одно соединение на процесс: хранилище вызывается из пула потоков,
+        # поэтому доступ к нему сериализуем через блокировку
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(SCHEMA)
+        self._conn.execute(LIMITS_SCHEMA)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(teams)")]
+        if "version" not in columns:
+            # Базы, созданные до появления версий команд
+            self._conn.execute("ALTER TABLE teams ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+    def _write_row(self, user_id: str, team: Team) -> bool:
+        """Записать команду, если версия в базе совпадает с team.version"""
+        expected = team.version
+        team.version = expected + 1
+        try:
+            data = encode_team(team)
+        finally:
+            # Версия увеличивается только после успешной записи
+            team.version = expected
+        params = (team.name, team.points, data, expected + 1)
+
+        if self._conn.execute(UPDATE_TEAM, params + (user_id, expected)).rowcount:
+            return True
+        if expected == 0:
+            return bool(self._conn.execute(INSERT_TEAM, params + (user_id,)).rowcount)
+        return False
+
+    def get_team(self, user_id: str) -> Optional[Team]:
+        """Получить команду пользователя"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM teams WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return load_team(row[0])
+
+    def save_team(self, user_id: str, team: Team) -> None:
+        """Сохранить команду пользователя"""
+        with self._lock:
+            written = self._write_row(user_id, team)
+        if not written:
+            raise ConflictError([user_id])
+        team.version += 1
+        self._index_team(user_id, team)
+
+    def save_teams(self, teams: Iterable[Tuple[str, Team]]) -> None:
+        """Сохранить несколько команд одной транзакцией"""
+        written, conflicts = [], []
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for user_id, team in teams:
+                    if self._write_row(user_id, team):
+                        written.append((user_id, team))
+                    else:
+                        conflicts.append(user_id)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        for user_id, team in written:
+            team.version += 1
+            self._index_team(user_id, team)
+        if conflicts:
+            raise ConflictError(conflicts)
+
+    def get_limit(self, user_id: str, action: str) -> List[float]:
+        """Прочитать буфер лимита вне транзакции записи"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT slots FROM limits WHERE user_id = ? AND action = ?", (user_id, action)
+            ).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def update_limit(self, user_id: str, action: str, mutate: Callable[[List[float]], Any]) -> Any:
+        """Изменить буфер лимита в транзакции, блокирующей запись другим процессам"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT slots FROM limits WHERE user_id = ? AND action = ?", (user_id, action)
+                ).fetchone()
+                slots = json.loads(row[0]) if row else []
+                before = list(slots)
+                result = mutate(slots)
+                if slots != before:
+                    if slots:
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO limits (user_id, action, slots) VALUES (?, ?, ?)",
+                            (user_id, action, json.dumps(slots)),
+                        )
+                    else:
+                        self._conn.execute(
+                            "DELETE FROM limits WHERE user_id = ? AND action = ?", (user_id, action)
+                        )
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return result
+
+    def iter_teams(self, fields: Optional[Sequence[str]] = None, chunk_size: int = 1000) -> Iterator[Tuple[str, Any]]:
+        """Обойти команды порциями по chunk_size строк.
+
+        Обход идет через отдельное соединение и не держит блокировку
+        хранилища; в режиме WAL он видит базу на момент начала чтения.
+        Поля из колонок (name, points, version) читаются без документа.
+        """
+        if fields is not None:
+            check_fields(fields)
+        columns = fields is not None and all(field in TEAM_COLUMNS for field in fields)
+        query = f"SELECT user_id, {', '.join(fields)} FROM teams" if columns else "SELECT user_id, data FROM teams"
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        try:
+            cursor = conn.execute(query)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    if columns:
+                        yield row[0], dict(zip(fields, row[1:]))
+                    elif fields is None:
+                        yield row[0], load_team(row[1])
+                    else:
+                        yield row[0], project_team(row[1], fields)
+        finally:
+            conn.close()
+
+    def _leaderboard_rows(self) -> Iterable[Tuple[str, str, int]]:
+        """Строки рейтинга читаются из колонок без разбора документов команд"""
+        with self._lock:
+            return self._conn.execute("SELECT user_id, name, points FROM teams").fetchall()
+
+    def close(self) -> None:
+        """Закрыть соединение с базой"""
+        with self._lock:
+            self._conn.close()
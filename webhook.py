@@ -0,0 +1,118 @@
+import asyncio
+import hmac
+import logging
+import signal
+from typing import Optional
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+class WebhookServer:
+    """HTTP-сервер для приема обновлений Telegram по вебхуку.
+
+    Запрос проверяется по секретному токену и сразу подтверждается, а
+    обновление кладется в очередь application.update_queue, которую
+    разбирает Application. Ограничивает прием handlers.update_processor.
+    UpdateQueue: она считает обновления до конца их обработки. Если лимит
+    исчерпан, сервер отвечает 503, и Telegram повторит доставку позже.
+    """
+
+    def __init__(self, application: Application, secret_token: str, path: str = "/telegram",
+                 host: str = "0.0.0.0", port: int = 8080):
+        if not secret_token:
+            raise ValueError("Webhook mode requires a secret token")
+        self.application = application
+        self.secret_token = secret_token
+        self.path = path
+        self.host = host
+        self.port = port
+        self.accepted = 0
+        self.rejected = 0
+        self._runner: Optional[web.AppRunner] = None
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        secret = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(secret.encode(), self.secret_token.encode()):
+            return web.Response(status=403)
+        try:
+            update = Update.de_json(await request.json(), self.application.bot)
+        except (ValueError, TypeError, KeyError):
+            return web.Response(status=400)
+        if update is None:
+            return web.Response(status=400)
+
+        try:
+            self.application.update_queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            logger.warning("Too many updates in flight, asking Telegram to retry update %s", update.update_id)
+            return web.Response(status=503, headers={"Retry-After": "1"})
+        self.accepted += 1
+        return web.Response()
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        queue = self.application.update_queue
+        return web.json_response({
+            "queue": queue.qsize(),
+            # Вместе с ждущими блокировки пользователя и обрабатываемыми
+            "in_flight": getattr(queue, "unfinished", queue.qsize()),
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+        })
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get("/healthz", self.handle_health)
+        return app
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info("Webhook server listening on %s:%d%s", self.host, self.port, self.path)
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+async def run_webhook(application: Application, server: WebhookServer,
+                      webhook_url: Optional[str] = None) -> None:
+    """Запустить Application с приемом обновлений через WebhookServer до SIGINT/SIGTERM.
+
+    Если задан webhook_url, вебхук регистрируется в Telegram с секретным
+    токеном сервера; иначе считается, что он уже настроен.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    async with application:
+        # post_init/post_shutdown сам вызывает только run_polling/run_webhook
+        if application.post_init:
+            await application.post_init(application)
+        if webhook_url:
+            await application.bot.set_webhook(
+                url=webhook_url + server.path,
+                secret_token=server.secret_token,
+                allowed_updates=Update.ALL_TYPES,
+            )
+        await application.start()
+        await server.start()
+        try:
+            await stop.wait()
+        finally:
+            # Сначала перестаем принимать обновления, затем дорабатываем очередь
+            await server.stop()
+            await application.stop()
+    if application.post_shutdown:
+        await application.post_shutdown(application)